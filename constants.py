@@ -3,7 +3,7 @@
 import os
 
 MM = 25.4 * 12
-HOMEDIR = os.environ['USERPROFILE']
+HOMEDIR = os.environ.get('USERPROFILE', os.path.expanduser('~'))
 
 # Parameters
 BIM_ID = 'BIM ID'
@@ -1,8 +1,10 @@
 """Functions related to export dwg files, images etc."""
+import os
 
 from api import *
 from lib import Walker
 from lib import get_folder
+from lib.preview import extract_previews
 
 from Autodesk.Revit.DB import ExportRange
 from Autodesk.Revit.DB import FilteredElementCollector
@@ -10,52 +12,74 @@ from Autodesk.Revit.DB import FitDirectionType
 from Autodesk.Revit.DB import ImageExportOptions
 from Autodesk.Revit.DB import ImageFileType
 from Autodesk.Revit.DB import ImageResolution
+from Autodesk.Revit.DB import Transaction
 from Autodesk.Revit.DB import View3D
 from Autodesk.Revit.DB import ViewFamily
 from Autodesk.Revit.DB import ViewFamilyType
 from Autodesk.Revit.DB import ZoomFitType
 
 
+def _render_image(filepath, out_dir, state):
+    current_uidoc = __revit__.OpenAndActivateDocument(filepath)
+    current_doc = current_uidoc.Document
+    if state['last_doc']:
+        state['last_doc'].Close(False)
+        print('Closing {}'.format(state['last_doc']))
+    state['last_doc'] = current_doc
+
+    current_dir, filename = os.path.split(current_doc.PathName)
+    basename, ext = os.path.splitext(filename)
+
+    view_type = [x for x in
+        FilteredElementCollector(current_doc).OfClass(ViewFamilyType)
+        if x.ViewFamily == ViewFamily.ThreeDimensional][0]
+
+    img = ImageExportOptions()
+    img.FilePath = os.path.join(out_dir, '{}.png'.format(basename))
+    img.HLRandWFViewsFileType = ImageFileType.PNG
+    img.ExportRange = ExportRange.CurrentView
+    img.ZoomType = ZoomFitType.FitToPage
+    img.FitDirection = FitDirectionType.Horizontal
+    img.ImageResolution = ImageResolution.DPI_600
+
+    tr = Transaction(current_doc, 'Change view settings')
+    tr.Start()
+    view = View3D.CreateIsometric(current_doc, view_type.Id)
+    current_uidoc.ActiveView = view
+    current_doc.ExportImage(img)
+    tr.RollBack()
+
+    print(basename)
+
+
 def export_images(doc):
-    """Export 3D images from all revit family files found under starting directory"""
+    """
+    Export 3D images from all revit family files found under starting
+    directory, using the preview embedded in each file and only rendering
+    families whose preview is missing or too small
+    """
     start_dir = get_folder('Enter start directory: ')
     out_dir = get_folder('Enter directory to save images: ')
-    last_doc = None
-
-    def cb(filepath):
-        current_uidoc = __revit__.OpenAndActivateDocument(filepath)
-        current_doc = current_uidoc.Document
-        if last_doc:
-            last_doc.Close(False)
-            print('Closing {}'.format(last_doc))
-        last_doc = current_doc
-
-        current_dir, filename = os.path.split(current_doc.PathName)
-        basename, ext = os.path.splitext(filename)
-
-        view_type = [x for x in
-            FilteredElementCollector(current_doc).OfClass(ViewFamilyType)
-            if x.ViewFamily == ViewFamily.ThreeDimensional][0]
-
-        img = ImageExportOptions()
-        img.FilePath = os.path.join(out_dir, '{}.png'.format(basename))
-        img.HLRandWFViewsFileType = ImageFileType.PNG
-        img.ExportRange = ExportRange.CurrentView
-        img.ZoomType = ZoomFitType.FitToPage
-        img.FitDirection = FitDirectionType.Horizontal
-        img.ImageResolution = ImageResolution.DPI_600
-
-        cats = current_doc.Settings.Categories
-        view = current_doc.ActiveView
-        tr = transaction(current_doc, 'Change view settings')
-        tr.Start()
-        view = View3D.CreateIsometric(current_doc, view_type.Id)
-        current_uidoc.ActiveView = view
-        current_doc.ExportImage(img)
-        tr.RollBack()
-
-        print(basename)
-
-    w = Walker(start_dir, '.*.rfa', cb)
-    w.run()
 
+    filepaths = list(Walker(start_dir, r'.*\.rfa$', None).files())
+    missing = []
+    for filepath, png_path, reason in extract_previews(filepaths, out_dir):
+        if png_path:
+            print(os.path.basename(png_path))
+        else:
+            print('{} - {}, rendering'.format(filepath, reason))
+            missing.append(filepath)
+
+    state = {'last_doc': None}
+    try:
+        for filepath in missing:
+            _render_image(filepath, out_dir, state)
+    finally:
+        # The active document can't be closed, switch back to doc first
+        if state['last_doc'] and doc.PathName:
+            __revit__.OpenAndActivateDocument(doc.PathName)
+            state['last_doc'].Close(False)
+            print('Closing {}'.format(state['last_doc']))
+
+    print('{} previews extracted, {} rendered'.format(
+        len(filepaths) - len(missing), len(missing)))
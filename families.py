@@ -11,60 +11,90 @@ from Autodesk.Revit.DB import FilteredElementCollector
 
 from api import *
 from lib import transaction
+from lib import Walker
+from lib import get_folder
 from lib import get_temp_path
+from lib.batch import run_batched
+from lib.bulkupdate import BulkUpdate
+from lib.bulkupdate import read_csv
+from lib.crawler import FamilyCrawler
+from lib.duplicates import find_duplicates
+from lib.familytypes import iter_type_values
+from lib.familytypes import write_long
+from lib.familytypes import write_wide
+from lib.health import VerdictCache
+from lib.health import check_families
+from lib.health import check_file_structures
+from lib.index import get_index
+from lib.marks import index_marks
+from lib.rename import RenameRule
+from lib.rename import RuleSet
+from lib.rename import get_type_name
+from lib.rfa import report_library
+from lib.swap import swap_symbols
+from lib.usage import get_usage
 import constants
 
 
 def report_corrupt_families(doc):
     """Generate CSV of all loaded families and their corrupted status"""
-    families = FilteredElementCollector(doc).OfClass(Family)
-    rows = []
-    category = raw_input('Enter category: ').strip()
+    folder = raw_input(
+        'Folder of saved .rfa copies for a structural check '
+        '(blank to open and close loaded families): ').strip()
+    category = '' if folder else raw_input('Enter category: ').strip()
+    cache = VerdictCache(os.path.join(constants.HOMEDIR, 'family_health.json'))
+
+    if folder:
+        paths = Walker(folder, r'.*\.rfa$', None).files()
+        results = (
+            ('', os.path.basename(filepath), verdict, seconds, cached)
+            for filepath, verdict, seconds, cached in check_file_structures(paths, cache))
+    else:
+        families = [
+            x for x in get_index(doc).of_class(Family)
+            if x.IsEditable and not x.IsInPlace and (
+                not category or x.FamilyCategory.Name == category)]
+        results = (
+            (family.FamilyCategory.Name, family.Name, verdict, seconds, cached)
+            for family, verdict, seconds, cached in check_families(
+                doc, families, cache))
 
-    for family in families:
-        if not family.IsEditable or family.IsInPlace:
-            continue
-        if category and family.FamilyCategory.Name != category:
-            continue
-        try:
-            fam_doc = doc.EditFamily(family)
-            fam_doc.Close(False)
-            rows.append((family.FamilyCategory.Name, family.Name, True))
-            print('{} - OK'.format(family.Name))
-        except Exception:
-            print('{} - Corrupt'.format(family.Name))
-            rows.append((family.FamilyCategory.Name, family.Name, False))
+    rows = []
+    for row in results:
+        _, name, verdict, seconds, cached = row
+        print('{} - {} ({:.1f}s{})'.format(
+            name, verdict, seconds, ', cached' if cached else ''))
+        rows.append(row)
+    rows.sort(key=lambda x: -x[3])
 
     csv_path = get_temp_path('corrupt.csv')
     with open(csv_path, 'w') as f:
         w = csv.writer(f, lineterminator='\n')
-        w.writerow(('Category', 'Family', 'OK'))
+        w.writerow(('Category', 'Family', 'Verdict', 'Seconds', 'Cached'))
         w.writerows(rows)
     os.startfile(csv_path, 'open')
 
 
 def fix_duplicate_marks(doc):
     """Find elements with duplicate marks and rename"""
-    mark_map = defaultdict(list)
-    instances = FilteredElementCollector(doc).OfClass(FamilyInstance)
+    instances = get_index(doc).of_class(FamilyInstance)
+    allocator, mark_map = index_marks(instances)
 
-    for instance in instances:
-        mark = instance.get_Parameter(BuiltInParameter.ALL_MODEL_MARK)
-        if mark:
-            mark_map[mark.AsString()].append(instance.Id)
+    renames = []
+    for (scope, mark), elems in mark_map.items():
+        if len(elems) < 2:
+            continue
 
-    with transaction(doc, 'Fix duplicate marks'):
-        for mark, ids in mark_map.items():
-            if len(ids) < 2:
-                continue
-            if not mark:
-                continue
+        for instance in elems[1:]:
+            renames.append((instance, allocator.allocate(mark, scope)))
+
+    def rename(item):
+        instance, new_mark = item
+        instance.get_Parameter(BuiltInParameter.ALL_MODEL_MARK).Set(new_mark)
+        return True
 
-            for i, id in enumerate(ids[1:], 1):
-                new_mark = '{}-{}'.format(mark, i)
-                instance = doc.GetElement(id)
-                instance.get_Parameter(BuiltInParameter.ALL_MODEL_MARK).Set(new_mark)
-                print(new_mark)
+    run_batched(doc, 'Fix duplicate marks', renames, rename,
+        key=lambda x: x[0].UniqueId)
 
 
 def rename_single_types(doc, type_name='Default'):
@@ -78,199 +108,128 @@ def rename_single_types(doc, type_name='Default'):
                 symbol.Name = type_name
 
 
-def rename_families(doc):
-
-    acronyms = ['MAT', 'SSTN', 'OR', 'SC', 'PAED', 'ICU', 'WUP', 'FHR', 'NB',
+FAMILY_RULES = RuleSet(
+    [RenameRule(r'(SPJN[0-9X]{2,5})\s*[-_]\s*(.*)', '{0} - {1!t}')],
+    acronyms=['MAT', 'SSTN', 'OR', 'SC', 'PAED', 'ICU', 'WUP', 'FHR', 'NB',
         'AV', 'FIP', 'ED', 'CU', 'NWOW', 'NBC', 'EDPAEDS', 'ISOL', 'IPU', 'PB',
-        'PECC', 'UB', 'UP', 'CIS']
-    remove_words = ['SPJN', 'HE', '3D']
-    families = FilteredElementCollector(doc).OfClass(Family)
-
-    with transaction(doc, 'Rename families'):
-        for fam in families:
-            bits = re.findall(r'(SPJN[0-9X]{2,5})\s*[-_]\s*(.*)', fam.Name)
-            if not bits:
-                continue
+        'PECC', 'UB', 'UP', 'CIS'],
+    stop_words=['SPJN', 'HE', '3D'])
 
-            code, name = bits[0]
-            name_bits = re.sub(r'[-_\s]', ' ', name).split()
+DOOR_RULES = RuleSet(
+    [RenameRule(r'D(\d{1,3})([a-zA-Z]*) (2100)', 'D{0}{1}')])
 
-            out = []
-            for bit in name_bits:
-                if bit.upper() in remove_words:
-                    continue
-                if bit in acronyms:
-                    out.append(bit)
-                else:
-                    out.append(bit.title())
 
-            name = ' '.join(out)
-            fam.Name = '{} - {}'.format(code, name)
-            print(fam.Name)
+def rename_families(doc):
+    FAMILY_RULES.run(doc, 'Rename families', get_index(doc).of_class(Family))
 
 
 def report_family_types(doc):
     """Generate CSV report of types and parameters of family"""
-    fm = doc.FamilyManager
-
-    types = []
-    fieldnames = {'Type'}
-    for ft in fm.Types:
-        ft_dict = {'Type': ft.Name}
-        for p in fm.GetParameters():
-            p_value = ft.AsValueString(p) or ft.AsString(p)
-            if not p_value:
-                continue
-            ft_dict[p.Definition.Name] = p_value
-            fieldnames.add(p.Definition.Name)
-        types.append(ft_dict)
-
     csv_path = get_temp_path('types.csv')
     with open(csv_path, 'w') as f:
-        dw = csv.DictWriter(f, fieldnames, lineterminator='\n')
-        dw.writeheader()
-        dw.writerows(types)
+        count = write_wide(doc.FamilyManager, f)
+    print('{} types'.format(count))
+    os.startfile(csv_path, 'open')
+
 
+def report_family_types_long(doc):
+    """Generate CSV report of family type parameter values, one per row"""
+    csv_path = get_temp_path('types_long.csv')
+    with open(csv_path, 'w') as f:
+        count = write_long(doc.FamilyManager, f)
+    print('{} types'.format(count))
     os.startfile(csv_path, 'open')
 
 
+def _read_family_types(filepath):
+    """Open family at filepath and return its category and type parameters"""
+    famdoc = APP.OpenDocumentFile(filepath)
+    try:
+        fm = famdoc.FamilyManager
+        category = famdoc.OwnerFamily.FamilyCategory.Name
+        params = list(fm.GetParameters())
+        names = [p.Definition.Name for p in params]
+        rows = []
+        for type_name, values in iter_type_values(fm, params):
+            rows.extend(
+                (type_name, name, value)
+                for name, value in zip(names, values))
+    finally:
+        famdoc.Close(False)
+    return category, rows
+
+
 def report_families(doc):
     """Generate report of families"""
 
     #start_dir = r'H:\NBIF\Health Library\Revit'
     #start_dir = r'C:\Users\DodswoS\Documents\Revit testing\New Families\temp\GE'
     start_dir = r'C:\Users\DodswoS\Documents\Revit testing\New Families\temp\Sorted'
-    out_dir = r'C:\Users\DodswoS\Documents\Revit testing\New Families\temp\Sorted'
-    out = []
 
     outpath = os.path.join(constants.HOMEDIR, 'types.csv')
+    manifest = os.path.join(constants.HOMEDIR, 'families.sqlite')
+
+    crawler = FamilyCrawler(start_dir, manifest, _read_family_types)
+    crawler.run()
+    crawler.export_csv(outpath, category=True, skip_empty=True)
+    crawler.close()
 
-    for root, dirs, files in os.walk(start_dir):
-        for fname in files:
-
-            with open(outpath, 'a') as f:
-                w = csv.writer(f, lineterminator='\n')
-
-                basename, ext = os.path.splitext(fname)
-                if ext != '.rfa':
-                    continue
-                filepath = os.path.join(root, fname)
-                famdoc = APP.OpenDocumentFile(filepath)
-                fm = famdoc.FamilyManager
-                category = famdoc.OwnerFamily.FamilyCategory.Name
-
-                for ft in fm.Types:
-                    for p in fm.GetParameters():
-                        p_value = ft.AsValueString(p) or ft.AsString(p)
-                        if not p_value:
-                            continue
-                        row = (
-                            start_dir,
-                            category,
-                            fname,
-                            ft.Name,
-                            p.Definition.Name,
-                            p_value,
-                        )
-                        try:
-                            w.writerow(row)
-                        except Exception as e:
-                            print(e)
-                            print(row)
-
-                famdoc.Close(False)
-
-            # Move family to category folder
-            #category_folder = os.path.join(out_dir, category)
-            #if not os.path.exists(category_folder):
-            #    os.mkdir(category_folder)
-            #shutil.move(filepath, category_folder)
-            #print('moved to {}'.format(category_folder))
-
-    #with open(outpath, 'w') as f:
-    #    w = csv.writer(f, lineterminator='\n')
-    #    w.writerow((
-    #        'Source', 'Category', 'Family', 'Type', 'Parameter Name', 'Parameter Value'))
-    #    #w.writerows(out)
-    #    for row in out:
-    #        try:
-    #            w.writerow(row)
-    #        except Exception:
-    #            print(row)
+    os.startfile(outpath, 'open')
 
+
+def report_families_offline(doc):
+    """Generate report of families read from the .rfa files without opening them"""
+    start_dir = get_folder('Select family library folder')
+    if not start_dir:
+        return
+    outpath = os.path.join(constants.HOMEDIR, 'types.csv')
+    count, errors = report_library(start_dir, outpath)
+    print('{} families read, {} without PartAtom data'.format(count, errors))
     os.startfile(outpath, 'open')
 
 
 def fix_types(doc):
-    families = set()
-    with open(os.path.join(HOMEDIR, 'types1.csv')) as f:
+    with open(os.path.join(constants.HOMEDIR, 'types1.csv')) as f:
         families = {row['Family'] for row in csv.DictReader(f)}
 
     start_dir = r'H:\NBIF\Health Library\Revit'
     #start_dir = r'I:\NBIF\Projects\NB98100\Deliverables\BIM\01_Architecture\F_Project Content\Exported Families 20170109'
-    out = []
+    manifest = os.path.join(constants.HOMEDIR, 'families.sqlite')
 
-    for root, dirs, files in os.walk(start_dir):
-        for fname in files:
-            if fname not in families:
-                print('Ignoring {}'.format(fname))
-                continue
-            print(fname)
-            basename, ext = os.path.splitext(fname)
-            if ext != '.rfa':
-                continue
-            filepath = os.path.join(root, fname)
-            famdoc = app.OpenDocumentFile(filepath)
-            fm = famdoc.FamilyManager
-
-            for ft in fm.Types:
-                for p in fm.GetParameters():
-                    out.append(
-                        (
-                            start_dir,
-                            fname,
-                            ft.Name,
-                            p.Definition.Name,
-                            ft.AsValueString(p) or ft.AsString(p)
-                        )
-                    )
-            famdoc.Close(False)
-
-    with open(os.path.join(HOMEDIR, 'types.csv'), 'w') as f:
-        w = csv.writer(f, lineterminator='\n')
-        w.writerow((
-            'Source', 'Family', 'Type', 'Parameter Name', 'Parameter Value'))
-        w.writerows(out)
+    crawler = FamilyCrawler(
+        start_dir, manifest, _read_family_types,
+        file_filter=lambda path: os.path.basename(path) in families)
+    crawler.run()
+    crawler.export_csv(os.path.join(constants.HOMEDIR, 'types.csv'))
+    crawler.close()
 
 
-def duplicate_families_by_parameter(doc):
-    #categories = ['Furniture', 'Furniture Systems', 'Specialty Equipment']
-    instances = FilteredElementCollector(doc).OfClass(FamilyInstance)
-    families = FilteredElementCollector(doc).OfClass(Family)
-    instance_families = {x.Symbol.Family.Name for x in instances}
-    #loaded_families = {x.Name for x in families if x.FamilyCategory and x.FamilyCategory.Name in categories}
+def duplicate_families_by_parameter(doc, param_names=(constants.DESCRIPTOR_TX,),
+        near=True, threshold=0.8):
+    usage = get_usage(doc)
+    family_counts = usage.family_counts()
+    symbols = get_index(doc).of_class(FamilySymbol)
 
     rows = []
-    param_name = constants.DESCRIPTOR_TX
-    param_map = defaultdict(set)
-
-    symbols = FilteredElementCollector(doc).OfClass(FamilySymbol)
-    for s in symbols:
-        param = s.LookupParameter(param_name)
-        if param and param.AsString():
-            param_map[param.AsString()].add(s)
-
-    for param, symbols in param_map.items():
-        if len(symbols) > 1:
-            for x in param_map[param]:
-                rows.append([param, x.Category.Name, x.Family.Name, x.UniqueId, x.Family.Name in instance_families])
-
-    with open(os.path.join(HOMEDIR, 'Duplicates by {}.csv'.format(param_name)), 'w') as f:
+    clusters = find_duplicates(symbols, list(param_names), near=near,
+        threshold=threshold)
+    for i, cluster in enumerate(clusters, 1):
+        key = ' | '.join(str(x) for x in cluster.key) if cluster.key else ''
+        for x in cluster.members:
+            rows.append([
+                i, cluster.kind, key, x.Category.Name, x.Family.Name,
+                get_type_name(x), x.UniqueId, usage.count(x.Id),
+                family_counts[x.Family.Id.IntegerValue]])
+
+    name = ', '.join(str(x) for x in param_names)
+    with open(os.path.join(constants.HOMEDIR, 'Duplicates by {}.csv'.format(name)), 'w') as f:
         w = csv.writer(f, lineterminator='\n')
-        w.writerow([param_name, 'Category', 'Family', 'Type ID', 'Used'])
+        w.writerow([
+            'Cluster', 'Match', name, 'Category', 'Family', 'Type', 'Type ID',
+            'Type Instances', 'Family Instances'])
         w.writerows(rows)
 
-    print('Done')
+    print('{} clusters'.format(len(clusters)))
 
 
 def fix_duplicate_families(doc):
@@ -283,52 +242,24 @@ def fix_duplicate_families(doc):
 
 
 def rename_doors(doc):
-    doors = FilteredElementCollector(
-        doc
-    ).OfClass(
-        FamilySymbol
-    ).OfCategory(
-        BuiltInCategory.OST_Doors
-    )
-    patt = re.compile(r'D(\d{1,3})([a-zA-Z]*) (2100)')
-
-    with transaction(doc, 'Rename doors'):
-        for symbol in doors:
-            name_param = symbol.get_Parameter(BuiltInParameter.ALL_MODEL_TYPE_NAME)
-            name = name_param.AsString()
-            bits = patt.findall(name)
-            if bits:
-                bits = bits[0]
-                new_name = 'D{}{}'.format(bits[0], bits[1])
-                symbol.Name = new_name
-                print('{} -> {}'.format(name, new_name))
-
-
-def set_groups(doc):
-    csvfile = os.path.join(HOMEDIR, 'br2_groups.csv')
+    doors = get_index(doc).of_class_and_category(
+        FamilySymbol, BuiltInCategory.OST_Doors)
+    DOOR_RULES.run(doc, 'Rename doors', doors, get_name=get_type_name,
+        scope=lambda x: x.Family.Id.IntegerValue)
+
+
+def set_groups(doc, csv_path=os.path.join(constants.HOMEDIR, 'br2_groups.csv')):
     bimid_dict = defaultdict(set)
-    for item in csv.DictReader(open(csvfile)):
-        bimid_dict[item['BIM ID']].add(item['Budget: Code'])
-
-    all_symbols = FilteredElementCollector(doc).OfClass(FamilySymbol)
-    param_dict = {}
-    for s in all_symbols:
-        param = s.LookupParameter(constants.DESCRIPTOR_TX)
-        if param:
-            param_dict[get_param_value(param, doc)] = s
-
-    with transaction(doc, 'Set groups'):
-        for id, groups in bimid_dict.items():
-            if len(groups) != 1:
-                continue
-            matching_symbol = param_dict.get(id)
-            if matching_symbol:
-                group = list(groups)[0]
-                param = matching_symbol.LookupParameter('InstallationGroup_TX')
-                if param:
-                    param.Set(group)
-                    print(id, group)
+    for row in read_csv(csv_path):
+        bimid_dict[row['BIM ID']].add(row['Budget: Code'])
+    rows = (
+        {'BIM ID': id, 'Group': list(groups)[0]}
+        for id, groups in bimid_dict.items() if len(groups) == 1)
 
+    symbols = get_index(doc).of_class(FamilySymbol)
+    update = BulkUpdate(doc, constants.DESCRIPTOR_TX, symbols)
+    update.read(rows, 'BIM ID', [('InstallationGroup_TX', 'Group')])
+    update.apply('Set groups', get_temp_path('groups_changed.csv'))
 
 
 def fix_hfbs(doc):
@@ -379,33 +310,33 @@ def fix_doors(doc):
 
 
 def swap_symbol(doc, family_name, from_type_name, to_type_name):
-    dw = DocumentWrapper(doc)
-    to_symbol = [x for x in dw.symbols if
-        x.FamilyName == family_name and x.get_Parameter(BuiltInParameter.ALL_MODEL_TYPE_NAME).AsString() == to_type_name][0]
-    instances = [x for x in dw.instances if
-        x.Symbol.get_Parameter(BuiltInParameter.ALL_MODEL_TYPE_NAME).AsString() == from_type_name and
-        x.Symbol.FamilyName == family_name]
-    with transaction(doc, "Swap symbols"):
-        for instance in instances:
-            if instance.GroupId.IntegerValue < 0:
-                print('{} is in group {}'.format(instance.Id, instance.GroupId))
-            else:
-                print(instance.GroupId, instance.Id)
-                instance.Symbol = to_symbol
+    swap_symbols(doc, [(family_name, from_type_name, to_type_name)])
+
+
+def swap_symbols_csv(doc):
+    """
+    Swap family types from a CSV with Family, From Type, To Type and
+    optional To Family columns
+    """
+    csv_path = raw_input('CSV file: ').strip().strip('"')
+    mapping = [
+        (row['Family'], row['From Type'],
+            row.get('To Family') or row['Family'], row['To Type'])
+        for row in read_csv(csv_path)]
+    swap_symbols(doc, mapping)
 
 
 def purge_unused_types(doc):
     """Remove unused symbols for all families matching name_pattern"""
     name_pattern = raw_input('Enter family name pattern: ')
-    matching_families = [x for x in FilteredElementCollector(doc).OfClass(
-        Family) if name_pattern in x.Name]
-    instances = FilteredElementCollector(doc).OfClass(FamilyInstance)
-    used_symbols = {x.Symbol.Id for x in instances}
+    matching_families = [
+        x for x in get_index(doc).of_class(Family) if name_pattern in x.Name]
+    usage = get_usage(doc)
     count = 0
     with transaction(doc, "Delete unused symbols"):
         for family in matching_families:
             for symbol_id in family.GetFamilySymbolIds():
-                if symbol_id not in used_symbols:
+                if not usage.count(symbol_id):
                     doc.Delete(symbol_id)
                     count += 1
 
@@ -3,30 +3,38 @@ import re
 from contextlib import contextmanager
 import tempfile
 
-import clr
-clr.AddReference('RevitAPI')
-clr.AddReference('RevitAPIUI')
-clr.AddReference("System.Windows.Forms")
-
-import System
-from Autodesk.Revit.DB import BuiltInCategory
-from Autodesk.Revit.DB import BuiltInParameter
-from Autodesk.Revit.DB import DisplayUnitType
-from Autodesk.Revit.DB import FamilyInstance
-from Autodesk.Revit.DB import FamilySymbol
-from Autodesk.Revit.DB import Family
-from Autodesk.Revit.DB import FilteredElementCollector
-from Autodesk.Revit.DB import ParameterFilterElement
-from Autodesk.Revit.DB import ParameterType
-from Autodesk.Revit.DB import StorageType
-from Autodesk.Revit.DB import Transaction
-from Autodesk.Revit.DB import View
-from Autodesk.Revit.DB import ViewFamilyType
-from Autodesk.Revit.DB import ViewSheet
-from Autodesk.Revit.DB import ViewType
-
-from System.Windows.Forms import FolderBrowserDialog
-from System.Windows.Forms import DialogResult
+from constants import MM
+
+try:
+    import clr
+    clr.AddReference('RevitAPI')
+    clr.AddReference('RevitAPIUI')
+    clr.AddReference("System.Windows.Forms")
+
+    import System
+    from Autodesk.Revit.DB import BuiltInCategory
+    from Autodesk.Revit.DB import BuiltInParameter
+    from Autodesk.Revit.DB import DisplayUnitType
+    from Autodesk.Revit.DB import FamilyInstance
+    from Autodesk.Revit.DB import FamilySymbol
+    from Autodesk.Revit.DB import Family
+    from Autodesk.Revit.DB import FilteredElementCollector
+    from Autodesk.Revit.DB import ParameterFilterElement
+    from Autodesk.Revit.DB import ParameterType
+    from Autodesk.Revit.DB import StorageType
+    from Autodesk.Revit.DB import Transaction
+    from Autodesk.Revit.DB import TransactionGroup
+    from Autodesk.Revit.DB import View
+    from Autodesk.Revit.DB import ViewFamilyType
+    from Autodesk.Revit.DB import ViewSheet
+    from Autodesk.Revit.DB import ViewType
+
+    from System.Windows.Forms import FolderBrowserDialog
+    from System.Windows.Forms import DialogResult
+except ImportError:
+    # Outside Revit (e.g. benchmarking lib.index against lib.standin under
+    # CPython) only the helpers that don't touch the Revit API are usable
+    pass
 
 
 def get_temp_path(filename):
@@ -86,91 +94,190 @@ def pd2cd(pd):
         System.DateTimeKind.Local)
 
 
+class DocumentCache(object):
+    """
+    Store of values computed from a document, valid until the document is
+    next changed
+    """
+
+    def __init__(self):
+        self._items = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, factory):
+        if key in self._items:
+            self.hits += 1
+            return self._items[key]
+        self.misses += 1
+        value = self._items[key] = factory()
+        return value
+
+    def clear(self):
+        self._items.clear()
+
+
+_document_caches = {}
+_watched_applications = []
+
+
+def _on_document_changed(sender, args):
+    invalidate_document_cache(args.GetDocument())
+
+
+def _on_document_closing(sender, args):
+    _document_caches.pop(args.Document, None)
+
+
+def _watch_application(doc):
+    """
+    Clear the cache of a document on every change made to it by any
+    transaction, the UI, undo or redo, and drop it when it is closed
+    """
+    application = getattr(doc, 'Application', None)
+    if application is None or application in _watched_applications:
+        return
+    application.DocumentChanged += _on_document_changed
+    application.DocumentClosing += _on_document_closing
+    _watched_applications.append(application)
+
+
+def get_document_cache(doc):
+    """Return the DocumentCache shared by all wrappers of doc"""
+    cache = _document_caches.get(doc)
+    if cache is None:
+        _watch_application(doc)
+        cache = _document_caches[doc] = DocumentCache()
+    return cache
+
+
+def invalidate_document_cache(doc):
+    """Drop everything cached for doc, e.g. after it has been modified"""
+    cache = _document_caches.get(doc)
+    if cache is not None:
+        cache.clear()
+
+
 @contextmanager
 def transaction(doc, message):
     tr = Transaction(doc, message)
     tr.Start()
     yield
     tr.Commit()
+    invalidate_document_cache(doc)
 
 
 @contextmanager
 def rollback_transaction_group(doc, message):
     tg = TransactionGroup(doc, message)
     tg.Start()
-    yield
-    tg.RollBack()
+    try:
+        yield
+    finally:
+        tg.RollBack()
+        invalidate_document_cache(doc)
+
+
+def cached_property(func):
+    """
+    Property whose value is stored in the document cache of the wrapper, so
+    it is only computed once per document state
+    """
+    key = func.__name__
+
+    def getter(self):
+        return self._cache.get(key, lambda: func(self))
+
+    getter.__name__ = func.__name__
+    getter.__doc__ = func.__doc__
+    return property(getter)
 
 
 class DocumentWrapper(object):
     """
     Class that wraps Revit Document and provides easy access to commonly used
     items such as walls, doors, views etc
+
+    Collections are cached per document and dropped whenever the document
+    changes (see _watch_application). Call invalidate() to drop them inside
+    an open transaction.
     """
 
     def __init__(self, doc):
         self._doc = doc
+        self._cache = get_document_cache(doc)
 
     @property
     def _collector(self):
         return FilteredElementCollector(self._doc)
 
     @property
+    def hits(self):
+        return self._cache.hits
+
+    @property
+    def misses(self):
+        return self._cache.misses
+
+    def invalidate(self):
+        invalidate_document_cache(self._doc)
+
+    @cached_property
     def sheets(self):
         return list(self._collector.OfClass(ViewSheet))
 
-    @property
+    @cached_property
     def views(self):
         return list(self._collector.OfClass(View))
 
-    @property
+    @cached_property
     def view_templates(self):
         return [x for x in self.views if x.IsTemplate]
 
-    @property
+    @cached_property
     def view_filters(self):
         return list(self._collector.OfClass(ParameterFilterElement))
 
-    @property
+    @cached_property
     def view_plans(self):
         return [x for x in self.views if x.ViewType == ViewType.FloorPlan]
 
-    @property
+    @cached_property
     def doors(self):
         return list(self._collector.OfClass(
             FamilyInstance).OfCategory(BuiltInCategory.OST_Doors))
 
-    @property
+    @cached_property
     def rooms(self):
         return list(self._collector.OfCategory(BuiltInCategory.OST_Rooms))
 
-    @property
+    @cached_property
     def view_types(self):
         return list(self._collector.OfClass(ViewFamilyType))
 
-    @property
+    @cached_property
     def title_blocks(self):
         return list(self._collector.OfClass(
             FamilySymbol).OfCategory(BuiltInCategory.OST_TitleBlocks))
 
-    @property
+    @cached_property
     def symbols(self):
         return list(self._collector.OfClass(FamilySymbol))
 
-    @property
+    @cached_property
     def families(self):
         return list(self._collector.OfClass(Family))
 
-    @property
+    @cached_property
     def instances(self):
         return list(self._collector.OfClass(FamilyInstance))
 
-    @property
+    @cached_property
     def scope_boxes(self):
         return list(self._collector.OfCategory(
             BuiltInCategory.OST_VolumeOfInterest))
 
-    @property
+    @cached_property
     def unused_scope_boxes(self):
         all_scope_box_ids = set(x.Id for x in self.scope_boxes)
         used_scope_box_ids = set()
@@ -185,7 +292,7 @@ class DocumentWrapper(object):
         unused_scope_box_ids = all_scope_box_ids.difference(used_scope_box_ids)
         unused_scope_boxes = []
         for id in unused_scope_box_ids:
-            unused_scope_boxes.append(this._doc.GetElement(id))
+            unused_scope_boxes.append(self._doc.GetElement(id))
         return unused_scope_boxes
 
 
@@ -199,27 +306,34 @@ class Walker(object):
         self.file_regex = re.compile(file_regex)
         self.callback = callback
 
-    def run(self):
+    def files(self):
         for root, dirs, filenames in os.walk(self.start_dir):
             for filename in filenames:
                 if not self.file_regex.match(filename):
                     continue
-                filepath = os.path.join(root, filename)
-                self.callback(filepath)
+                yield os.path.join(root, filename)
 
+    def run(self):
+        for filepath in self.files():
+            self.callback(filepath)
 
-def get_param_value(param, doc):
-    if not param:
-        return
+
+def get_param_units(param):
+    """Factor converting the internal (feet) value of param to display units"""
     try:
         if param.DisplayUnitType == DisplayUnitType.DUT_MILLIMETERS:
-            units = MM
+            return MM
         elif param.DisplayUnitType == DisplayUnitType.DUT_METERS:
-            units = MM/1000
-        else:
-            units = 1
+            return MM/1000
     except:
-        units = 1
+        pass
+    return 1
+
+
+def get_param_value(param, doc):
+    if not param:
+        return
+    units = get_param_units(param)
     if param.StorageType == StorageType.ElementId:
         id = param.AsElementId()
         #if id.IntegerValue >= 0:
@@ -0,0 +1,166 @@
+"""
+Chunked, resumable transactions for edits touching many elements.
+
+Instead of one enormous Transaction, run_batched commits a Transaction every
+chunk_size changes inside a TransactionGroup and records the keys of every
+item in a committed chunk in a journal file. If the run fails, the chunks
+already committed are kept and running the same command again skips them:
+
+    def renumber(element):
+        ...
+        return True  # element was changed
+
+    run_batched(doc, 'Renumber', elements, renumber, chunk_size=1000)
+
+Journals are per model file and command. A journal is only trusted while
+the model it was written for is still open, or once the model has been
+saved since the journal's last chunk; if the model was closed without
+saving, the committed chunks were lost and the journal is discarded.
+"""
+import hashlib
+import os
+import re
+import time
+
+from lib import get_temp_path
+from lib import invalidate_document_cache
+
+try:
+    from Autodesk.Revit.DB import Transaction
+    from Autodesk.Revit.DB import TransactionGroup
+except ImportError:
+    pass
+
+
+# Journal path -> document it was last written for in this session
+_live_journals = {}
+
+
+def get_journal_path(doc, name):
+    path_hash = hashlib.md5(
+        (doc.PathName or '').encode('utf-8')).hexdigest()[:8]
+    filename = re.sub(r'\W+', '_', '{} {}'.format(doc.Title, name)).lower()
+    return get_temp_path('{}_{}.journal'.format(filename, path_hash))
+
+
+def journal_is_current(doc, path):
+    """
+    True if the chunks recorded in the journal at path are still in doc:
+    it is the document the journal was written for in this session, or
+    its model file was saved after the journal's last write
+    """
+    live = _live_journals.get(path)
+    if live is not None and getattr(live, 'IsValidObject', True) and \
+            live.Equals(doc):
+        return True
+    if not doc.PathName or not os.path.exists(doc.PathName):
+        return False
+    return os.path.getmtime(doc.PathName) >= os.path.getmtime(path)
+
+
+class Journal(object):
+    """Append only record of the keys of items in committed chunks"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.done = {x.rstrip('\n') for x in f}
+
+    def write(self, keys):
+        with open(self.path, 'a') as f:
+            for key in keys:
+                f.write('{}\n'.format(key))
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def default_key(item):
+    return getattr(item, 'UniqueId', item)
+
+
+def run_batched(doc, name, items, action, key=default_key, chunk_size=1000,
+        journal_path=None):
+    """
+    Call action(item) for every item, committing a transaction every
+    chunk_size changes (items for which action returns True). All chunks
+    are assimilated into a single TransactionGroup called name.
+
+    Items already committed by an interrupted run with the same journal are
+    skipped. The journal is removed once every item has been processed.
+    Returns the number of changes made.
+    """
+    journal = Journal(journal_path or get_journal_path(doc, name))
+    if journal.done and not journal_is_current(doc, journal.path):
+        print('Discarding journal of {}: the model was not saved after its '
+            'last chunk, so those changes were lost'.format(name))
+        journal.remove()
+        journal.done = set()
+    _live_journals[journal.path] = doc
+    if journal.done:
+        print('Resuming {}: skipping {} items already committed'.format(
+            name, len(journal.done)))
+
+    group = TransactionGroup(doc, name)
+    group.Start()
+
+    chunk = 0
+    total = 0
+    tr = None
+    try:
+        pending = []
+        changes = 0
+        start = time.time()
+        for item in items:
+            item_key = str(key(item))
+            if item_key in journal.done:
+                continue
+
+            if tr is None:
+                tr = Transaction(doc, '{} ({})'.format(name, chunk + 1))
+                tr.Start()
+            if action(item):
+                changes += 1
+            pending.append(item_key)
+
+            if changes >= chunk_size:
+                chunk += 1
+                _commit_chunk(tr, journal, pending, name, chunk, changes, start)
+                tr = None
+                total += changes
+                pending = []
+                changes = 0
+                start = time.time()
+
+        if tr is not None:
+            chunk += 1
+            _commit_chunk(tr, journal, pending, name, chunk, changes, start)
+            tr = None
+            total += changes
+    except:
+        if tr is not None:
+            tr.RollBack()
+        group.Assimilate()
+        invalidate_document_cache(doc)
+        print('{} interrupted after {} changes, run again to resume'.format(
+            name, total))
+        raise
+
+    group.Assimilate()
+    invalidate_document_cache(doc)
+    journal.remove()
+    _live_journals.pop(journal.path, None)
+    print('{}: {} changes in {} chunks'.format(name, total, chunk))
+    return total
+
+
+def _commit_chunk(tr, journal, keys, name, chunk, changes, start):
+    tr.Commit()
+    journal.write(keys)
+    elapsed = time.time() - start
+    print('{} chunk {}: {} changes, {} items in {:.1f}s ({:.0f} items/s)'.format(
+        name, chunk, changes, len(keys), elapsed,
+        len(keys) / elapsed if elapsed else 0))
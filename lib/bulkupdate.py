@@ -0,0 +1,186 @@
+"""
+Bulk parameter updates from a CSV joined against the model.
+
+The model side of the join is hashed once: a dict from key value to
+element, where the key is the UniqueId, the ElementId or the value of any
+parameter. CSV rows are then streamed through it, so there is no
+GetElement or collector per row. Every value is converted to the storage
+type of the target parameter before anything is written; rows that don't
+match or don't validate are reported and skipped. The writes go through a
+ChangeBuffer and run_batched, and the applied changes are logged:
+
+    update = BulkUpdate(doc, key='UniqueId', elements=rooms)
+    update.read(read_csv(csv_path), 'ID', [
+        (BuiltInParameter.ROOM_NAME, 'Old Name'),
+        ('Comments', lambda row: row['Note'].upper()),
+    ])
+    update.apply('Rename rooms', log_path)
+"""
+from collections import defaultdict
+import csv
+
+from lib import get_param_units
+from lib import get_param_value
+from lib.batch import run_batched
+from lib.changes import ChangeBuffer
+from lib.index import get_index
+
+try:
+    from Autodesk.Revit.DB import ElementId
+    from Autodesk.Revit.DB import ParameterType
+    from Autodesk.Revit.DB import StorageType
+except ImportError:
+    pass
+
+
+UNIQUE_ID = 'UniqueId'
+ELEMENT_ID = 'ElementId'
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', ''}
+
+
+def read_csv(csv_path, where=None):
+    """Stream the rows of csv_path as dicts, optionally filtered by where"""
+    with open(csv_path) as f:
+        for row in csv.DictReader(f):
+            if where is None or where(row):
+                yield row
+
+
+def element_key(element, key):
+    """Join key of element: its UniqueId, ElementId or a parameter value"""
+    if key == UNIQUE_ID:
+        return element.UniqueId
+    elif key == ELEMENT_ID:
+        return str(element.Id.IntegerValue)
+    if isinstance(key, str):
+        param = element.LookupParameter(key)
+    else:
+        param = element.get_Parameter(key)
+    if not param:
+        return None
+    value = get_param_value(param, element.Document)
+    if value is None or value == '':
+        return None
+    return str(value)
+
+
+def convert_value(param, text):
+    """
+    Convert the csv text to the storage type of param, in the display units
+    used by get_param_value. Raises ValueError for invalid values.
+    """
+    storage_type = param.StorageType
+    if storage_type == StorageType.String:
+        return text
+    text = text.strip()
+    if storage_type == StorageType.Double:
+        return float(text) / get_param_units(param)
+    elif storage_type == StorageType.Integer:
+        if param.Definition.ParameterType == ParameterType.YesNo:
+            if text.lower() in TRUE_VALUES:
+                return 1
+            elif text.lower() in FALSE_VALUES:
+                return 0
+            raise ValueError('{!r} is not a yes/no value'.format(text))
+        return int(text)
+    return ElementId(int(text))
+
+
+class BulkUpdate(object):
+    """Hash join of csv rows against elements, buffered as parameter writes"""
+
+    def __init__(self, doc, key=UNIQUE_ID, elements=None):
+        self.doc = doc
+        self.key = key
+        self.changes = ChangeBuffer()
+        self.rows = 0
+        self.unmatched = 0
+        self.errors = []
+
+        if elements is None:
+            elements = get_index(doc)
+        self.elements = {}
+        self.duplicates = set()
+        for element in elements:
+            value = element_key(element, key)
+            if value is None:
+                continue
+            if value in self.elements:
+                self.duplicates.add(value)
+            self.elements[value] = element
+
+    def read(self, rows, key_column, columns, check=None, skip_empty=False):
+        """
+        Join rows on key_column and buffer a write for every (parameter,
+        value) in columns, where value is a column name or a function of
+        the row. check(row, element) is called on every matched row and
+        may raise ValueError to reject it. With skip_empty, empty cells
+        leave their parameter unchanged.
+        """
+        params = defaultdict(dict)
+        for row in rows:
+            self.rows += 1
+            key = row[key_column]
+            if key in self.duplicates:
+                self.errors.append((key, None, 'Key matches several elements'))
+                continue
+            element = self.elements.get(key)
+            if element is None:
+                self.unmatched += 1
+                continue
+            if check is not None:
+                try:
+                    check(row, element)
+                except ValueError as e:
+                    self.errors.append((key, None, str(e)))
+                    continue
+
+            for spec, source in columns:
+                value = source(row) if callable(source) else row[source]
+                if value is None or (skip_empty and value == ''):
+                    continue
+                if isinstance(spec, str):
+                    param = element.LookupParameter(spec)
+                else:
+                    param = element.get_Parameter(spec)
+                if not param:
+                    self.errors.append((key, spec, 'No such parameter'))
+                    continue
+                try:
+                    value = convert_value(param, value)
+                except ValueError as e:
+                    self.errors.append((key, spec, str(e)))
+                    continue
+                self.changes.set(element, spec, value)
+
+    def apply(self, name, log_path=None, chunk_size=1000):
+        """
+        Write the buffered changes in batched transactions and log them to
+        log_path. Returns the number of changes.
+        """
+        pending = self.changes.pending()
+        count = run_batched(self.doc, name, pending, self.changes.write,
+            key=lambda x: x.key, chunk_size=chunk_size)
+        self.report()
+        if log_path:
+            self.changes.write_report(log_path)
+            if self.errors:
+                self.write_errors(log_path.rsplit('.', 1)[0] + '_errors.csv')
+        return count
+
+    def report(self):
+        print('{} rows, {} unmatched, {} invalid values'.format(
+            self.rows, self.unmatched, len(self.errors)))
+        self.changes.report()
+        for key, spec, error in self.errors[:20]:
+            print('  {} {}: {}'.format(key, spec or '', error))
+
+    def write_errors(self, path):
+        with open(path, 'w') as f:
+            w = csv.writer(f, lineterminator='\n')
+            w.writerow(('Key', 'Parameter', 'Error'))
+            w.writerows(
+                (key, '' if spec is None else str(spec), error)
+                for key, spec, error in self.errors)
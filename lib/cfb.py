@@ -0,0 +1,187 @@
+"""
+Minimal read-only reader for OLE compound files (.rvt, .rfa), in pure
+Python so it runs without Revit.
+
+Only the sectors of the requested streams are read:
+
+    with CompoundFile(path) as cf:
+        if 'PartAtom' in cf:
+            xml = cf.read_stream('PartAtom')
+"""
+import struct
+
+
+SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+FREESECT = 0xFFFFFFFF
+ENDOFCHAIN = 0xFFFFFFFE
+FATSECT = 0xFFFFFFFD
+DIFSECT = 0xFFFFFFFC
+NOSTREAM = 0xFFFFFFFF
+
+STORAGE = 1
+STREAM = 2
+ROOT = 5
+
+
+class CompoundFileError(ValueError):
+    pass
+
+
+class DirectoryEntry(object):
+
+    def __init__(self, data):
+        name_length, = struct.unpack('<H', data[64:66])
+        self.name = data[:max(0, name_length - 2)].decode('utf-16-le')
+        self.type = ord(data[66:67])
+        self.left, self.right, self.child = struct.unpack('<III', data[68:80])
+        self.start, self.size = struct.unpack('<IQ', data[116:128])
+
+
+class CompoundFile(object):
+    """Read streams from a compound file by name, e.g. 'PartAtom'"""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            self._read_header()
+            self._read_fat()
+            self._read_directory()
+        except:
+            self._file.close()
+            raise
+        self._mini_fat = None
+        self._mini_stream = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def _read_header(self):
+        header = self._file.read(512)
+        if len(header) < 512 or header[:8] != SIGNATURE:
+            raise CompoundFileError('Not a compound file')
+        sector_shift, mini_shift = struct.unpack('<HH', header[30:34])
+        self.sector_size = 1 << sector_shift
+        self.mini_sector_size = 1 << mini_shift
+        (self._fat_count, self._first_dir, _, self._mini_cutoff,
+            self._first_mini_fat, self._mini_fat_count, self._first_difat,
+            self._difat_count) = struct.unpack('<IIIIIIII', header[44:76])
+        self._difat = [x for x in struct.unpack('<109I', header[76:512])
+            if x < DIFSECT]
+
+    def _read_sector(self, sector):
+        self._file.seek((sector + 1) * self.sector_size)
+        data = self._file.read(self.sector_size)
+        if len(data) < self.sector_size:
+            raise CompoundFileError('Truncated sector {}'.format(sector))
+        return data
+
+    def _read_fat(self):
+        per_sector = self.sector_size // 4
+        fat_sectors = list(self._difat)
+        sector = self._first_difat
+        for _ in range(self._difat_count):
+            if sector >= DIFSECT:
+                break
+            entries = struct.unpack(
+                '<{}I'.format(per_sector), self._read_sector(sector))
+            fat_sectors.extend(x for x in entries[:-1] if x < DIFSECT)
+            sector = entries[-1]
+
+        fat = []
+        for sector in fat_sectors[:self._fat_count]:
+            fat.extend(struct.unpack(
+                '<{}I'.format(per_sector), self._read_sector(sector)))
+        self._fat = fat
+
+    def _chain(self, start, fat):
+        chain = []
+        sector = start
+        limit = len(fat)
+        while sector < DIFSECT:
+            if sector >= limit or len(chain) > limit:
+                raise CompoundFileError('Broken sector chain')
+            chain.append(sector)
+            sector = fat[sector]
+        if sector != ENDOFCHAIN:
+            raise CompoundFileError('Broken sector chain')
+        return chain
+
+    def _read_chain(self, start, size=None):
+        data = b''.join(
+            self._read_sector(x) for x in self._chain(start, self._fat))
+        if size is not None:
+            if len(data) < size:
+                raise CompoundFileError('Truncated stream')
+            data = data[:size]
+        return data
+
+    def _read_directory(self):
+        data = self._read_chain(self._first_dir)
+        self.entries = [DirectoryEntry(data[i:i + 128])
+            for i in range(0, len(data), 128)]
+        if not self.entries or self.entries[0].type != ROOT:
+            raise CompoundFileError('Missing root entry')
+        self._paths = {}
+        self._walk(self.entries[0].child, '')
+
+    def _walk(self, index, prefix):
+        stack = [index]
+        seen = set()
+        while stack:
+            index = stack.pop()
+            if index == NOSTREAM or index in seen:
+                continue
+            if index >= len(self.entries):
+                raise CompoundFileError('Bad directory entry {}'.format(index))
+            seen.add(index)
+            entry = self.entries[index]
+            path = prefix + entry.name
+            self._paths[path] = entry
+            if entry.type == STORAGE:
+                self._walk(entry.child, path + '/')
+            stack.append(entry.left)
+            stack.append(entry.right)
+
+    def __contains__(self, path):
+        return path in self._paths
+
+    def streams(self):
+        """Paths of all streams, storages separated by '/'"""
+        return sorted(
+            x for x, entry in self._paths.items() if entry.type == STREAM)
+
+    def stream_size(self, path):
+        return self._paths[path].size
+
+    def read_stream(self, path):
+        entry = self._paths.get(path)
+        if entry is None or entry.type != STREAM:
+            raise KeyError(path)
+        if entry.size < self._mini_cutoff:
+            return self._read_mini_stream(entry.start, entry.size)
+        return self._read_chain(entry.start, entry.size)
+
+    def _read_mini_stream(self, start, size):
+        if size == 0:
+            return b''
+        if self._mini_fat is None:
+            data = self._read_chain(self._first_mini_fat) \
+                if self._mini_fat_count else b''
+            self._mini_fat = list(
+                struct.unpack('<{}I'.format(len(data) // 4), data))
+            root = self.entries[0]
+            self._mini_stream = self._read_chain(root.start, root.size)
+
+        mini = self.mini_sector_size
+        data = b''.join(
+            self._mini_stream[x * mini:(x + 1) * mini]
+            for x in self._chain(start, self._mini_fat))
+        if len(data) < size:
+            raise CompoundFileError('Truncated stream')
+        return data[:size]
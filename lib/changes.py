@@ -0,0 +1,186 @@
+"""
+Write-coalescing buffer for parameter changes.
+
+Commands record the writes they intend to make; the buffer keeps the last
+value per (element, parameter), drops writes matching the current value
+and applies the rest sorted by element id:
+
+    changes = ChangeBuffer()
+    for symbol in symbols:
+        changes.set(symbol, 'BIM ID', descriptor)
+    with transaction(doc, 'Populate BIM ID parameter'):
+        changes.apply()
+    changes.report()
+"""
+from collections import defaultdict
+import csv
+
+from lib.index import id_value
+
+try:
+    from Autodesk.Revit.DB import ElementId
+    from Autodesk.Revit.DB import StorageType
+except ImportError:
+    pass
+
+
+TOLERANCE = 1e-9
+
+
+def read_value(param):
+    """Current value of param in the form accepted by Parameter.Set"""
+    if param.StorageType == StorageType.String:
+        return param.AsString()
+    elif param.StorageType == StorageType.Double:
+        return param.AsDouble()
+    elif param.StorageType == StorageType.Integer:
+        return param.AsInteger()
+    return param.AsElementId()
+
+
+def convert_value(param, value):
+    """
+    Convert value to the storage type of param, as accepted by
+    Parameter.Set. Raises ValueError or TypeError if it can't be, e.g. a
+    None or text value for a number.
+    """
+    if param.StorageType == StorageType.String:
+        return '' if value is None else value
+    elif param.StorageType == StorageType.Double:
+        return float(value)
+    elif param.StorageType == StorageType.Integer:
+        return int(value)
+    if isinstance(value, ElementId):
+        return value
+    return ElementId(id_value(value))
+
+
+def values_equal(param, current, value):
+    if param.StorageType == StorageType.String:
+        return (current or '') == (value or '')
+    elif param.StorageType == StorageType.Double:
+        return abs(current - value) < TOLERANCE
+    elif param.StorageType == StorageType.Integer:
+        return current == int(value)
+    return current.IntegerValue == id_value(value)
+
+
+class Change(object):
+
+    def __init__(self, element, name, param, old, new):
+        self.element = element
+        self.name = name
+        self.param = param
+        self.old = old
+        self.new = new
+
+    @property
+    def key(self):
+        return '{}:{}'.format(self.element.UniqueId, self.name)
+
+
+class ChangeBuffer(object):
+    """Collect intended parameter writes and apply only the real changes"""
+
+    def __init__(self):
+        self._writes = {}
+        self.requested = 0
+        self.distinct = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.rejected = []
+        self.applied = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def set(self, element, param, value):
+        """
+        Record that param (a parameter name or BuiltInParameter) of element
+        should be value. Later writes to the same parameter replace earlier
+        ones.
+        """
+        self.requested += 1
+        name = param if isinstance(param, str) else str(param)
+        self._writes[(element.Id.IntegerValue, name)] = (element, param, value)
+
+    def pending(self):
+        """
+        Return the Changes whose value differs from the current value,
+        sorted by element id. Missing and read-only parameters are skipped,
+        values that can't be converted to the parameter's storage type are
+        rejected and listed in rejected as (element, name, value, reason).
+        """
+        changes = []
+        self.distinct = len(self._writes)
+        self.unchanged = 0
+        self.skipped = 0
+        self.rejected = []
+        for key in sorted(self._writes):
+            element, spec, value = self._writes[key]
+            if isinstance(spec, str):
+                param = element.LookupParameter(spec)
+            else:
+                param = element.get_Parameter(spec)
+            if not param or param.IsReadOnly:
+                self.skipped += 1
+                continue
+            try:
+                value = convert_value(param, value)
+            except (TypeError, ValueError) as e:
+                self.rejected.append((element, key[1], value, str(e)))
+                continue
+            current = read_value(param)
+            if values_equal(param, current, value):
+                self.unchanged += 1
+                continue
+            changes.append(Change(element, key[1], param, current, value))
+        return changes
+
+    def write(self, change):
+        """Write a single pending change, e.g. as a lib.batch action"""
+        change.param.Set(change.new)
+        self.applied.append(change)
+        return True
+
+    def apply(self):
+        """Write all pending changes; must be called inside a transaction"""
+        changes = self.pending()
+        for change in changes:
+            self.write(change)
+        return changes
+
+    def report(self):
+        """Print a compact summary of what actually changed"""
+        print('{} writes requested, {} distinct, {} unchanged, {} skipped, '
+            '{} rejected, {} applied'.format(
+                self.requested, self.distinct, self.unchanged, self.skipped,
+                len(self.rejected), len(self.applied)))
+        for element, name, value, reason in self.rejected[:20]:
+            print('  rejected {} {} = {!r}: {}'.format(
+                element.Id.IntegerValue, name, value, reason))
+        per_param = defaultdict(int)
+        for change in self.applied:
+            per_param[change.name] += 1
+        for name in sorted(per_param):
+            print('  {}: {}'.format(name, per_param[name]))
+
+    def write_report(self, path):
+        """Write the applied changes to a csv diff report"""
+        with open(path, 'w') as f:
+            w = csv.writer(f, lineterminator='\n')
+            w.writerow(('ID', 'Parameter', 'Old', 'New'))
+            for change in self.applied:
+                w.writerow((
+                    change.element.Id.IntegerValue,
+                    change.name,
+                    _format(change.old),
+                    _format(change.new)))
+
+
+def _format(value):
+    value = getattr(value, 'IntegerValue', value)
+    try:
+        return value.encode('utf-8')
+    except:
+        return value
@@ -0,0 +1,179 @@
+"""
+Incremental family library crawler.
+
+A local SQLite manifest records the size, mtime and content hash of every
+family under start_dir together with the type/parameter rows read from it,
+so later runs only open families that are new or have changed:
+
+    crawler = FamilyCrawler(start_dir, manifest_path, read_family_types)
+    crawler.run()
+    crawler.export_csv(csv_path)
+
+reader(filepath) must return (category, rows) where rows are
+(type name, parameter name, value) tuples.
+"""
+import csv
+import hashlib
+import os
+import sqlite3
+
+from lib import Walker
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL,
+    hash TEXT,
+    category TEXT
+);
+CREATE TABLE IF NOT EXISTS rows (
+    path TEXT,
+    type TEXT,
+    parameter TEXT,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS rows_path ON rows (path);
+'''
+
+
+def file_hash(filepath, block_size=1 << 20):
+    h = hashlib.sha1()
+    with open(filepath, 'rb') as f:
+        block = f.read(block_size)
+        while block:
+            h.update(block)
+            block = f.read(block_size)
+    return h.hexdigest()
+
+
+def _encode(value):
+    try:
+        return value.encode('utf-8')
+    except:
+        return value
+
+
+class FamilyCrawler(Walker):
+    """Walk a family library, reading only new or changed families"""
+
+    def __init__(self, start_dir, manifest_path, reader,
+            file_regex=r'.*\.rfa$', file_filter=None):
+        super(FamilyCrawler, self).__init__(start_dir, file_regex, self._visit)
+        self.reader = reader
+        self.file_filter = file_filter
+        self.conn = sqlite3.connect(manifest_path)
+        self.conn.executescript(SCHEMA)
+        self._seen = set()
+        self.read = 0
+        self.unchanged = 0
+        self.failed = 0
+
+    def run(self):
+        """Bring the manifest up to date with the files under start_dir"""
+        self._seen = set()
+        self.read = self.unchanged = self.failed = 0
+        super(FamilyCrawler, self).run()
+        removed = self._remove_missing()
+        print('{} read, {} unchanged, {} failed, {} removed'.format(
+            self.read, self.unchanged, self.failed, removed))
+
+    def _visit(self, filepath):
+        if self.file_filter and not self.file_filter(filepath):
+            return
+        self._seen.add(filepath)
+        stat = os.stat(filepath)
+        known = self.conn.execute(
+            'SELECT size, mtime, hash FROM files WHERE path = ?',
+            (filepath,)).fetchone()
+
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime:
+            self.unchanged += 1
+            return
+
+        digest = file_hash(filepath)
+        if known and known[2] == digest:
+            self.conn.execute(
+                'UPDATE files SET size = ?, mtime = ? WHERE path = ?',
+                (stat.st_size, stat.st_mtime, filepath))
+            self.conn.commit()
+            self.unchanged += 1
+            return
+
+        # Buffer the family's rows so a reader failing partway through
+        # leaves the rows of the last good read in place
+        try:
+            category, rows = self.reader(filepath)
+            rows = [(filepath,) + tuple(row) for row in rows]
+        except Exception as e:
+            print('{} - {}'.format(filepath, e))
+            self.failed += 1
+            return
+
+        try:
+            self.conn.execute('DELETE FROM rows WHERE path = ?', (filepath,))
+            self.conn.executemany('INSERT INTO rows VALUES (?, ?, ?, ?)', rows)
+            self.conn.execute(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+                (filepath, stat.st_size, stat.st_mtime, digest, category))
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+        self.read += 1
+        print(os.path.basename(filepath))
+
+    def _remove_missing(self):
+        prefix = os.path.join(self.start_dir, '')
+        missing = [path for (path,) in self.conn.execute(
+            'SELECT path FROM files') if path.startswith(prefix) and
+            path not in self._seen and
+            (not self.file_filter or self.file_filter(path))]
+        for path in missing:
+            self.conn.execute('DELETE FROM rows WHERE path = ?', (path,))
+            self.conn.execute('DELETE FROM files WHERE path = ?', (path,))
+        self.conn.commit()
+        return len(missing)
+
+    def rows(self):
+        """
+        Yield (source, category, filename, type, parameter, value) rows of
+        every family under start_dir
+        """
+        prefix = os.path.join(self.start_dir, '')
+        cursor = self.conn.execute(
+            'SELECT files.path, category, type, parameter, value '
+            'FROM rows JOIN files ON rows.path = files.path '
+            'ORDER BY files.path')
+        for path, category, type_name, parameter, value in cursor:
+            if not path.startswith(prefix):
+                continue
+            if self.file_filter and not self.file_filter(path):
+                continue
+            yield (self.start_dir, category, os.path.basename(path),
+                type_name, parameter, value)
+
+    def export_csv(self, csv_path, category=False, skip_empty=False):
+        """
+        Write the rows to csv_path in the Source, Family, Type, Parameter
+        Name, Parameter Value format, with a Category column after Source
+        if category is True and without empty values if skip_empty is True
+        """
+        columns = [
+            'Source', 'Category', 'Family', 'Type', 'Parameter Name',
+            'Parameter Value']
+        if not category:
+            del columns[1]
+        with open(csv_path, 'w') as f:
+            w = csv.writer(f, lineterminator='\n')
+            w.writerow(columns)
+            for row in self.rows():
+                if skip_empty and not row[-1]:
+                    continue
+                if not category:
+                    row = row[:1] + row[2:]
+                w.writerow([_encode(x) for x in row])
+
+    def close(self):
+        self.conn.close()
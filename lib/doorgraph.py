@@ -0,0 +1,188 @@
+"""
+Door/room adjacency graph of a phase.
+
+Rooms are nodes and doors are edges between their to and from rooms, read
+once per phase and cached per document:
+
+    graph = get_door_graph(doc, phase)
+    graph.doors_of(room.Id)             # [Door(id, mark, to_room, from_room)]
+    graph.path(room_a.Id, room_b.Id)    # [door ids] through the fewest doors
+    graph.rooms_without_doors()
+    graph.missing_rooms()               # doors with no to or from room
+    graph.save(path); DoorGraph.load(path)
+
+A door with only one room opens to the outside or to an area with no room.
+Doors whose rooms can't be read are kept in errors rather than dropped.
+"""
+from collections import defaultdict
+from collections import deque
+from collections import namedtuple
+import json
+
+from lib import get_document_cache
+from lib.index import get_index
+from lib.index import id_value
+
+try:
+    from Autodesk.Revit.DB import BuiltInCategory
+    from Autodesk.Revit.DB import BuiltInParameter
+    from Autodesk.Revit.DB import ElementOnPhaseStatus
+    from Autodesk.Revit.DB import FamilyInstance
+except ImportError:
+    pass
+
+
+Door = namedtuple('Door', 'id mark to_room from_room')
+Room = namedtuple('Room', 'id number name')
+
+
+class DoorGraph(object):
+
+    def __init__(self, phase=''):
+        self.phase = phase
+        self.rooms = {}
+        self.doors = {}
+        self.errors = []
+        self._room_doors = defaultdict(list)
+
+    def add_room(self, id, number, name):
+        self.rooms[id] = Room(id, number, name)
+
+    def add_door(self, id, mark, to_room=None, from_room=None):
+        door = self.doors[id] = Door(id, mark, to_room, from_room)
+        for room_id in {to_room, from_room}:
+            if room_id is not None:
+                self._room_doors[room_id].append(door)
+        return door
+
+    def doors_of(self, room):
+        return self._room_doors.get(id_value(room), [])
+
+    def neighbours(self, room):
+        """Map of adjacent room id -> doors between the two rooms"""
+        room_id = id_value(room)
+        adjacent = defaultdict(list)
+        for door in self.doors_of(room_id):
+            other = door.from_room if door.to_room == room_id else door.to_room
+            if other is not None and other != room_id:
+                adjacent[other].append(door)
+        return adjacent
+
+    def path(self, start, end):
+        """
+        Door ids of a route from start to end through the fewest doors,
+        [] if start is end and None if there is no route
+        """
+        start = id_value(start)
+        end = id_value(end)
+        previous = {start: None}
+        queue = deque([start])
+        while queue:
+            room_id = queue.popleft()
+            if room_id == end:
+                break
+            for other, doors in self.neighbours(room_id).items():
+                if other not in previous:
+                    previous[other] = (room_id, doors[0].id)
+                    queue.append(other)
+        if end not in previous:
+            return None
+        doors = []
+        step = previous[end]
+        while step is not None:
+            room_id, door_id = step
+            doors.append(door_id)
+            step = previous[room_id]
+        return doors[::-1]
+
+    def rooms_without_doors(self):
+        return [x for x in self.rooms.values() if x.id not in self._room_doors]
+
+    def missing_rooms(self):
+        """Doors without a to room or a from room"""
+        return [
+            x for x in self.doors.values()
+            if x.to_room is None or x.from_room is None]
+
+    def to_dict(self):
+        return {
+            'phase': self.phase,
+            'rooms': [list(x) for x in self.rooms.values()],
+            'doors': [list(x) for x in self.doors.values()],
+            'errors': self.errors,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        graph = cls(data['phase'])
+        for room in data['rooms']:
+            graph.add_room(*room)
+        for door in data['doors']:
+            graph.add_door(*door)
+        graph.errors = [tuple(x) for x in data['errors']]
+        return graph
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def _room_id(room):
+    return None if room is None else room.Id.IntegerValue
+
+
+def _string(element, bip):
+    param = element.get_Parameter(bip)
+    return (param.AsString() if param else None) or ''
+
+
+def last_phase(doc):
+    return doc.Phases[doc.Phases.Size - 1]
+
+
+def build_door_graph(doc, phase):
+    """DoorGraph of the rooms and doors of doc that exist in phase"""
+    index = get_index(doc)
+    graph = DoorGraph(phase.Name)
+    phase_id = phase.Id.IntegerValue
+
+    for room in index.of_category(BuiltInCategory.OST_Rooms):
+        if room.Location is None:
+            continue
+        room_phase = room.get_Parameter(BuiltInParameter.ROOM_PHASE_ID)
+        if room_phase and room_phase.AsElementId().IntegerValue != phase_id:
+            continue
+        graph.add_room(
+            room.Id.IntegerValue,
+            _string(room, BuiltInParameter.ROOM_NUMBER),
+            _string(room, BuiltInParameter.ROOM_NAME))
+
+    absent = (ElementOnPhaseStatus.Future, ElementOnPhaseStatus.Past)
+    for door in index.of_class_and_category(
+            FamilyInstance, BuiltInCategory.OST_Doors):
+        door_id = door.Id.IntegerValue
+        try:
+            if door.GetPhaseStatus(phase.Id) in absent:
+                continue
+            graph.add_door(
+                door_id,
+                _string(door, BuiltInParameter.ALL_MODEL_MARK),
+                _room_id(door.ToRoom[phase]),
+                _room_id(door.FromRoom[phase]))
+        except Exception as e:
+            graph.errors.append((door_id, str(e)))
+    return graph
+
+
+def get_door_graph(doc, phase=None):
+    """Return the DoorGraph of phase (default the last phase) of doc"""
+    if phase is None:
+        phase = last_phase(doc)
+    return get_document_cache(doc).get(
+        ('doorgraph', phase.Id.IntegerValue),
+        lambda: build_door_graph(doc, phase))
@@ -0,0 +1,218 @@
+"""
+Exact and near-duplicate detection for family types.
+
+Exact duplicates share a composite key: the values of any list of
+parameters. Near-duplicates are found from token sets (character shingles
+of the family and type name plus 'parameter=value' tokens) with MinHash
+signatures and LSH banding, so only types sharing a band are compared
+rather than all pairs. Similar pairs are joined into clusters:
+
+    clusters = find_duplicates(symbols, ['Descriptor_TX', 'Width'])
+
+Signatures use one permutation hashing: each token is hashed once with a
+universal hash of its crc32, the hash picks one of num_perm bins and the
+minimum per bin is kept, with empty bins filled from the next non-empty
+bin. That costs one hash per token instead of num_perm, which is what
+makes 100k types practical in pure Python.
+"""
+from collections import defaultdict
+from collections import namedtuple
+import random
+import re
+import zlib
+
+from lib.paramtable import extract_parameters
+
+try:
+    from Autodesk.Revit.DB import BuiltInParameter
+except ImportError:
+    pass
+
+
+Cluster = namedtuple('Cluster', 'kind key members')
+
+EXACT = 'exact'
+NEAR = 'near'
+PRIME = (1 << 61) - 1
+NAME_SEPARATORS = re.compile(r'[-_\s]+')
+
+
+class UnionFind(object):
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        parent = self.parent
+        root = parent.setdefault(x, x)
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        a = self.find(a)
+        b = self.find(b)
+        if a != b:
+            self.parent[b] = a
+
+    def groups(self):
+        groups = defaultdict(list)
+        for x in self.parent:
+            groups[self.find(x)].append(x)
+        return [x for x in groups.values() if len(x) > 1]
+
+
+class MinHasher(object):
+    """One permutation MinHash signatures of token sets"""
+
+    def __init__(self, num_perm=24, seed=1):
+        rnd = random.Random(seed)
+        self.num_perm = num_perm
+        self.a = rnd.randrange(1, PRIME)
+        self.b = rnd.randrange(0, PRIME)
+        self._tokens = {}
+
+    def _hash(self, token):
+        h = self._tokens.get(token)
+        if h is None:
+            data = token if isinstance(token, bytes) else token.encode('utf-8')
+            x = zlib.crc32(data) & 0xffffffff
+            h = (self.a * x + self.b) % PRIME
+            h = self._tokens[token] = (h % self.num_perm, h // self.num_perm)
+        return h
+
+    def signature(self, tokens):
+        num_perm = self.num_perm
+        cache = self._tokens
+        bins = [None] * num_perm
+        for token in tokens:
+            i, value = cache.get(token) or self._hash(token)
+            current = bins[i]
+            if current is None or value < current:
+                bins[i] = value
+        if None in bins:
+            # Densify: take the next non-empty bin to the right, offset by
+            # the distance so borrowed values differ from the originals
+            last = None
+            for i in range(2 * num_perm - 1, -1, -1):
+                j = i % num_perm
+                if bins[j] is not None and not isinstance(bins[j], tuple):
+                    last = i
+                elif last is not None and i < num_perm:
+                    bins[j] = (bins[last % num_perm], last - i)
+        return tuple(bins)
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    common = len(a & b)
+    return common / float(len(a) + len(b) - common)
+
+
+def name_tokens(text, k=3):
+    """Character k-shingles of text, case and separator insensitive"""
+    text = ' '.join(NAME_SEPARATORS.split(text.lower())).strip()
+    if len(text) <= k:
+        return {text}
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+
+def near_duplicates(items, threshold=0.8, num_perm=24, bands=6,
+        max_pairs=50, partition=None):
+    """
+    Cluster items, a list of (key, token set), whose token sets have a
+    Jaccard similarity of at least threshold. Returns lists of keys.
+    Pairs with the same partition[key] (e.g. types of one family) are not
+    compared.
+
+    Each band of num_perm / bands signature values is bucketed; items
+    sharing a bucket are candidates and are verified on their token sets.
+    With 6 bands of 4 values, pairs with similarity 0.8 are candidates 96%
+    of the time and pairs below 0.4 rarely are.
+    Buckets larger than max_pairs are compared against their first item
+    only.
+    """
+    hasher = MinHasher(num_perm)
+    rows = num_perm // bands
+    tokens = {}
+    buckets = defaultdict(list)
+    for key, item_tokens in items:
+        tokens[key] = item_tokens
+        signature = hasher.signature(item_tokens)
+        for band in range(bands):
+            buckets[(band, signature[band * rows:(band + 1) * rows])].append(
+                key)
+
+    uf = UnionFind()
+    for bucket in buckets.values():
+        if len(bucket) < 2:
+            continue
+        if len(bucket) > max_pairs:
+            pairs = ((bucket[0], x) for x in bucket[1:])
+        else:
+            pairs = (
+                (x, y) for i, x in enumerate(bucket) for y in bucket[i + 1:])
+        for x, y in pairs:
+            if uf.find(x) == uf.find(y):
+                continue
+            if partition is not None and partition[x] == partition[y]:
+                continue
+            a = tokens[x]
+            b = tokens[y]
+            # Jaccard similarity is at most the ratio of the set sizes
+            if min(len(a), len(b)) < threshold * max(len(a), len(b)):
+                continue
+            if jaccard(a, b) >= threshold:
+                uf.union(x, y)
+    return uf.groups()
+
+
+def find_duplicates(symbols, key_params, signature_params=None, near=True,
+        threshold=0.8):
+    """
+    Return Clusters of symbols that share the values of key_params
+    (exact), and if near is True, clusters of symbols whose names and
+    signature_params (key_params by default) are near-duplicates
+    """
+    symbols = list(symbols)
+    if signature_params is None:
+        signature_params = key_params
+    params = list(key_params) + [
+        x for x in signature_params if x not in key_params]
+    table = extract_parameters(
+        symbols, [BuiltInParameter.ALL_MODEL_TYPE_NAME] + params)
+    type_names = table.values(BuiltInParameter.ALL_MODEL_TYPE_NAME)
+    columns = {x: table.values(x) for x in params}
+
+    clusters = []
+    groups = defaultdict(list)
+    for i in range(len(symbols)):
+        key = tuple(columns[x][i] for x in key_params)
+        if any(x is not None and x != '' for x in key):
+            groups[key].append(i)
+    for key, members in groups.items():
+        if len(members) > 1:
+            clusters.append(Cluster(
+                EXACT, key, [symbols[i] for i in members]))
+
+    if near:
+        items = []
+        families = []
+        for i, symbol in enumerate(symbols):
+            family = symbol.Family
+            families.append(family.Id.IntegerValue)
+            item_tokens = name_tokens('{} {}'.format(
+                family.Name, type_names[i] or ''))
+            item_tokens.update(
+                '{}={}'.format(x, columns[x][i]) for x in signature_params
+                if columns[x][i] is not None)
+            items.append((i, item_tokens))
+        for members in near_duplicates(items, threshold, partition=families):
+            members.sort()
+            clusters.append(Cluster(
+                NEAR, None, [symbols[i] for i in members]))
+
+    return clusters
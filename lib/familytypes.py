@@ -0,0 +1,68 @@
+"""
+Streaming writers for the types of a family document.
+
+The column schema is fixed from FamilyManager.GetParameters() before any
+type is read, so each FamilyType is written as soon as it is read and
+memory doesn't grow with the number of types:
+
+    with open(csv_path, 'w') as f:
+        write_wide(doc.FamilyManager, f)
+
+write_wide gives one row per type and one column per parameter, in the
+family's parameter order; write_long one row per (type, parameter) value.
+"""
+import csv
+
+
+def family_parameters(fm):
+    """Parameters of the family manager in order, one per column name"""
+    params = []
+    names = set()
+    for param in fm.GetParameters():
+        name = param.Definition.Name
+        if name not in names:
+            names.add(name)
+            params.append(param)
+    return params
+
+
+def type_value(family_type, param):
+    return family_type.AsValueString(param) or family_type.AsString(param)
+
+
+def iter_type_values(fm, params=None):
+    """Yield (type name, [value per parameter]) for every type"""
+    if params is None:
+        params = family_parameters(fm)
+    for family_type in fm.Types:
+        yield family_type.Name, [type_value(family_type, p) for p in params]
+
+
+def write_wide(fm, f):
+    """Write one row per type to file f, returning the number of types"""
+    params = family_parameters(fm)
+    w = csv.writer(f, lineterminator='\n')
+    w.writerow(['Type'] + [p.Definition.Name for p in params])
+    count = 0
+    for name, values in iter_type_values(fm, params):
+        w.writerow([name] + [x or '' for x in values])
+        count += 1
+    return count
+
+
+def write_long(fm, f):
+    """
+    Write one (Type, Parameter, Value) row per non-empty value to file f,
+    returning the number of types
+    """
+    params = family_parameters(fm)
+    names = [p.Definition.Name for p in params]
+    w = csv.writer(f, lineterminator='\n')
+    w.writerow(('Type', 'Parameter', 'Value'))
+    count = 0
+    for type_name, values in iter_type_values(fm, params):
+        w.writerows(
+            (type_name, name, value)
+            for name, value in zip(names, values) if value)
+        count += 1
+    return count
@@ -0,0 +1,233 @@
+"""
+Family health checks with cached verdicts and per-family timing.
+
+Verdicts are cached in a JSON file keyed by family name plus a version
+(the element VersionGuid where the Revit API has it, the content hash for
+.rfa files), so families unchanged since the last run are not checked
+again. Timeouts are reported but not cached, so slow families are retried.
+
+check_families opens and closes each loaded family with EditFamily inside
+Revit. The Revit API is single threaded so a check can't be interrupted
+there; a family exceeding the timeout is reported as 'timeout'.
+
+check_file_structures doesn't open families in Revit: it is a structural
+check of saved-out .rfa copies, reading every stream of the compound file
+and parsing the PartAtom xml. A family can pass it and still fail to open.
+Under CPython the checks run in worker processes which are killed when
+they exceed the timeout, writing the same verdict cache:
+
+    python -m lib.health "H:\\Families\\Saved" family_health.json
+
+IronPython has no multiprocessing, so inside Revit the files are checked
+one at a time and a slow file can't be stopped. Files are only hashed
+when their size or mtime differs from the last run.
+"""
+import json
+import os
+import sys
+import time
+
+from lib import Walker
+from lib.cfb import CompoundFile
+from lib.crawler import file_hash
+from lib.rfa import PART_ATOM
+from lib.rfa import parse_part_atom
+
+try:
+    import multiprocessing
+except ImportError:
+    # IronPython has no multiprocessing, files are checked serially
+    multiprocessing = None
+
+
+OK = 'ok'
+CORRUPT = 'corrupt'
+TIMEOUT = 'timeout'
+
+
+class VerdictCache(object):
+    """
+    JSON backed map of family key -> {'verdict', 'seconds', 'error'}, with
+    the size, mtime and hash of every checked file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.verdicts = {}
+        self.files = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            if 'verdicts' in data:
+                self.verdicts = data['verdicts']
+                self.files = data['files']
+            else:
+                self.verdicts = data
+
+    def get(self, key):
+        return self.verdicts.get(key)
+
+    def file_key(self, filepath):
+        """Key of a .rfa file, hashing it only if its size or mtime changed"""
+        stat = os.stat(filepath)
+        known = self.files.get(filepath)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime:
+            digest = known[2]
+        else:
+            digest = file_hash(filepath)
+            self.files[filepath] = [stat.st_size, stat.st_mtime, digest]
+        return '{}|{}'.format(os.path.basename(filepath), digest)
+
+    def set(self, key, verdict, seconds, error=None):
+        self.verdicts[key] = {
+            'verdict': verdict, 'seconds': seconds, 'error': error}
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump(
+                {'verdicts': self.verdicts, 'files': self.files}, f,
+                indent=1, sort_keys=True)
+
+
+def family_key(family):
+    version = getattr(family, 'VersionGuid', None) or family.UniqueId
+    return '{}|{}'.format(family.Name, version)
+
+
+def check_families(doc, families, cache, timeout=60):
+    """
+    Open and close every family in doc, yielding (family, verdict, seconds,
+    cached) and caching new verdicts
+    """
+    for family in families:
+        key = family_key(family)
+        known = cache.get(key)
+        if known:
+            yield family, known['verdict'], known['seconds'], True
+            continue
+
+        start = time.time()
+        error = None
+        try:
+            fam_doc = doc.EditFamily(family)
+            fam_doc.Close(False)
+            verdict = OK
+        except Exception as e:
+            verdict = CORRUPT
+            error = str(e)
+        seconds = time.time() - start
+        if verdict == OK and seconds > timeout:
+            verdict = TIMEOUT
+        else:
+            cache.set(key, verdict, seconds, error)
+        yield family, verdict, seconds, False
+    cache.save()
+
+
+def check_structure(filepath):
+    """
+    Structural check of a saved .rfa: every stream of the compound file
+    must be readable and the PartAtom xml must parse
+    """
+    with CompoundFile(filepath) as cf:
+        for path in cf.streams():
+            data = cf.read_stream(path)
+            if path == PART_ATOM:
+                parse_part_atom(data)
+
+
+def _check_file_worker(filepath, queue):
+    try:
+        check_structure(filepath)
+        queue.put((filepath, OK, None))
+    except Exception as e:
+        queue.put((filepath, CORRUPT, str(e)))
+
+
+def _check_file_serial(filepath):
+    try:
+        check_structure(filepath)
+        return OK, None
+    except Exception as e:
+        return CORRUPT, str(e)
+
+
+def check_file_structures(filepaths, cache, timeout=60, processes=4):
+    """
+    Check the structure of .rfa files (see check_structure), running up to
+    processes checks at once in worker processes that are terminated after
+    timeout seconds. Without multiprocessing, or with processes=1, files
+    are checked serially and timeout is ignored. Yields (filepath, verdict,
+    seconds, cached).
+    """
+    todo = []
+    for filepath in filepaths:
+        key = cache.file_key(filepath)
+        known = cache.get(key)
+        if known:
+            yield filepath, known['verdict'], known['seconds'], True
+        else:
+            todo.append((filepath, key))
+
+    if multiprocessing is None or processes == 1:
+        for filepath, key in todo:
+            start = time.time()
+            verdict, error = _check_file_serial(filepath)
+            seconds = time.time() - start
+            cache.set(key, verdict, seconds, error)
+            yield filepath, verdict, seconds, False
+        cache.save()
+        return
+
+    queue = multiprocessing.Queue()
+    running = {}
+    keys = dict(todo)
+    todo.reverse()
+    while todo or running:
+        while todo and len(running) < processes:
+            filepath, key = todo.pop()
+            process = multiprocessing.Process(
+                target=_check_file_worker, args=(filepath, queue))
+            process.start()
+            running[filepath] = (process, time.time())
+
+        # Collect every finished result before looking for timeouts, so a
+        # worker that has already reported isn't also killed as one
+        wait = 0.1
+        while True:
+            try:
+                filepath, verdict, error = queue.get(timeout=wait)
+            except Exception:
+                break
+            wait = 0
+            if filepath not in running:
+                continue
+            process, start = running.pop(filepath)
+            process.join()
+            seconds = time.time() - start
+            cache.set(keys[filepath], verdict, seconds, error)
+            yield filepath, verdict, seconds, False
+
+        now = time.time()
+        for filepath, (process, start) in list(running.items()):
+            if now - start > timeout:
+                process.terminate()
+                process.join()
+                del running[filepath]
+                yield filepath, TIMEOUT, now - start, False
+
+    cache.save()
+
+
+if __name__ == '__main__':
+    processes = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    timeout = float(sys.argv[4]) if len(sys.argv) > 4 else 60
+    counts = {}
+    paths = Walker(sys.argv[1], r'.*\.rfa$', None).files()
+    for filepath, verdict, seconds, cached in check_file_structures(
+            paths, VerdictCache(sys.argv[2]), timeout, processes):
+        counts[verdict] = counts.get(verdict, 0) + 1
+        if verdict != OK:
+            print('{} - {} ({:.1f}s)'.format(filepath, verdict, seconds))
+    print(', '.join(
+        '{} {}'.format(n, verdict) for verdict, n in sorted(counts.items())))
@@ -0,0 +1,114 @@
+"""
+Memoized host lookups for hosted family instances.
+
+Many doors and windows share a host wall, and many walls share a type, so
+HostCache resolves host -> host type once per host and the host type's
+attributes once per type:
+
+    for element, attributes in hosted_elements(doc, [
+            BuiltInCategory.OST_Doors, BuiltInCategory.OST_Windows]):
+        attributes['Wall Type'], attributes['Wall Width']
+
+attributes is a list of (name, getter) pairs taking the host type; the
+default reads the wall type name, Wall_Mark_TX and width in mm.
+"""
+from constants import MM
+from lib.index import get_index
+
+try:
+    from Autodesk.Revit.DB import BuiltInParameter
+    from Autodesk.Revit.DB import FamilyInstance
+    from Autodesk.Revit.DB import WallType
+except ImportError:
+    pass
+
+
+def _type_name(element_type):
+    return element_type.get_Parameter(
+        BuiltInParameter.ALL_MODEL_TYPE_NAME).AsString()
+
+
+def _wall_mark(element_type):
+    param = element_type.LookupParameter('Wall_Mark_TX')
+    return (param.AsString() if param else None) or ''
+
+
+def _width_mm(element_type):
+    return element_type.Width * MM
+
+
+WALL_ATTRIBUTES = [
+    ('Wall Type', _type_name),
+    ('Wall Code', _wall_mark),
+    ('Wall Width', _width_mm),
+]
+
+
+class HostCache(object):
+
+    def __init__(self, doc, attributes=WALL_ATTRIBUTES, type_class=None):
+        self.index = get_index(doc)
+        self.attributes = attributes
+        self.type_class = WallType if type_class is None else type_class
+        self._host_types = {}
+        self._type_attributes = {}
+        self._last = (None, None)
+        self.hits = 0
+        self.misses = 0
+
+    def host_type_id(self, element):
+        """Type id of the host of element, or None if it has no host"""
+        host = element.Host
+        if host is None:
+            return None
+        host_id = host.Id.IntegerValue
+        type_id = self._host_types.get(host_id)
+        if type_id is None:
+            type_id = self._host_types[host_id] = host.GetTypeId().IntegerValue
+        return type_id
+
+    def type_attributes(self, type_id):
+        """Attributes of the host type as a dict, None if not of type_class"""
+        if type_id in self._type_attributes:
+            self.hits += 1
+            return self._type_attributes[type_id]
+        self.misses += 1
+        element_type = self.index.get(type_id)
+        if not isinstance(element_type, self.type_class):
+            attributes = None
+        else:
+            attributes = {
+                name: getter(element_type) for name, getter in self.attributes}
+        self._type_attributes[type_id] = attributes
+        return attributes
+
+    def host_attributes(self, element):
+        # Reports ask for several attributes of the same element in a row
+        element_id = element.Id.IntegerValue
+        if self._last[0] == element_id:
+            return self._last[1]
+        type_id = self.host_type_id(element)
+        attributes = None if type_id is None else self.type_attributes(type_id)
+        self._last = (element_id, attributes)
+        return attributes
+
+    def hosted(self, elements):
+        """Yield (element, host attributes) for elements with a matching host"""
+        for element in elements:
+            attributes = self.host_attributes(element)
+            if attributes is not None:
+                yield element, attributes
+
+
+def hosted_elements(doc, categories, hosts=None):
+    """
+    Yield (instance, host attributes) for the family instances of
+    categories (BuiltInCategory values) with a matching host
+    """
+    if hosts is None:
+        hosts = HostCache(doc)
+    index = get_index(doc)
+    for category in categories:
+        instances = index.of_class_and_category(FamilyInstance, category)
+        for item in hosts.hosted(instances):
+            yield item
@@ -0,0 +1,121 @@
+"""
+Single pass index of every element in a document, bucketed by class,
+category, level and workset
+"""
+from collections import defaultdict
+
+from lib import get_document_cache
+
+try:
+    from Autodesk.Revit.DB import ElementIsElementTypeFilter
+    from Autodesk.Revit.DB import FilteredElementCollector
+    from Autodesk.Revit.DB import LogicalOrFilter
+except ImportError:
+    # Outside Revit the index is built from lib.standin documents
+    pass
+
+
+def id_value(x):
+    """Integer value of an ElementId, BuiltInCategory or plain int"""
+    value = getattr(x, 'IntegerValue', None)
+    if value is None:
+        value = int(x)
+    return value
+
+
+def all_elements(doc):
+    """Collect every element and element type of doc in one collector"""
+    return FilteredElementCollector(doc).WherePasses(LogicalOrFilter(
+        ElementIsElementTypeFilter(False),
+        ElementIsElementTypeFilter(True)))
+
+
+class ElementIndex(object):
+    """
+    Walk the document once and bucket every element by class, category,
+    level and workset, plus an ElementId -> element map.
+
+    Query methods accept ElementIds, BuiltInCategory values or plain ints and
+    return the index's own lists, which must not be modified.
+    """
+
+    def __init__(self, doc, elements=None):
+        self._doc = doc
+        self._by_id = {}
+        self._by_type = defaultdict(list)
+        self._by_category = defaultdict(list)
+        self._by_level = defaultdict(list)
+        self._by_workset = defaultdict(list)
+        self._class_cache = {}
+        if elements is None:
+            elements = all_elements(doc)
+        self._build(elements)
+
+    def _build(self, elements):
+        by_id = self._by_id
+        by_type = self._by_type
+        by_category = self._by_category
+        by_level = self._by_level
+        by_workset = self._by_workset
+
+        for element in elements:
+            by_id[element.Id.IntegerValue] = element
+            by_type[type(element)].append(element)
+            category = element.Category
+            if category is not None:
+                by_category[category.Id.IntegerValue].append(element)
+            by_level[element.LevelId.IntegerValue].append(element)
+            by_workset[element.WorksetId.IntegerValue].append(element)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    def get(self, element_id):
+        return self._by_id.get(id_value(element_id))
+
+    def of_class(self, cls):
+        """All elements of cls or any of its subclasses, like OfClass"""
+        elements = self._class_cache.get(cls)
+        if elements is None:
+            elements = []
+            for element_type, bucket in self._by_type.items():
+                if issubclass(element_type, cls):
+                    elements.extend(bucket)
+            self._class_cache[cls] = elements
+        return elements
+
+    def of_category(self, category):
+        return self._by_category.get(id_value(category), [])
+
+    def of_class_and_category(self, cls, category):
+        return [x for x in self.of_category(category) if isinstance(x, cls)]
+
+    def on_level(self, level_id):
+        return self._by_level.get(id_value(level_id), [])
+
+    def on_workset(self, workset_id):
+        return self._by_workset.get(id_value(workset_id), [])
+
+    @property
+    def classes(self):
+        return list(self._by_type)
+
+    @property
+    def category_ids(self):
+        return list(self._by_category)
+
+    @property
+    def level_ids(self):
+        return list(self._by_level)
+
+    @property
+    def workset_ids(self):
+        return list(self._by_workset)
+
+
+def get_index(doc):
+    """Return the ElementIndex of doc, building it on first use"""
+    return get_document_cache(doc).get('index', lambda: ElementIndex(doc))
@@ -0,0 +1,103 @@
+"""
+Collision-free mark allocation.
+
+MarkAllocator indexes every existing mark, optionally per scope (e.g. per
+category), and hands out '<base>-<n>' marks that are guaranteed unique.
+The next suffix is remembered per base, so allocating is O(1) amortised:
+
+    allocator = MarkAllocator()
+    allocator.update(existing_marks)
+    new_mark = allocator.allocate('D01')
+
+Numbering schemes are functions returning the base mark of an element,
+e.g. level_scheme numbers elements per level as 'LEVEL 1-0001'.
+"""
+from collections import defaultdict
+
+from lib.index import get_index
+
+try:
+    from Autodesk.Revit.DB import BuiltInParameter
+except ImportError:
+    pass
+
+
+class MarkAllocator(object):
+
+    def __init__(self, fmt='{}-{}'):
+        self.fmt = fmt
+        self._used = defaultdict(set)
+        self._next = {}
+
+    def add(self, mark, scope=None):
+        self._used[scope].add(mark)
+
+    def update(self, marks, scope=None):
+        self._used[scope].update(marks)
+
+    def __contains__(self, mark):
+        return any(mark in x for x in self._used.values())
+
+    def is_used(self, mark, scope=None):
+        return mark in self._used[scope]
+
+    def allocate(self, base, scope=None, fmt=None):
+        """Return an unused mark '<base>-<n>' in scope and reserve it"""
+        fmt = fmt or self.fmt
+        used = self._used[scope]
+        key = (scope, base, fmt)
+        i = self._next.get(key, 1)
+        mark = fmt.format(base, i)
+        while mark in used:
+            i += 1
+            mark = fmt.format(base, i)
+        used.add(mark)
+        self._next[key] = i + 1
+        return mark
+
+
+def get_mark(element):
+    param = element.get_Parameter(BuiltInParameter.ALL_MODEL_MARK)
+    if param:
+        return param.AsString()
+
+
+def index_marks(elements, scope=None):
+    """
+    Read the mark of every element into a MarkAllocator and group elements
+    with a mark by (scope, mark). scope is a function of the element such as
+    category_scope, or None for marks unique across the document.
+    Returns (allocator, groups).
+    """
+    allocator = MarkAllocator()
+    groups = defaultdict(list)
+    for element in elements:
+        mark = get_mark(element)
+        if not mark:
+            continue
+        key = scope(element) if scope else None
+        allocator.add(mark, key)
+        groups[(key, mark)].append(element)
+    return allocator, groups
+
+
+def category_scope(element):
+    """Scope marks per category, as Revit's duplicate mark warning does"""
+    category = element.Category
+    return category.Id.IntegerValue if category else None
+
+
+def level_scheme(doc):
+    """Numbering scheme giving marks like 'LEVEL 1-0001' per level"""
+    index = get_index(doc)
+    names = {}
+
+    def scheme(element):
+        level_id = element.LevelId.IntegerValue
+        name = names.get(level_id)
+        if name is None:
+            level = index.get(level_id)
+            name = names[level_id] = level.Name if level else 'XX'
+        return name
+
+    return scheme
@@ -0,0 +1,174 @@
+"""
+Grouped statistics and outliers of numeric parameters.
+
+NumericAudit reads any number of double or integer parameters of a set of
+elements into compact arrays grouped by a key such as family, type or
+level, then summarises each (group, parameter) column and flags outliers
+by z-score and interquartile range:
+
+    audit = NumericAudit([
+        ('Offset', BuiltInParameter.INSTANCE_FREE_HOST_OFFSET_PARAM),
+        ('Height', 'Height'),
+    ], group_by=GROUP_BY['type'])
+    audit.load(doc, elements)
+    for group, column, summary in audit.summaries():
+        summary.median, summary.q3, histogram(...)
+    for outlier in audit.outliers(z=3.0, k=1.5):
+        ...
+
+Elements are read in batches through lib.paramtable.extract_parameters,
+so values are in display units. Yes/no, string and element id parameters
+are skipped. Everything is plain Python so it runs under IronPython,
+where NumPy isn't available: each column is an array('d'), sorted and
+summarised once however often its Summary is used.
+"""
+from array import array
+from collections import defaultdict
+from collections import namedtuple
+import math
+
+from lib.paramtable import DOUBLE
+from lib.paramtable import INTEGER
+from lib.paramtable import extract_parameters
+from lib.reporting import ReportContext
+from lib.reporting import family_name
+from lib.reporting import level_name
+from lib.reporting import type_name
+
+
+Summary = namedtuple(
+    'Summary', 'count mean std min p5 q1 median q3 p95 max')
+
+Outlier = namedtuple(
+    'Outlier', 'element_id group column value score low high method')
+
+
+def percentile(values, q):
+    """q-th percentile (0-100) of sorted values, linearly interpolated"""
+    position = (len(values) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    fraction = position - lower
+    return values[lower] + (values[upper] - values[lower]) * fraction
+
+
+def summarise(values):
+    """Summary of a sequence of numbers, None if empty"""
+    if not values:
+        return None
+    values = sorted(values)
+    n = len(values)
+    mean = math.fsum(values) / n
+    variance = math.fsum((x - mean) ** 2 for x in values) / n
+    return Summary(
+        n, mean, math.sqrt(variance), values[0],
+        percentile(values, 5), percentile(values, 25),
+        percentile(values, 50), percentile(values, 75),
+        percentile(values, 95), values[-1])
+
+
+def histogram(values, bins=10, low=None, high=None):
+    """Counts of values in equal width bins between low and high"""
+    if low is None:
+        low = min(values)
+    if high is None:
+        high = max(values)
+    counts = [0] * bins
+    width = (high - low) / float(bins)
+    for x in values:
+        if x < low or x > high:
+            continue
+        i = int((x - low) / width) if width else 0
+        counts[min(i, bins - 1)] += 1
+    return counts
+
+
+GROUP_BY = {
+    'family': family_name,
+    'type': type_name,
+    'level': level_name,
+}
+
+
+class NumericAudit(object):
+
+    def __init__(self, columns, group_by=type_name):
+        self.names = [x for x, _ in columns]
+        self.specs = [x for _, x in columns]
+        self.group_by = group_by
+        self._values = defaultdict(lambda: array('d'))
+        self._ids = defaultdict(lambda: array('l'))
+        self._summaries = {}
+
+    def add(self, elements, context):
+        """
+        Read the columns of a batch of elements with extract_parameters,
+        keeping the values of double and non yes/no integer columns
+        """
+        table = extract_parameters(elements, self.specs)
+        groups = [self.group_by(x, context) for x in elements]
+        for name, column in zip(self.names, table.columns):
+            if column.kind not in (DOUBLE, INTEGER):
+                continue
+            for i, group in enumerate(groups):
+                value = column[i]
+                if value is not None:
+                    self._values[group, name].append(value)
+                    self._ids[group, name].append(table.ids[i])
+        self._summaries.clear()
+
+    def load(self, doc, elements, batch_size=1000):
+        context = ReportContext(doc)
+        batch = []
+        for element in elements:
+            batch.append(element)
+            if len(batch) >= batch_size:
+                self.add(batch, context)
+                batch = []
+        if batch:
+            self.add(batch, context)
+        return self
+
+    def columns(self):
+        """(group, column name, values) for every non-empty column"""
+        for group, name in sorted(self._values):
+            yield group, name, self._values[group, name]
+
+    def summary(self, group, name):
+        """Summary of a column, computed on first use"""
+        summary = self._summaries.get((group, name))
+        if summary is None:
+            summary = self._summaries[group, name] = summarise(
+                self._values[group, name])
+        return summary
+
+    def summaries(self):
+        for group, name, _ in self.columns():
+            yield group, name, self.summary(group, name)
+
+    def outliers(self, z=3.0, k=1.5, min_count=5):
+        """
+        Yield an Outlier for every value more than z standard deviations
+        from its column's mean or more than k interquartile ranges outside
+        the quartiles. Columns of fewer than min_count values are skipped.
+        """
+        for group, name, values in self.columns():
+            if len(values) < min_count:
+                continue
+            summary = self.summary(group, name)
+            spread = summary.q3 - summary.q1
+            low = summary.q1 - k * spread
+            high = summary.q3 + k * spread
+            ids = self._ids[group, name]
+            for element_id, value in zip(ids, values):
+                score = (value - summary.mean) / summary.std \
+                    if summary.std else 0.0
+                methods = []
+                if abs(score) > z:
+                    methods.append('z')
+                if value < low or value > high:
+                    methods.append('iqr')
+                if methods:
+                    yield Outlier(
+                        element_id, group, name, value, score, low, high,
+                        ','.join(methods))
@@ -0,0 +1,184 @@
+"""
+Bulk parameter extraction into a column oriented table.
+
+Doubles, integers and element ids are stored in typed arrays, text is
+interned so each distinct string is stored (and UTF-8 encoded) once, and
+unit conversion is applied once per column after extraction:
+
+    table = extract_parameters(symbols, [
+        BuiltInParameter.ALL_MODEL_TYPE_NAME, 'Descriptor_TX', 'Width'])
+    for id, type_name, descriptor, width in table.rows():
+        ...
+"""
+from array import array
+
+from lib import get_param_units
+
+try:
+    from Autodesk.Revit.DB import ParameterType
+    from Autodesk.Revit.DB import StorageType
+except ImportError:
+    pass
+
+
+DOUBLE = 'double'
+INTEGER = 'integer'
+BOOLEAN = 'boolean'
+ELEMENT_ID = 'element_id'
+TEXT = 'text'
+
+TYPECODES = {
+    DOUBLE: 'd',
+    INTEGER: 'l',
+    BOOLEAN: 'b',
+    ELEMENT_ID: 'l',
+    TEXT: 'l',
+}
+
+
+def _param_kind(param):
+    if param.StorageType == StorageType.Double:
+        return DOUBLE
+    elif param.StorageType == StorageType.ElementId:
+        return ELEMENT_ID
+    elif param.StorageType == StorageType.Integer:
+        if param.Definition.ParameterType == ParameterType.YesNo:
+            return BOOLEAN
+        return INTEGER
+    return TEXT
+
+
+def _encode(value):
+    try:
+        return value.encode('utf-8')
+    except:
+        return value
+
+
+class Column(object):
+    """
+    Values of one parameter across all elements of a ParameterTable. The
+    kind and units of the column are taken from the first element that has
+    the parameter; elements without it (or with a parameter of a different
+    storage type) are marked missing in `present`.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.name = spec if isinstance(spec, str) else str(spec)
+        self.kind = None
+        self.units = 1
+        self.data = None
+        self.present = bytearray()
+        self.strings = [None]
+        self._string_codes = {None: 0}
+        self._storage_type = None
+
+    def _start(self, param, rows):
+        self.kind = _param_kind(param)
+        self.units = get_param_units(param) if self.kind == DOUBLE else 1
+        self._storage_type = param.StorageType
+        self.data = array(TYPECODES[self.kind], [0] * rows)
+
+    def _intern(self, value):
+        code = self._string_codes.get(value)
+        if code is None:
+            code = self._string_codes[value] = len(self.strings)
+            self.strings.append(_encode(value))
+        return code
+
+    def append(self, param):
+        if param is None:
+            self.present.append(0)
+            if self.data is not None:
+                self.data.append(0)
+            return
+        if self.kind is None:
+            self._start(param, len(self.present))
+        elif param.StorageType != self._storage_type:
+            self.present.append(0)
+            self.data.append(0)
+            return
+
+        kind = self.kind
+        if kind == DOUBLE:
+            self.data.append(param.AsDouble())
+        elif kind == TEXT:
+            self.data.append(self._intern(param.AsString()))
+        elif kind == ELEMENT_ID:
+            self.data.append(param.AsElementId().IntegerValue)
+        else:
+            self.data.append(param.AsInteger())
+        self.present.append(1)
+
+    def finish(self):
+        """Convert the whole column to display units in one pass"""
+        if self.kind == DOUBLE and self.units != 1:
+            units = self.units
+            self.data = array('d', [x * units for x in self.data])
+            self.units = 1
+
+    def __len__(self):
+        return len(self.present)
+
+    def __getitem__(self, i):
+        if not self.present[i]:
+            return None
+        value = self.data[i]
+        if self.kind == TEXT:
+            return self.strings[value]
+        elif self.kind == BOOLEAN:
+            return value != 0
+        return value
+
+    def values(self):
+        return [self[i] for i in range(len(self))]
+
+
+class ParameterTable(object):
+    """Column oriented parameter values of a set of elements"""
+
+    def __init__(self, ids, columns):
+        self.ids = ids
+        self.columns = columns
+        self._columns_by_name = {x.name: x for x in columns}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def names(self):
+        return [x.name for x in self.columns]
+
+    def column(self, name):
+        return self._columns_by_name[name if isinstance(name, str) else str(name)]
+
+    def values(self, name):
+        return self.column(name).values()
+
+    def rows(self):
+        """Yield (element id, value, ...) tuples in extraction order"""
+        columns = self.columns
+        for i, id in enumerate(self.ids):
+            yield (id,) + tuple(x[i] for x in columns)
+
+
+def extract_parameters(elements, params):
+    """
+    Extract params (parameter names or BuiltInParameters) of elements into a
+    ParameterTable
+    """
+    columns = [Column(x) for x in params]
+    getters = [
+        (column, 'LookupParameter' if isinstance(spec, str) else 'get_Parameter', spec)
+        for column, spec in zip(columns, params)]
+    ids = array('l')
+
+    for element in elements:
+        ids.append(element.Id.IntegerValue)
+        for column, getter, spec in getters:
+            column.append(getattr(element, getter)(spec))
+
+    for column in columns:
+        column.finish()
+    return ParameterTable(ids, columns)
@@ -0,0 +1,96 @@
+"""
+Which views, schedules and titleblocks are placed on which sheets.
+
+PlacementIndex reads the Viewport, ScheduleSheetInstance and titleblock
+elements of the ElementIndex once, so sheet commands don't need a view
+scoped collector per sheet:
+
+    placement = get_placement(doc)
+    for sheet in placement.sheets:
+        placement.views(sheet)            # views placed through viewports
+        placement.schedules(sheet)        # ScheduleSheetInstances
+        placement.scheduled_views(sheet)  # their ViewSchedules
+        placement.titleblocks(sheet)
+    placement.sheets_of(view)             # sheets a view or schedule is on
+
+Sheets and views may be given as elements, ElementIds or plain ints.
+Legends and schedules can be on several sheets, other views on one.
+"""
+from collections import defaultdict
+
+from lib import get_document_cache
+from lib.index import get_index
+from lib.index import id_value
+
+try:
+    from Autodesk.Revit.DB import BuiltInCategory
+    from Autodesk.Revit.DB import FamilyInstance
+    from Autodesk.Revit.DB import ScheduleSheetInstance
+    from Autodesk.Revit.DB import ViewSheet
+    from Autodesk.Revit.DB import Viewport
+except ImportError:
+    pass
+
+
+def _id(x):
+    element_id = getattr(x, 'Id', None)
+    return id_value(x if element_id is None else element_id)
+
+
+class PlacementIndex(object):
+
+    def __init__(self, doc):
+        self.index = get_index(doc)
+        self.sheets = sorted(
+            self.index.of_class(ViewSheet), key=lambda x: x.SheetNumber)
+        self._viewports = defaultdict(list)
+        self._schedules = defaultdict(list)
+        self._titleblocks = defaultdict(list)
+        self._sheets_of = defaultdict(list)
+
+        for viewport in self.index.of_class(Viewport):
+            sheet_id = viewport.SheetId.IntegerValue
+            self._viewports[sheet_id].append(viewport)
+            self._sheets_of[viewport.ViewId.IntegerValue].append(sheet_id)
+
+        for instance in self.index.of_class(ScheduleSheetInstance):
+            if instance.IsTitleblockRevisionSchedule:
+                continue
+            sheet_id = instance.OwnerViewId.IntegerValue
+            self._schedules[sheet_id].append(instance)
+            self._sheets_of[instance.ScheduleId.IntegerValue].append(sheet_id)
+
+        for titleblock in self.index.of_class_and_category(
+                FamilyInstance, BuiltInCategory.OST_TitleBlocks):
+            self._titleblocks[titleblock.OwnerViewId.IntegerValue].append(
+                titleblock)
+
+    def viewports(self, sheet):
+        return self._viewports.get(_id(sheet), [])
+
+    def views(self, sheet):
+        """Views placed on the sheet through viewports"""
+        return [self.index.get(x.ViewId) for x in self.viewports(sheet)]
+
+    def schedules(self, sheet):
+        """ScheduleSheetInstances on the sheet, excluding revision schedules"""
+        return self._schedules.get(_id(sheet), [])
+
+    def scheduled_views(self, sheet):
+        """ViewSchedules placed on the sheet"""
+        return [self.index.get(x.ScheduleId) for x in self.schedules(sheet)]
+
+    def titleblocks(self, sheet):
+        return self._titleblocks.get(_id(sheet), [])
+
+    def sheets_of(self, view):
+        """Sheets a view or schedule is placed on"""
+        return [self.index.get(x) for x in self._sheets_of.get(_id(view), [])]
+
+    def is_placed(self, view):
+        return _id(view) in self._sheets_of
+
+
+def get_placement(doc):
+    """Return the PlacementIndex of doc, building it on first use"""
+    return get_document_cache(doc).get('placement', lambda: PlacementIndex(doc))
@@ -0,0 +1,108 @@
+"""
+Extract the preview image Revit embeds in .rfa/.rvt files.
+
+The RevitPreview4.0 stream holds a small header followed by a PNG. The PNG
+is cut out of the stream, stripped of ancillary chunks (timestamps, text
+etc.) so identical previews give identical files, and written next to the
+other exported images.
+"""
+import os
+import struct
+
+from lib.cfb import CompoundFile
+
+try:
+    import multiprocessing
+except ImportError:
+    multiprocessing = None
+
+
+PREVIEW_STREAM = 'RevitPreview4.0'
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+CRITICAL_CHUNKS = {b'IHDR', b'PLTE', b'tRNS', b'IDAT', b'IEND'}
+
+
+def iter_chunks(data, offset=len(PNG_SIGNATURE)):
+    """Yield (type, chunk bytes) of the PNG in data starting after offset"""
+    while offset + 8 <= len(data):
+        length, chunk_type = struct.unpack('>I4s', data[offset:offset + 8])
+        end = offset + 12 + length
+        if end > len(data):
+            raise ValueError('Truncated PNG chunk')
+        yield chunk_type, data[offset:end]
+        offset = end
+        if chunk_type == b'IEND':
+            return
+    raise ValueError('PNG has no IEND chunk')
+
+
+def read_preview(filepath):
+    """Return the embedded preview PNG of filepath, or None if missing"""
+    with CompoundFile(filepath) as cf:
+        if PREVIEW_STREAM not in cf:
+            return None
+        data = cf.read_stream(PREVIEW_STREAM)
+    start = data.find(PNG_SIGNATURE)
+    if start < 0:
+        return None
+    return data[start:]
+
+
+def normalize_png(data):
+    """Keep only the critical chunks of data, dropping everything after IEND"""
+    return PNG_SIGNATURE + b''.join(
+        chunk for chunk_type, chunk in iter_chunks(data)
+        if chunk_type in CRITICAL_CHUNKS)
+
+
+def png_size(data):
+    """(width, height) from the IHDR chunk"""
+    return struct.unpack('>II', data[16:24])
+
+
+def extract_preview(filepath, out_dir, min_size=128):
+    """
+    Write the preview of filepath to out_dir as <family name>.png.
+    Returns (filepath, png path or None, reason)
+    """
+    try:
+        data = read_preview(filepath)
+        if data is None:
+            return filepath, None, 'no preview'
+        data = normalize_png(data)
+        width, height = png_size(data)
+    except Exception as e:
+        return filepath, None, str(e)
+
+    if max(width, height) < min_size:
+        return filepath, None, 'preview is {}x{}'.format(width, height)
+
+    basename = os.path.splitext(os.path.basename(filepath))[0]
+    out_path = os.path.join(out_dir, '{}.png'.format(basename))
+    with open(out_path, 'wb') as f:
+        f.write(data)
+    return filepath, out_path, None
+
+
+def _extract(args):
+    return extract_preview(*args)
+
+
+def extract_previews(filepaths, out_dir, min_size=128, processes=None):
+    """
+    Extract previews of filepaths in a pool of worker processes (serially
+    where multiprocessing is unavailable). Yields extract_preview results.
+    """
+    tasks = ((x, out_dir, min_size) for x in filepaths)
+    if multiprocessing is None or processes == 1:
+        for task in tasks:
+            yield _extract(task)
+        return
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap_unordered(_extract, tasks, 16):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,272 @@
+"""
+Usage graph based purge of unused families and family types.
+
+The live UsageIndex gives the family types (symbols) used by any element;
+one pass over the element types records which family each symbol belongs
+to and which symbols are referenced from the ElementId parameters of
+other types. Instances are not scanned in full: only views, legend
+components and the family type parameters found on one instance of each
+type are read. Everything not reachable from a used element is unused;
+it is deleted in dependency order (referencing types before the types
+they reference) through lib.batch:
+
+    graph = build_usage_graph(doc)
+    purge(doc, graph)
+"""
+from collections import defaultdict
+from collections import deque
+import time
+
+from lib.batch import run_batched
+from lib.index import get_index
+from lib.usage import get_usage
+
+try:
+    from Autodesk.Revit.DB import BuiltInCategory
+    from Autodesk.Revit.DB import BuiltInParameter
+    from Autodesk.Revit.DB import ElementId
+    from Autodesk.Revit.DB import ElementType
+    from Autodesk.Revit.DB import Family
+    from Autodesk.Revit.DB import FamilySymbol
+    from Autodesk.Revit.DB import ParameterType
+    from Autodesk.Revit.DB import StorageType
+    from Autodesk.Revit.DB import View
+
+    # Families used indirectly (profiles in sweeps, mullions, railings etc.)
+    # which the graph can't see references to
+    KEEP_CATEGORIES = {int(x) for x in (
+        BuiltInCategory.OST_ProfileFamilies,
+        BuiltInCategory.OST_CurtainWallMullions,
+        BuiltInCategory.OST_StairsRailingBaluster,
+        BuiltInCategory.OST_DetailComponents,
+    )}
+except ImportError:
+    KEEP_CATEGORIES = set()
+
+
+class UsageGraph(object):
+    """
+    Families, their symbols and the references between them, keyed by
+    ElementId integer values
+    """
+
+    def __init__(self):
+        self.family_symbols = defaultdict(set)
+        self.symbol_family = {}
+        self.references = defaultdict(set)
+        self.roots = set()
+        self.keep = set()
+
+    def add_symbol(self, symbol_id, family_id):
+        self.symbol_family[symbol_id] = family_id
+        self.family_symbols[family_id].add(symbol_id)
+
+    def add_family(self, family_id, keep=False):
+        self.family_symbols[family_id]
+        if keep:
+            self.keep.add(family_id)
+
+    def add_use(self, symbol_id):
+        """symbol_id is the type of an element in the model"""
+        self.roots.add(symbol_id)
+
+    def add_reference(self, from_id, to_symbol_id):
+        """from_id (a symbol or any other type) references to_symbol_id"""
+        self.references[from_id].add(to_symbol_id)
+
+    def used_symbols(self):
+        used = set()
+        queue = deque(x for x in self.roots if x in self.symbol_family)
+        for family_id in self.keep:
+            queue.extend(self.family_symbols[family_id])
+        while queue:
+            symbol_id = queue.popleft()
+            if symbol_id in used:
+                continue
+            used.add(symbol_id)
+            for ref in self.references.get(symbol_id, ()):
+                if ref in self.symbol_family and ref not in used:
+                    queue.append(ref)
+        return used
+
+    def unused(self):
+        """
+        Return (family ids, symbol ids) to delete: whole families with no
+        used symbol, and unused symbols of families that are still used
+        """
+        used = self.used_symbols()
+        families = []
+        symbols = []
+        for family_id, symbol_ids in self.family_symbols.items():
+            if family_id in self.keep:
+                continue
+            unused = symbol_ids - used
+            if unused == symbol_ids:
+                families.append(family_id)
+            else:
+                symbols.extend(unused)
+        return families, symbols
+
+    def deletion_order(self, families, symbols):
+        """
+        Order family and symbol ids so that anything referencing another
+        unused item is deleted before it
+        """
+        unit = {x: x for x in symbols}
+        for family_id in families:
+            unit[family_id] = family_id
+            for symbol_id in self.family_symbols[family_id]:
+                unit[symbol_id] = family_id
+
+        # Edges from referencing unit to referenced unit
+        dependents = defaultdict(set)
+        incoming = defaultdict(int)
+        for from_id, refs in self.references.items():
+            from_unit = unit.get(from_id)
+            if from_unit is None:
+                continue
+            for ref in refs:
+                to_unit = unit.get(ref)
+                if to_unit is None or to_unit == from_unit:
+                    continue
+                if to_unit not in dependents[from_unit]:
+                    dependents[from_unit].add(to_unit)
+                    incoming[to_unit] += 1
+
+        units = list(families) + list(symbols)
+        queue = deque(x for x in units if not incoming[x])
+        order = []
+        while queue:
+            x = queue.popleft()
+            order.append(x)
+            for y in dependents.get(x, ()):
+                incoming[y] -= 1
+                if not incoming[y]:
+                    queue.append(y)
+
+        # Reference cycles: delete what's left in any order
+        if len(order) < len(units):
+            done = set(order)
+            order.extend(x for x in units if x not in done)
+        return order
+
+
+def _symbol_references(element, symbol_ids):
+    for param in element.Parameters:
+        if param.StorageType != StorageType.ElementId:
+            continue
+        value = param.AsElementId().IntegerValue
+        if value in symbol_ids:
+            yield value
+
+
+def _family_type_definitions(element):
+    """Definitions of the family type parameters of an instance"""
+    return [
+        param.Definition for param in element.Parameters
+        if param.StorageType == StorageType.ElementId and
+        param.Definition.ParameterType == ParameterType.FamilyType]
+
+
+def _instance_references(index, usage, symbol_ids):
+    """
+    Yield the symbols referenced from instances without reading every
+    parameter of every instance: all ElementId parameters of views, the
+    component of legend components, and family type parameters, which are
+    looked for on one instance of each type and then read from the others
+    """
+    for view in index.of_class(View):
+        for ref in _symbol_references(view, symbol_ids):
+            yield ref
+
+    for component in index.of_category(BuiltInCategory.OST_LegendComponents):
+        param = component.get_Parameter(BuiltInParameter.LEGEND_COMPONENT)
+        if param:
+            value = param.AsElementId().IntegerValue
+            if value in symbol_ids:
+                yield value
+
+    for type_id, element_ids in usage.instances_by_type().items():
+        if type_id not in symbol_ids:
+            continue
+        instances = [index.get(x) for x in element_ids]
+        instances = [x for x in instances if x is not None]
+        if not instances:
+            continue
+        definitions = _family_type_definitions(instances[0])
+        if not definitions:
+            continue
+        for instance in instances:
+            for definition in definitions:
+                param = instance.get_Parameter(definition)
+                if not param:
+                    continue
+                value = param.AsElementId().IntegerValue
+                if value in symbol_ids:
+                    yield value
+
+
+def build_usage_graph(doc):
+    """
+    Build the UsageGraph of doc from the live UsageIndex, one pass over the
+    element types of the ElementIndex and the instance parameters that can
+    reference a family type
+    """
+    index = get_index(doc)
+    usage = get_usage(doc)
+    graph = UsageGraph()
+
+    for family in index.of_class(Family):
+        category = family.FamilyCategory
+        keep = family.IsCurtainPanelFamily or (
+            category is not None and category.Id.IntegerValue in KEEP_CATEGORIES)
+        graph.add_family(family.Id.IntegerValue, keep)
+
+    for symbol in index.of_class(FamilySymbol):
+        graph.add_symbol(symbol.Id.IntegerValue, symbol.Family.Id.IntegerValue)
+
+    symbol_ids = graph.symbol_family
+    for type_id in usage.used_types():
+        if type_id in symbol_ids:
+            graph.add_use(type_id)
+
+    # A symbol referenced by another symbol is used only if that symbol is;
+    # referenced by any other type or by an instance it is used
+    for element_type in index.of_class(ElementType):
+        is_symbol = isinstance(element_type, FamilySymbol)
+        for ref in _symbol_references(element_type, symbol_ids):
+            if is_symbol:
+                graph.add_reference(element_type.Id.IntegerValue, ref)
+            else:
+                graph.add_use(ref)
+
+    for ref in _instance_references(index, usage, symbol_ids):
+        graph.add_use(ref)
+
+    return graph
+
+
+def purge(doc, graph=None, symbols=True, chunk_size=200, name='Purge unused'):
+    """
+    Delete unused families, and unused types of used families if symbols is
+    True, in dependency order. Returns the number of elements deleted.
+    """
+    start = time.time()
+    if graph is None:
+        graph = build_usage_graph(doc)
+    families, unused_symbols = graph.unused()
+    if not symbols:
+        unused_symbols = []
+    order = graph.deletion_order(families, unused_symbols)
+    print('Usage graph built in {:.1f}s: {} unused families, {} unused '
+        'types'.format(time.time() - start, len(families), len(unused_symbols)))
+
+    def delete(id):
+        element = doc.GetElement(ElementId(id))
+        if element is None:
+            return False
+        doc.Delete(element.Id)
+        return True
+
+    return run_batched(
+        doc, name, order, delete, key=lambda x: x, chunk_size=chunk_size)
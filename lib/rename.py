@@ -0,0 +1,236 @@
+"""
+Declarative rename rules compiled into a single matcher.
+
+A RuleSet holds (pattern, template) rules and the acronym and stop word
+tables used for title casing. The rule patterns are joined into one
+alternation, so each name is searched once whatever the number of rules,
+and the rule that matched is read off the match:
+
+    rules = RuleSet([
+        RenameRule(r'(SPJN[0-9X]{2,5})\\s*[-_]\\s*(.*)', '{0} - {1!t}'),
+    ], acronyms=['ICU', 'ED'], stop_words=['SPJN'])
+    renames, collisions = rules.plan(families, existing=all_families)
+    rules.apply(doc, 'Rename families', renames)
+
+Templates are format strings over the numbered groups of the rule ({0},
+not {}, which string.Formatter doesn't number on IronPython) with extra
+conversions: !t title case (keeping acronyms, dropping stop words), !u
+upper, !l lower and !c strip and collapse whitespace. A template may also
+be a function (groups, element) returning the new name, or None to skip.
+"""
+from collections import defaultdict
+from collections import namedtuple
+import re
+import string
+
+from lib.batch import run_batched
+from lib.index import get_index
+
+try:
+    from Autodesk.Revit.DB import BuiltInParameter
+except ImportError:
+    pass
+
+
+Rename = namedtuple('Rename', 'element old new')
+WORD_SEPARATORS = re.compile(r'[-_\s]+')
+
+
+class RenameRule(object):
+
+    def __init__(self, pattern, template):
+        self.pattern = pattern
+        self.template = template
+        self.groups = re.compile(pattern).groups
+
+
+class NameFormatter(string.Formatter):
+
+    def __init__(self, acronyms=(), stop_words=()):
+        self.acronyms = set(acronyms)
+        self.stop_words = {x.upper() for x in stop_words}
+        self._words = {}
+
+    def title(self, value):
+        out = []
+        for word in WORD_SEPARATORS.split(value):
+            if not word:
+                continue
+            new_word = self._words.get(word)
+            if new_word is None:
+                if word.upper() in self.stop_words:
+                    new_word = ''
+                elif word in self.acronyms:
+                    new_word = word
+                else:
+                    new_word = word.title()
+                self._words[word] = new_word
+            if new_word:
+                out.append(new_word)
+        return ' '.join(out)
+
+    def convert_field(self, value, conversion):
+        if conversion == 't':
+            return self.title(value)
+        elif conversion == 'u':
+            return value.upper()
+        elif conversion == 'l':
+            return value.lower()
+        elif conversion == 'c':
+            return ' '.join(value.split())
+        return super(NameFormatter, self).convert_field(value, conversion)
+
+
+def get_name(element):
+    return element.Name
+
+
+def get_type_name(element):
+    return element.get_Parameter(BuiltInParameter.ALL_MODEL_TYPE_NAME).AsString()
+
+
+def set_name(element, name):
+    element.Name = name
+
+
+class RuleSet(object):
+
+    def __init__(self, rules, acronyms=(), stop_words=(), flags=0):
+        self.rules = list(rules)
+        self.formatter = NameFormatter(acronyms, stop_words)
+
+        # Wrap every rule in a named group; the wrapper closes after the
+        # rule's own groups so it is always lastgroup of a match
+        self._offsets = {}
+        parts = []
+        offset = 0
+        for i, rule in enumerate(self.rules):
+            name = 'r{}'.format(i)
+            parts.append('(?P<{}>{})'.format(name, rule.pattern))
+            self._offsets[name] = (rule, offset + 2, offset + 2 + rule.groups)
+            offset += 1 + rule.groups
+        self.matcher = re.compile('|'.join(parts), flags)
+
+    def rename(self, name, element=None):
+        """Return the new name for name, or None if no rule applies"""
+        match = self.matcher.search(name)
+        if match is None:
+            return None
+        rule, start, end = self._offsets[match.lastgroup]
+        groups = tuple(match.group(i) or '' for i in range(start, end))
+        if callable(rule.template):
+            return rule.template(groups, element)
+        return self.formatter.vformat(rule.template, groups, {'name': name})
+
+    def plan(self, elements, get_name=get_name, scope=None, existing=()):
+        """
+        Work out the renames of elements in one pass. Names must be unique
+        per scope(element), or across all elements if scope is None, and
+        must not clash with the names of the existing elements.
+
+        Returns (renames, collisions): renames ordered so that no element is
+        given a name before its current holder has been renamed, and the
+        renames that would clash with an existing or another new name.
+        """
+        holders = defaultdict(dict)
+        for element in existing:
+            key = scope(element) if scope else None
+            holders[key][get_name(element)] = element
+
+        wanted = []
+        for element in elements:
+            old = get_name(element)
+            key = scope(element) if scope else None
+            holders[key][old] = element
+            new = self.rename(old, element)
+            if new and new != old:
+                wanted.append((key, Rename(element, old, new)))
+
+        collisions = []
+        targets = defaultdict(int)
+        for key, rename in wanted:
+            targets[(key, rename.new)] += 1
+        pending = []
+        for key, rename in wanted:
+            if targets[(key, rename.new)] > 1:
+                collisions.append(rename)
+            else:
+                pending.append((key, rename))
+
+        # Apply renames whose new name is free, which may free the old names
+        # other renames want. Whatever can't be freed is a collision.
+        renames = []
+        while pending:
+            blocked = []
+            for key, rename in pending:
+                holder = holders[key].get(rename.new)
+                if holder is None:
+                    renames.append(rename)
+                    del holders[key][rename.old]
+                    holders[key][rename.new] = rename.element
+                else:
+                    blocked.append((key, rename))
+            if len(blocked) == len(pending):
+                collisions.extend(x for _, x in blocked)
+                break
+            pending = blocked
+
+        return renames, collisions
+
+    def apply(self, doc, name, renames, set_name=set_name, chunk_size=1000):
+        """
+        Write renames in one batched transaction. A rename that fails is
+        reported and skipped, the others are still made.
+        """
+        errors = []
+
+        def write(rename):
+            try:
+                set_name(rename.element, rename.new)
+            except Exception as e:
+                errors.append((rename, str(e)))
+                print('Rename failed: {} -> {}: {}'.format(
+                    rename.old, rename.new, e))
+                return False
+            print('{} -> {}'.format(rename.old, rename.new))
+            return True
+
+        count = run_batched(doc, name, renames, write,
+            key=lambda x: x.element.UniqueId, chunk_size=chunk_size)
+        if errors:
+            print('{} renamed, {} failed'.format(count, len(errors)))
+        return count
+
+    def run(self, doc, name, elements, get_name=get_name, set_name=set_name,
+            scope=None):
+        """
+        Plan and apply the renames of elements, reporting collisions with
+        each other and with every element of the same class and category
+        """
+        elements = list(elements)
+        renames, collisions = self.plan(
+            elements, get_name, scope, same_kind(doc, elements))
+        for rename in collisions:
+            print('Name collision, not renamed: {} -> {}'.format(
+                rename.old, rename.new))
+        return self.apply(doc, name, renames, set_name)
+
+
+def _category_id(element):
+    category = element.Category
+    return None if category is None else category.Id.IntegerValue
+
+
+def same_kind(doc, elements):
+    """
+    Elements of doc of the classes and categories of elements, whose names
+    those elements can't be renamed to
+    """
+    index = get_index(doc)
+    kinds = defaultdict(set)
+    for element in elements:
+        kinds[type(element)].add(_category_id(element))
+    for cls, categories in kinds.items():
+        for element in index.of_class(cls):
+            if _category_id(element) in categories:
+                yield element
@@ -0,0 +1,391 @@
+"""
+Declarative reports sharing a single pass over the document.
+
+A Report is a list of (column name, getter) pairs over a query: the class
+of element, optional categories and an optional predicate where(element,
+context). run_reports
+walks the ElementIndex once, hands each element to every report whose
+query it matches and streams the rows to a writer per report:
+
+    report = Report('offsets', [
+        ('ID', element_id),
+        ('Family', family_name),
+        ('Offset', param(BuiltInParameter.INSTANCE_FREE_HOST_OFFSET_PARAM)),
+    ], cls=FamilyInstance)
+    run_reports(doc, [report, ...], out_dir, fmt='jsonl')
+
+Getters take (element, context). Matching elements are written in batches
+of batch_size: param and type_param columns of a batch are read with
+lib.paramtable.extract_parameters, type values once per type. The
+ReportContext caches what many rows share - types, level and template
+names, workset names, host attributes - so reports don't repeat the same
+lookups.
+
+Formats are csv, jsonl and cols, a gzipped columnar file: a header line
+with the column names followed by one JSON line per chunk of rows holding
+a list of values per column.
+"""
+import csv
+import gzip
+import json
+import os
+import time
+
+from lib import get_param_value
+from lib.hosts import HostCache
+from lib.index import get_index
+from lib.index import id_value
+from lib.paramtable import extract_parameters
+from lib.worksetindex import get_worksets
+
+
+class ReportContext(object):
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.index = get_index(doc)
+        self._types = {}
+        self._names = {}
+        self._hosts = None
+        self._worksets = None
+        self._type_values = {}
+
+    @property
+    def hosts(self):
+        """HostCache of wall host attributes, shared by all reports"""
+        if self._hosts is None:
+            self._hosts = HostCache(self.doc)
+        return self._hosts
+
+    @property
+    def worksets(self):
+        """WorksetIndex of the document, see lib.worksetindex"""
+        if self._worksets is None:
+            self._worksets = get_worksets(self.doc)
+        return self._worksets
+
+    def type_values(self, specs, types):
+        """
+        Map of type id -> values of specs for the types, extracting those
+        not seen before in one batch
+        """
+        key = tuple(specs)
+        values = self._type_values.setdefault(key, {})
+        todo = {}
+        for element_type in types:
+            if element_type is not None:
+                type_id = element_type.Id.IntegerValue
+                if type_id not in values:
+                    todo[type_id] = element_type
+        if todo:
+            table = extract_parameters(list(todo.values()), specs)
+            for row in table.rows():
+                values[row[0]] = row[1:]
+        return values
+
+    def type_of(self, element):
+        type_id = element.GetTypeId().IntegerValue
+        element_type = self._types.get(type_id, False)
+        if element_type is False:
+            element_type = self._types[type_id] = self.index.get(type_id)
+        return element_type
+
+    def name_of(self, element_id):
+        """Name of the element with element_id, '' for invalid ids"""
+        value = id_value(element_id)
+        name = self._names.get(value)
+        if name is None:
+            element = self.index.get(value)
+            name = self._names[value] = element.Name if element else ''
+        return name
+
+    def workset_name(self, element):
+        return self.worksets.name(element.WorksetId)
+
+
+def get_parameter(element, spec):
+    if isinstance(spec, str):
+        return element.LookupParameter(spec)
+    return element.get_Parameter(spec)
+
+
+class ParameterGetter(object):
+    """
+    Getter for a parameter (name or BuiltInParameter) of the element, or of
+    its type if of_type. Reports read these columns in batches through
+    lib.paramtable rather than one lookup per element.
+    """
+
+    def __init__(self, spec, default='', of_type=False):
+        self.spec = spec
+        self.default = default
+        self.of_type = of_type
+
+    def __call__(self, element, context):
+        if self.of_type:
+            element = context.type_of(element)
+            if element is None:
+                return self.default
+        value = get_param_value(get_parameter(element, self.spec), context.doc)
+        return self.default if value is None else value
+
+
+def param(spec, default=''):
+    """Getter for a parameter (name or BuiltInParameter) of the element"""
+    return ParameterGetter(spec, default)
+
+
+def type_param(spec, default=''):
+    """Getter for a parameter of the element's type"""
+    return ParameterGetter(spec, default, of_type=True)
+
+
+def element_id(element, context):
+    return element.Id.IntegerValue
+
+
+def category_name(element, context):
+    return element.Category.Name if element.Category else ''
+
+
+def family_name(element, context):
+    element_type = context.type_of(element)
+    return getattr(element_type, 'FamilyName', '') if element_type else ''
+
+
+def type_name(element, context):
+    """'Family : Type' of the element's type"""
+    element_type = context.type_of(element)
+    return '{} : {}'.format(
+        family_name(element, context),
+        element_type.Name if element_type else '')
+
+
+def level_name(element, context):
+    return context.name_of(element.LevelId)
+
+
+def workset_name(element, context):
+    return context.workset_name(element)
+
+
+def host_attribute(name, default=''):
+    """Getter for an attribute of the element's host type, see lib.hosts"""
+    def getter(element, context):
+        attributes = context.hosts.host_attributes(element)
+        return default if attributes is None else attributes[name]
+    return getter
+
+
+def has_host(element, context):
+    return context.hosts.host_attributes(element) is not None
+
+
+class Report(object):
+
+    def __init__(self, name, columns, cls=None, categories=None, where=None):
+        self.name = name
+        self.names = [x for x, _ in columns]
+        self.getters = [x for _, x in columns]
+        self.cls = cls
+        self.categories = None if categories is None else {
+            id_value(x) for x in categories}
+        self.where = where
+        self.rows = 0
+        self._parameters = [
+            (i, x) for i, x in enumerate(self.getters)
+            if isinstance(x, ParameterGetter) and not x.of_type]
+        self._type_parameters = [
+            (i, x) for i, x in enumerate(self.getters)
+            if isinstance(x, ParameterGetter) and x.of_type]
+
+    def matches_class(self, element_class):
+        return self.cls is None or issubclass(element_class, self.cls)
+
+    def matches(self, element, context):
+        if self.categories is not None:
+            category = element.Category
+            if category is None or \
+                    category.Id.IntegerValue not in self.categories:
+                return False
+        return self.where is None or self.where(element, context)
+
+    def row(self, element, context):
+        return [getter(element, context) for getter in self.getters]
+
+    def batch_rows(self, elements, context):
+        """
+        Rows of elements, reading the parameter columns of the batch with
+        one extract_parameters call for the elements and one for their types
+        """
+        rows = [[None] * len(self.getters) for _ in elements]
+        parameter_columns = set()
+
+        if self._parameters:
+            table = extract_parameters(
+                elements, [x.spec for _, x in self._parameters])
+            for (i, getter), column in zip(self._parameters, table.columns):
+                parameter_columns.add(i)
+                default = getter.default
+                for row, value in zip(rows, column.values()):
+                    row[i] = default if value is None else value
+
+        if self._type_parameters:
+            specs = [x.spec for _, x in self._type_parameters]
+            types = [context.type_of(x) for x in elements]
+            values = context.type_values(specs, types)
+            for n, (i, getter) in enumerate(self._type_parameters):
+                parameter_columns.add(i)
+                default = getter.default
+                for row, element_type in zip(rows, types):
+                    value = None if element_type is None else \
+                        values[element_type.Id.IntegerValue][n]
+                    row[i] = default if value is None else value
+
+        for i, getter in enumerate(self.getters):
+            if i in parameter_columns:
+                continue
+            for row, element in zip(rows, elements):
+                row[i] = getter(element, context)
+        return rows
+
+
+class CsvWriter(object):
+    extension = '.csv'
+
+    def __init__(self, path, names):
+        self.f = open(path, 'w')
+        self.w = csv.writer(self.f, lineterminator='\n')
+        self.w.writerow(names)
+
+    def write(self, row):
+        self.w.writerow(row)
+
+    def close(self):
+        self.f.close()
+
+
+class JsonlWriter(object):
+    extension = '.jsonl'
+
+    def __init__(self, path, names):
+        self.f = open(path, 'w')
+        self.names = names
+
+    def write(self, row):
+        self.f.write(json.dumps(dict(zip(self.names, row))))
+        self.f.write('\n')
+
+    def close(self):
+        self.f.close()
+
+
+class ColumnarWriter(object):
+    extension = '.cols.gz'
+
+    def __init__(self, path, names, chunk_rows=10000):
+        self.f = gzip.open(path, 'wb')
+        self.chunk_rows = chunk_rows
+        self.columns = [[] for _ in names]
+        self._write_line({'columns': names})
+
+    def _write_line(self, obj):
+        self.f.write(json.dumps(obj).encode('utf-8'))
+        self.f.write(b'\n')
+
+    def write(self, row):
+        for column, value in zip(self.columns, row):
+            column.append(value)
+        if len(self.columns[0]) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if self.columns and self.columns[0]:
+            self._write_line({'rows': len(self.columns[0]), 'data': self.columns})
+            self.columns = [[] for _ in self.columns]
+
+    def close(self):
+        self.flush()
+        self.f.close()
+
+
+WRITERS = {
+    'csv': CsvWriter,
+    'jsonl': JsonlWriter,
+    'cols': ColumnarWriter,
+}
+
+
+def _write_batch(report, writer, elements, context):
+    if not elements:
+        return
+    try:
+        rows = report.batch_rows(elements, context)
+    except Exception:
+        # Find the failing elements one row at a time
+        rows = []
+        for element in elements:
+            try:
+                rows.append(report.row(element, context))
+            except Exception as e:
+                print('{}: {} {}'.format(report.name, element.Id, e))
+    for row in rows:
+        writer.write(row)
+    report.rows += len(rows)
+
+
+def run_reports(doc, reports, out_dir, fmt='csv', batch_size=1000):
+    """
+    Run reports in one pass over the ElementIndex, writing each to
+    out_dir/<report name><extension>, where '{title}' in the name is the
+    document title. Returns the paths written.
+    """
+    start = time.time()
+    writer_class = WRITERS[fmt]
+    context = ReportContext(doc)
+    writers = []
+    names = []
+    paths = []
+    for report in reports:
+        report.rows = 0
+        names.append(report.name.format(title=doc.Title))
+        path = os.path.join(out_dir, names[-1] + writer_class.extension)
+        writers.append(writer_class(path, report.names))
+        paths.append(path)
+
+    # Reports by concrete element class, worked out once per class. Matching
+    # elements are collected per report and written in batches
+    dispatch = {}
+    batches = [[] for _ in reports]
+    try:
+        for element in context.index:
+            element_class = type(element)
+            targets = dispatch.get(element_class)
+            if targets is None:
+                targets = dispatch[element_class] = [
+                    i for i, report in enumerate(reports)
+                    if report.matches_class(element_class)]
+            for i in targets:
+                report = reports[i]
+                batch = batches[i]
+                try:
+                    if not report.matches(element, context):
+                        continue
+                except Exception as e:
+                    print('{}: {} {}'.format(report.name, element.Id, e))
+                    continue
+                batch.append(element)
+                if len(batch) >= batch_size:
+                    _write_batch(report, writers[i], batch, context)
+                    del batch[:]
+        for report, writer, batch in zip(reports, writers, batches):
+            _write_batch(report, writer, batch, context)
+    finally:
+        for writer in writers:
+            writer.close()
+
+    print('{} reports in {:.1f}s: {}'.format(
+        len(reports), time.time() - start,
+        ', '.join('{} ({} rows)'.format(name, x.rows)
+            for name, x in zip(names, reports))))
+    return paths
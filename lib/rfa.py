@@ -0,0 +1,148 @@
+"""
+Read family metadata straight from .rfa files without Revit.
+
+Families are compound files with a PartAtom stream holding an Atom XML
+description of the family: its category, types and type parameter values.
+read_family returns the same (category, rows) as the Revit based reader
+used by families.report_families, and read_library reads a whole library
+across a process pool where multiprocessing is available:
+
+    python -m lib.rfa "H:\\NBIF\\Health Library\\Revit" types.csv
+"""
+import csv
+import os
+import re
+import sys
+import xml.etree.ElementTree as ET
+
+from lib import Walker
+from lib.cfb import CompoundFile
+from lib.crawler import _encode
+
+try:
+    import multiprocessing
+except ImportError:
+    # IronPython has no multiprocessing, families are read serially
+    multiprocessing = None
+
+
+PART_ATOM = 'PartAtom'
+ATOM = '{http://www.w3.org/2005/Atom}'
+PARTATOM = '{urn:schemas-autodesk-com:partatom}'
+GROUPING_SCHEME = 'adsk:revit:grouping'
+
+ENCODED_CHAR = re.compile(r'_x([0-9A-Fa-f]{4})_')
+
+if sys.version_info[0] > 2:
+    unichr = chr
+
+
+def decode_name(tag):
+    """Undo the XmlConvert.EncodeName escaping of parameter names"""
+    name = tag.split('}')[-1]
+    return ENCODED_CHAR.sub(lambda m: unichr(int(m.group(1), 16)), name)
+
+
+def read_part_atom(filepath):
+    with CompoundFile(filepath) as cf:
+        if PART_ATOM not in cf:
+            return None
+        return cf.read_stream(PART_ATOM)
+
+
+def parse_part_atom(data):
+    """Return (category, [(type, parameter, value), ...]) from PartAtom xml"""
+    root = ET.fromstring(data.rstrip(b'\x00'))
+
+    category = None
+    for cat in root.findall(ATOM + 'category'):
+        if cat.findtext(ATOM + 'scheme') == GROUPING_SCHEME:
+            category = cat.findtext(ATOM + 'term')
+
+    rows = []
+    for part in root.iter(PARTATOM + 'part'):
+        type_name = part.findtext(ATOM + 'title')
+        for param in part:
+            if param.tag == ATOM + 'title':
+                continue
+            value = (param.text or '').strip()
+            if not value:
+                continue
+            rows.append((
+                type_name,
+                param.get('displayName') or decode_name(param.tag),
+                value))
+    return category, rows
+
+
+def read_family(filepath):
+    """
+    Read category and type parameter rows from the family at filepath, with
+    the same signature as the Revit reader passed to lib.crawler
+    """
+    data = read_part_atom(filepath)
+    if data is None:
+        raise ValueError('No PartAtom stream')
+    return parse_part_atom(data)
+
+
+def _read_library_file(filepath):
+    try:
+        category, rows = read_family(filepath)
+        return filepath, category, rows, None
+    except Exception as e:
+        return filepath, None, [], str(e)
+
+
+def read_library(start_dir, processes=None, chunksize=16):
+    """
+    Yield (filepath, category, rows, error) for every family under
+    start_dir, reading files in a pool of processes when available
+    """
+    paths = Walker(start_dir, r'.*\.rfa$', None).files()
+    if multiprocessing is None or processes == 1:
+        for path in paths:
+            yield _read_library_file(path)
+        return
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap_unordered(
+                _read_library_file, paths, chunksize):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+
+
+def report_library(start_dir, csv_path, processes=None):
+    """Write the report_families csv for start_dir without opening Revit"""
+    count = errors = 0
+    with open(csv_path, 'w') as f:
+        w = csv.writer(f, lineterminator='\n')
+        w.writerow((
+            'Source', 'Category', 'Family', 'Type', 'Parameter Name',
+            'Parameter Value'))
+        for filepath, category, rows, error in read_library(
+                start_dir, processes):
+            count += 1
+            if error:
+                errors += 1
+                print('{} - {}'.format(filepath, error))
+                continue
+            fname = os.path.basename(filepath)
+            for type_name, name, value in rows:
+                w.writerow([_encode(x) for x in (
+                    start_dir, category, fname, type_name, name, value)])
+    return count, errors
+
+
+if __name__ == '__main__':
+    import time
+
+    start = time.time()
+    processes = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    count, errors = report_library(sys.argv[1], sys.argv[2], processes)
+    elapsed = time.time() - start
+    print('{} families ({} errors) in {:.1f}s, {:.0f} per minute'.format(
+        count, errors, elapsed, count * 60 / elapsed if elapsed else 0))
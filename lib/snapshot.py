@@ -0,0 +1,209 @@
+"""
+Per-element snapshots of a model and the differences between two of them.
+
+A snapshot is a gzipped text file with one line per element, sorted by
+UniqueId:
+
+    UniqueId <tab> category <tab> type <tab> digest <tab> {parameter: value}
+
+Parameters are keyed by name plus what identifies them, since names
+aren't unique: 'Mark [ALL_MODEL_MARK]' for built-in parameters, the GUID
+for shared parameters and the parameter element id for the rest.
+
+The digest is a hash of the category, type and parameter values, so two
+snapshots are compared with a merge-join that only parses the parameters
+of elements whose digest changed:
+
+    write_snapshot(path, snapshot_records(doc))
+    for change in diff_snapshots(old_path, new_path):
+        change.kind, change.unique_id, change.changes  # [(key, old, new)]
+
+Snapshots are sorted in runs of chunk_size lines that are merged on disk,
+and the diff holds one line of each file at a time, so memory stays
+bounded however large the model.
+"""
+from collections import namedtuple
+import gzip
+import hashlib
+import heapq
+import json
+import os
+import shutil
+import tempfile
+
+from lib import get_param_value
+from lib.index import get_index
+from lib.reporting import ReportContext
+from lib.reporting import type_name
+
+try:
+    from Autodesk.Revit.DB import BuiltInParameter
+    from Autodesk.Revit.DB import StorageType
+except ImportError:
+    pass
+
+
+ADDED = 'added'
+REMOVED = 'removed'
+MODIFIED = 'modified'
+
+Change = namedtuple('Change', 'kind unique_id category type changes')
+
+
+def _clean(text):
+    return (text or '').replace('\t', ' ').replace('\n', ' ')
+
+
+def parameter_value(param, doc):
+    if param.StorageType == StorageType.String:
+        return param.AsString() or ''
+    value = get_param_value(param, doc)
+    if isinstance(value, float):
+        return round(value, 6)
+    return value
+
+
+def parameter_key(param):
+    """'Name [identity]' of param, its name alone if nothing identifies it"""
+    definition = param.Definition
+    bip = getattr(definition, 'BuiltInParameter', None)
+    if bip is not None and bip != BuiltInParameter.INVALID:
+        identity = str(bip)
+    elif param.IsShared:
+        identity = str(param.GUID)
+    else:
+        param_id = getattr(param, 'Id', None)
+        if param_id is None:
+            return definition.Name
+        identity = str(param_id.IntegerValue)
+    return u'{0} [{1}]'.format(definition.Name, identity)
+
+
+def parameter_values(element, doc):
+    """Map of parameter key -> value of the parameters of element with a value"""
+    values = {}
+    for param in element.Parameters:
+        if param.HasValue:
+            values[parameter_key(param)] = parameter_value(param, doc)
+    return values
+
+
+def snapshot_line(unique_id, category, element_type, values):
+    params = json.dumps(values, sort_keys=True)
+    category = _clean(category)
+    element_type = _clean(element_type)
+    digest = hashlib.md5(u'\t'.join(
+        (category, element_type, params)).encode('utf-8')).hexdigest()[:16]
+    return u'\t'.join((unique_id, category, element_type, digest, params))
+
+
+def snapshot_records(doc, elements=None):
+    """Snapshot lines of elements, by default every element with a category"""
+    context = ReportContext(doc)
+    if elements is None:
+        elements = get_index(doc)
+    for element in elements:
+        category = element.Category
+        if category is None:
+            continue
+        yield snapshot_line(
+            element.UniqueId, category.Name, type_name(element, context),
+            parameter_values(element, doc))
+
+
+def _write_lines(path, lines, compresslevel=6):
+    # gzip writes are slow per call, so lines are written in blocks
+    with gzip.open(path, 'wb', compresslevel) as f:
+        block = []
+        for line in lines:
+            block.append(line)
+            if len(block) >= 1000:
+                f.write(u'\n'.join(block).encode('utf-8') + b'\n')
+                block = []
+        if block:
+            f.write(u'\n'.join(block).encode('utf-8') + b'\n')
+
+
+def read_lines(path):
+    with gzip.open(path, 'rb') as f:
+        for line in f:
+            yield line.decode('utf-8').rstrip(u'\n')
+
+
+def write_snapshot(path, lines, chunk_size=50000):
+    """
+    Write snapshot lines to path sorted by UniqueId, sorting chunk_size
+    lines at a time and merging the sorted runs. Returns the line count.
+    """
+    run_dir = tempfile.mkdtemp()
+    runs = []
+    count = 0
+    try:
+        chunk = []
+        for line in lines:
+            chunk.append(line)
+            count += 1
+            if len(chunk) >= chunk_size:
+                runs.append(os.path.join(run_dir, str(len(runs))))
+                _write_lines(runs[-1], sorted(chunk), 1)
+                chunk = []
+        if not runs:
+            _write_lines(path, sorted(chunk))
+            return count
+        if chunk:
+            runs.append(os.path.join(run_dir, str(len(runs))))
+            _write_lines(runs[-1], sorted(chunk), 1)
+        # The tab after the UniqueId sorts before any UniqueId character,
+        # so whole lines merge in UniqueId order
+        _write_lines(path, heapq.merge(*[read_lines(x) for x in runs]))
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+    return count
+
+
+def _split(line):
+    return line.split(u'\t', 4)
+
+
+def _changed_values(old_params, new_params):
+    old = json.loads(old_params)
+    new = json.loads(new_params)
+    return [
+        (name, old.get(name), new.get(name))
+        for name in sorted(set(old) | set(new))
+        if old.get(name) != new.get(name)]
+
+
+def diff_snapshots(old_path, new_path):
+    """
+    Yield a Change for every element added, removed or modified between
+    two snapshots. Modified elements list their changed parameters, with
+    category and type changes reported as 'Category' and 'Type'.
+    """
+    old_lines = read_lines(old_path)
+    new_lines = read_lines(new_path)
+    old = next(old_lines, None)
+    new = next(new_lines, None)
+    while old is not None or new is not None:
+        old_fields = None if old is None else _split(old)
+        new_fields = None if new is None else _split(new)
+        if new_fields is None or (
+                old_fields is not None and old_fields[0] < new_fields[0]):
+            yield Change(REMOVED, old_fields[0], old_fields[1], old_fields[2], [])
+            old = next(old_lines, None)
+        elif old_fields is None or new_fields[0] < old_fields[0]:
+            yield Change(ADDED, new_fields[0], new_fields[1], new_fields[2], [])
+            new = next(new_lines, None)
+        else:
+            if old_fields[3] != new_fields[3]:
+                changes = [
+                    (name, a, b) for name, a, b in (
+                        ('Category', old_fields[1], new_fields[1]),
+                        ('Type', old_fields[2], new_fields[2]))
+                    if a != b]
+                changes.extend(_changed_values(old_fields[4], new_fields[4]))
+                yield Change(
+                    MODIFIED, new_fields[0], new_fields[1], new_fields[2],
+                    changes)
+            old = next(old_lines, None)
+            new = next(new_lines, None)
@@ -0,0 +1,188 @@
+"""
+In-memory stand-in for a Revit document, so the lib indexes can be built
+and benchmarked outside Revit:
+
+    python -m lib.standin 10000 100000 1000000
+"""
+import random
+import sys
+import time
+
+
+# BuiltInCategory values of the categories used by the generated documents
+CATEGORIES = {
+    -2000011: 'Walls',
+    -2000014: 'Windows',
+    -2000023: 'Doors',
+    -2000080: 'Furniture',
+    -2000151: 'Generic Models',
+    -2000160: 'Rooms',
+    -2000240: 'Levels',
+    -2000279: 'Views',
+    -2000280: 'Title Blocks',
+    -2001000: 'Casework',
+    -2001120: 'Lighting Fixtures',
+    -2001350: 'Specialty Equipment',
+    -2003100: 'Sheets',
+}
+INSTANCE_CATEGORIES = [-2000014, -2000023, -2000080, -2000151, -2001000,
+    -2001120, -2001350]
+
+
+class ElementId(object):
+
+    def __init__(self, value):
+        self.IntegerValue = value
+
+    def __eq__(self, other):
+        return isinstance(other, ElementId) and \
+            other.IntegerValue == self.IntegerValue
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.IntegerValue)
+
+    def __repr__(self):
+        return 'ElementId({})'.format(self.IntegerValue)
+
+
+ElementId.InvalidElementId = ElementId(-1)
+
+
+class Category(object):
+
+    def __init__(self, id, name):
+        self.Id = ElementId(id)
+        self.Name = name
+
+
+class Element(object):
+
+    def __init__(self, id, name, category=None, level_id=-1, workset_id=0):
+        self.Id = ElementId(id)
+        self.UniqueId = 'standin-{:08x}'.format(id)
+        self.Name = name
+        self.Category = category
+        self.LevelId = ElementId(level_id)
+        self.WorksetId = ElementId(workset_id)
+
+
+class Level(Element):
+    pass
+
+
+class Family(Element):
+    pass
+
+
+class FamilySymbol(Element):
+
+    def __init__(self, id, name, family, **kwargs):
+        super(FamilySymbol, self).__init__(id, name, family.Category, **kwargs)
+        self.Family = family
+        self.FamilyName = family.Name
+
+
+class FamilyInstance(Element):
+
+    def __init__(self, id, symbol, **kwargs):
+        super(FamilyInstance, self).__init__(
+            id, symbol.Name, symbol.Category, **kwargs)
+        self.Symbol = symbol
+
+
+class View(Element):
+
+    def __init__(self, id, name, is_template=False, **kwargs):
+        super(View, self).__init__(id, name, **kwargs)
+        self.IsTemplate = is_template
+
+
+class ViewSheet(View):
+    pass
+
+
+class Document(object):
+
+    def __init__(self, title, elements):
+        self.Title = title
+        self.elements = elements
+        self._by_id = {x.Id.IntegerValue: x for x in elements}
+
+    def GetElement(self, id):
+        return self._by_id.get(getattr(id, 'IntegerValue', id))
+
+
+def make_document(count, seed=0):
+    """Generate a document of roughly count elements with a realistic mix"""
+    rnd = random.Random(seed)
+    categories = {k: Category(k, v) for k, v in CATEGORIES.items()}
+    elements = []
+    next_id = [1000]
+
+    def new_id():
+        next_id[0] += 1
+        return next_id[0]
+
+    levels = [Level(new_id(), 'LEVEL {}'.format(i), categories[-2000240])
+        for i in range(10)]
+    elements.extend(levels)
+    worksets = list(range(1, 21))
+
+    families = []
+    for i in range(max(1, count // 200)):
+        category = categories[rnd.choice(INSTANCE_CATEGORIES)]
+        families.append(Family(new_id(), 'Family {}'.format(i), category))
+    elements.extend(families)
+
+    symbols = []
+    for i in range(max(1, count // 50)):
+        family = rnd.choice(families)
+        symbols.append(FamilySymbol(new_id(), 'Type {}'.format(i), family))
+    elements.extend(symbols)
+
+    for i in range(max(1, count // 100)):
+        if i % 10 == 0:
+            elements.append(ViewSheet(
+                new_id(), 'Sheet {}'.format(i), category=categories[-2003100]))
+        else:
+            elements.append(View(
+                new_id(), 'View {}'.format(i), is_template=i % 7 == 0,
+                category=categories[-2000279]))
+
+    while len(elements) < count:
+        elements.append(FamilyInstance(
+            new_id(),
+            rnd.choice(symbols),
+            level_id=rnd.choice(levels).Id.IntegerValue,
+            workset_id=rnd.choice(worksets)))
+
+    return Document('Stand-in {}'.format(count), elements)
+
+
+def benchmark(count):
+    from lib.index import ElementIndex
+
+    doc = make_document(count)
+    start = time.time()
+    index = ElementIndex(doc, doc.elements)
+    build = time.time() - start
+
+    start = time.time()
+    instances = index.of_class(FamilyInstance)
+    doors = index.of_category(-2000023)
+    templates = [x for x in index.of_class(View) if x.IsTemplate]
+    on_level = index.on_level(doc.elements[0].Id)
+    query = time.time() - start
+
+    print('{:>9} elements: build {:.3f}s, queries {:.3f}s '
+        '({} instances, {} doors, {} templates, {} on level)'.format(
+            len(index), build, query, len(instances), len(doors),
+            len(templates), len(on_level)))
+
+
+if __name__ == '__main__':
+    for arg in sys.argv[1:] or ['10000', '100000', '1000000']:
+        benchmark(int(arg))
@@ -0,0 +1,165 @@
+"""
+Bulk family type swaps.
+
+SymbolIndex is built in one pass over the ElementIndex: symbols by
+(family name, type name) and instances by type id, so resolving a swap is
+a dict lookup however many mappings there are:
+
+    swap_symbols(doc, [
+        ('Door Single', 'D01 900', 'D01 920'),
+        ('Door Single', 'D02 900', 'Door Double', 'D02 1800'),
+    ])
+
+Group members can't be retyped in place. For every group type with a
+member to swap, one instance is ungrouped, its members swapped and a new
+group created from them; every other instance of the old group type is
+then switched to the new group type, and the new type takes over the old
+type's name. Nested groups are reported and left alone.
+"""
+from collections import defaultdict
+
+from lib.batch import run_batched
+from lib.index import get_index
+
+try:
+    from Autodesk.Revit.DB import BuiltInParameter
+    from Autodesk.Revit.DB import FamilyInstance
+    from Autodesk.Revit.DB import FamilySymbol
+    from Autodesk.Revit.DB import Group
+except ImportError:
+    pass
+
+
+class SymbolIndex(object):
+
+    def __init__(self, doc):
+        index = get_index(doc)
+        self.doc = doc
+        self.symbols = {}
+        for symbol in index.of_class(FamilySymbol):
+            type_name = symbol.get_Parameter(
+                BuiltInParameter.ALL_MODEL_TYPE_NAME).AsString()
+            self.symbols[(symbol.FamilyName, type_name)] = symbol
+
+        self.instances = defaultdict(list)
+        for instance in index.of_class(FamilyInstance):
+            self.instances[instance.GetTypeId().IntegerValue].append(instance)
+
+        self.groups = defaultdict(list)
+        for group in index.of_class(Group):
+            self.groups[group.GetTypeId().IntegerValue].append(group)
+
+    def symbol(self, family_name, type_name):
+        return self.symbols.get((family_name, type_name))
+
+    def instances_of(self, symbol):
+        return self.instances.get(symbol.Id.IntegerValue, [])
+
+    def resolve(self, mapping):
+        """
+        Turn (family, from type, to type) or (from family, from type, to
+        family, to type) rows into {from symbol id: to symbol}, printing the
+        rows that don't resolve
+        """
+        swaps = {}
+        for row in mapping:
+            if len(row) == 3:
+                from_key = (row[0], row[1])
+                to_key = (row[0], row[2])
+            else:
+                from_key = (row[0], row[1])
+                to_key = (row[2], row[3])
+            from_symbol = self.symbols.get(from_key)
+            to_symbol = self.symbols.get(to_key)
+            if from_symbol is None or to_symbol is None:
+                print('Type not found: {} -> {}'.format(
+                    ': '.join(from_key), ': '.join(to_key)))
+                continue
+            swaps[from_symbol.Id.IntegerValue] = to_symbol
+        return swaps
+
+
+def _set_symbol(instance, symbol):
+    if not symbol.IsActive:
+        symbol.Activate()
+    instance.Symbol = symbol
+
+
+def _swap_group(doc, group, swaps, others):
+    """Swap the members of group and move others onto the new group type"""
+    # The group is deleted by UngroupMembers, read what's needed first
+    group_id = group.Id.IntegerValue
+    old_type = group.GroupType
+    name = old_type.Name
+    member_ids = group.UngroupMembers()
+    for member_id in member_ids:
+        member = doc.GetElement(member_id)
+        if isinstance(member, FamilyInstance):
+            symbol = swaps.get(member.GetTypeId().IntegerValue)
+            if symbol is not None:
+                _set_symbol(member, symbol)
+
+    new_type = doc.Create.NewGroup(member_ids).GroupType
+    nested = 0
+    for other in others:
+        if other.Id.IntegerValue == group_id:
+            continue
+        # The type of a group nested in another group can't be changed
+        if other.GroupId.IntegerValue >= 0:
+            nested += 1
+            continue
+        other.GroupType = new_type
+
+    if nested:
+        # Deleting the old type would delete its nested instances too
+        print('{} nested instances of group {} keep the old type'.format(
+            nested, name))
+        return
+    doc.Delete(old_type.Id)
+    new_type.Name = name
+
+
+def swap_symbols(doc, mapping, chunk_size=500, name='Swap symbols'):
+    """
+    Swap every instance of each from type in mapping to its to type,
+    including instances in groups, in one batched transaction. Returns the
+    number of instances and group types changed.
+    """
+    index = SymbolIndex(doc)
+    swaps = index.resolve(mapping)
+
+    instances = []
+    groups = {}
+    group_of = {}
+    for from_id in swaps:
+        for instance in index.instances.get(from_id, []):
+            group_id = instance.GroupId.IntegerValue
+            if group_id < 0:
+                instances.append(instance)
+                continue
+            group = group_of.get(group_id)
+            if group is None:
+                group = group_of[group_id] = doc.GetElement(instance.GroupId)
+            if group.GroupId.IntegerValue >= 0:
+                print('{} is in nested group {}, not swapped'.format(
+                    instance.Id, group.Name))
+                continue
+            groups.setdefault(group.GetTypeId().IntegerValue, group)
+
+    print('{} instances and {} group types to swap'.format(
+        len(instances), len(groups)))
+
+    items = [(x, None) for x in groups.values()] + [
+        (x, swaps[x.GetTypeId().IntegerValue]) for x in instances]
+
+    def swap(item):
+        element, symbol = item
+        if symbol is None:
+            _swap_group(doc, element, swaps,
+                index.groups[element.GetTypeId().IntegerValue])
+        else:
+            _set_symbol(element, symbol)
+        return True
+
+    return run_batched(doc, name, items, swap,
+        key=lambda x: x[0].UniqueId, chunk_size=chunk_size)
@@ -0,0 +1,164 @@
+"""
+Instance counts per type, family, level and view, kept up to date.
+
+The UsageIndex of a document is built once from the ElementIndex and then
+follows the document through Revit's DocumentChanged event: added,
+modified and deleted elements are applied to the counts as they happen,
+undo and redo included. Any command can query it without scanning
+instances:
+
+    usage = get_usage(doc)
+    if not usage.count(symbol.Id):
+        ...
+
+If an event can't be applied the index marks itself stale and get_usage
+rebuilds it on next use. The index is built from its own collector rather
+than the cached ElementIndex, and is dropped when its document closes.
+"""
+from collections import Counter
+from collections import defaultdict
+
+from lib.index import all_elements
+from lib.index import id_value
+
+try:
+    from Autodesk.Revit.DB import ElementType
+    from Autodesk.Revit.DB import FamilySymbol
+except ImportError:
+    pass
+
+
+_usage_indexes = {}
+
+
+class UsageIndex(object):
+
+    def __init__(self, doc, elements=None):
+        self.doc = doc
+        self.stale = False
+        self._records = {}
+        self._by_type = Counter()
+        self._by_level = defaultdict(Counter)
+        self._by_view = defaultdict(Counter)
+        self._families = {}
+        self._application = None
+
+        if elements is None:
+            elements = all_elements(doc)
+        for element in elements:
+            if isinstance(element, FamilySymbol):
+                self._families[element.Id.IntegerValue] = \
+                    element.Family.Id.IntegerValue
+            elif not isinstance(element, ElementType):
+                self._add(element)
+
+    def _add(self, element):
+        type_id = element.GetTypeId().IntegerValue
+        if type_id < 0:
+            return
+        record = (
+            type_id,
+            element.LevelId.IntegerValue,
+            element.OwnerViewId.IntegerValue)
+        self._records[element.Id.IntegerValue] = record
+        self._count(record, 1)
+
+    def _remove(self, id):
+        record = self._records.pop(id, None)
+        if record is not None:
+            self._count(record, -1)
+
+    def _count(self, record, n):
+        type_id, level_id, view_id = record
+        self._by_type[type_id] += n
+        self._by_level[level_id][type_id] += n
+        self._by_view[view_id][type_id] += n
+
+    def count(self, type_id):
+        """Number of elements of a type (ElementId or int)"""
+        return self._by_type[id_value(type_id)]
+
+    def family_count(self, family_id):
+        family_id = id_value(family_id)
+        return sum(
+            n for type_id, n in self._by_type.items()
+            if self._families.get(type_id) == family_id)
+
+    def family_counts(self):
+        """Counter of elements per family id"""
+        counts = Counter()
+        for type_id, n in self._by_type.items():
+            family_id = self._families.get(type_id)
+            if family_id is not None and n:
+                counts[family_id] += n
+        return counts
+
+    def instances_by_type(self):
+        """Map of type id -> ids of the elements of that type"""
+        instances = defaultdict(list)
+        for element_id, record in self._records.items():
+            instances[record[0]].append(element_id)
+        return instances
+
+    def used_types(self):
+        return {x for x, n in self._by_type.items() if n > 0}
+
+    def on_level(self, level_id):
+        """Counter of type id -> elements on the level"""
+        return self._by_level.get(id_value(level_id), Counter())
+
+    def in_view(self, view_id):
+        """Counter of type id -> elements owned by the view"""
+        return self._by_view.get(id_value(view_id), Counter())
+
+    def attach(self, application):
+        application.DocumentChanged += self._on_changed
+        application.DocumentClosing += self._on_closing
+        self._application = application
+
+    def detach(self):
+        if self._application is not None:
+            self._application.DocumentChanged -= self._on_changed
+            self._application.DocumentClosing -= self._on_closing
+            self._application = None
+
+    def _on_closing(self, sender, args):
+        if args.Document.Equals(self.doc):
+            self.detach()
+            if _usage_indexes.get(self.doc) is self:
+                del _usage_indexes[self.doc]
+
+    def _on_changed(self, sender, args):
+        if self.stale or not args.GetDocument().Equals(self.doc):
+            return
+        try:
+            for id in args.GetDeletedElementIds():
+                self._remove(id.IntegerValue)
+                self._families.pop(id.IntegerValue, None)
+            for ids in (args.GetAddedElementIds(), args.GetModifiedElementIds()):
+                for id in ids:
+                    self.update(self.doc.GetElement(id))
+        except Exception:
+            self.stale = True
+
+    def update(self, element):
+        """Re-read an added or modified element"""
+        if element is None:
+            return
+        if isinstance(element, FamilySymbol):
+            self._families[element.Id.IntegerValue] = \
+                element.Family.Id.IntegerValue
+        elif not isinstance(element, ElementType):
+            self._remove(element.Id.IntegerValue)
+            self._add(element)
+
+
+def get_usage(doc):
+    """Return the live UsageIndex of doc, building it on first use"""
+    usage = _usage_indexes.get(doc)
+    if usage is None or usage.stale:
+        if usage is not None:
+            usage.detach()
+        usage = _usage_indexes[doc] = UsageIndex(doc)
+        usage.attach(doc.Application)
+    return usage
@@ -0,0 +1,132 @@
+"""
+View template category visibility as bitsets.
+
+Each template gets two Python ints over the document's categories: bit i
+of `visible` is set if category i is visible, bit i of `known` if the
+template controls category i at all. Comparing templates is then integer
+arithmetic:
+
+    matrix = build_matrix(doc, templates)
+    for (visible, known), ids in matrix.signatures().items():
+        [matrix.labels[x] for x in ids]     # 'Plan - GA (FloorPlan)'
+    matrix.diff(a.Id, b.Id)     # [(category, visible a, visible b)]
+    matrix.clusters(max_distance=5)
+
+Templates are keyed by element id, since templates of different view
+types may share a name, and labelled with their name and view type.
+Templates with the same (visible, known) pair share a signature; the
+distance between two templates is the number of categories both control
+whose visibility differs.
+"""
+from collections import defaultdict
+
+from lib.duplicates import UnionFind
+from lib.index import id_value
+
+
+def popcount(x):
+    return bin(x).count('1')
+
+
+def iter_bits(x):
+    """Indexes of the set bits of x"""
+    while x:
+        low = x & -x
+        yield low.bit_length() - 1
+        x ^= low
+
+
+def template_label(template):
+    """Name and view type of a template, 'Plan - GA (FloorPlan)'"""
+    return '{} ({})'.format(
+        template.Name, str(template.ViewType).split('.')[-1])
+
+
+class VisibilityMatrix(object):
+
+    def __init__(self, categories):
+        self.categories = categories
+        self.templates = []
+        self.labels = {}
+        self.visible = {}
+        self.known = {}
+
+    def add(self, id, label, visible, known):
+        id = id_value(id)
+        self.templates.append(id)
+        self.labels[id] = label
+        self.visible[id] = visible & known
+        self.known[id] = known
+
+    def signature(self, id):
+        id = id_value(id)
+        return self.visible[id], self.known[id]
+
+    def signatures(self):
+        """Map of signature -> ids of the templates sharing it"""
+        groups = defaultdict(list)
+        for id in self.templates:
+            groups[self.signature(id)].append(id)
+        return groups
+
+    def difference(self, a, b):
+        """Bitset of the categories both templates control but show differently"""
+        a = id_value(a)
+        b = id_value(b)
+        return (self.visible[a] ^ self.visible[b]) & \
+            self.known[a] & self.known[b]
+
+    def distance(self, a, b):
+        return popcount(self.difference(a, b))
+
+    def diff(self, a, b):
+        """[(category, visible in a, visible in b)] for differing categories"""
+        visible_a = self.visible[id_value(a)]
+        return [
+            (self.categories[i], bool(visible_a >> i & 1),
+                not visible_a >> i & 1)
+            for i in iter_bits(self.difference(a, b))]
+
+    def clusters(self, max_distance=0):
+        """
+        Group templates whose signatures are within max_distance of each
+        other, comparing distinct signatures rather than all templates.
+        Returns lists of template ids, largest first.
+        """
+        groups = self.signatures()
+        signatures = list(groups)
+        uf = UnionFind()
+        for i, (visible_a, known_a) in enumerate(signatures):
+            uf.find(i)
+            for j in range(i + 1, len(signatures)):
+                visible_b, known_b = signatures[j]
+                x = (visible_a ^ visible_b) & known_a & known_b
+                if popcount(x) <= max_distance:
+                    uf.union(i, j)
+
+        members = defaultdict(list)
+        for i, signature in enumerate(signatures):
+            members[uf.find(i)].extend(groups[signature])
+        return sorted(members.values(), key=len, reverse=True)
+
+
+def build_matrix(doc, templates):
+    """
+    Read the category visibility of templates into a VisibilityMatrix over
+    the top level categories of doc
+    """
+    categories = sorted(doc.Settings.Categories, key=lambda x: x.Name)
+    matrix = VisibilityMatrix(categories)
+    for template in templates:
+        visible = known = 0
+        for i, category in enumerate(categories):
+            try:
+                if not category.get_AllowsVisibilityControl(template):
+                    continue
+                if category.get_Visible(template):
+                    visible |= 1 << i
+            except Exception:
+                continue
+            known |= 1 << i
+        matrix.add(template.Id, template_label(template), visible, known)
+    return matrix
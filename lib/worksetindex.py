@@ -0,0 +1,115 @@
+"""
+Workset names and per-workset element sets of a document.
+
+The user worksets are read once into an id <-> name table and the
+ElementIndex already buckets every element by workset, so workset audits
+become lookups and set differences rather than a GetWorksetId and
+GetWorkset call per element:
+
+    worksets = get_worksets(doc)
+    worksets.name(element.WorksetId)               # 'A_FFE'
+    worksets.id('A_FFE')                           # 1234
+    worksets.not_on('A_FFE', category=BuiltInCategory.OST_Furniture)
+    worksets.counts(category=BuiltInCategory.OST_Doors)
+
+Worksets may be given by name, WorksetId or plain int throughout. Names
+of non-user worksets (views, families, standards) are looked up in the
+workset table on first use.
+"""
+from collections import Counter
+
+from lib import get_document_cache
+from lib.index import get_index
+from lib.index import id_value
+
+try:
+    from Autodesk.Revit.DB import FilteredWorksetCollector
+    from Autodesk.Revit.DB import WorksetId
+    from Autodesk.Revit.DB import WorksetKind
+except ImportError:
+    pass
+
+
+class WorksetIndex(object):
+
+    def __init__(self, doc, worksets=None):
+        self.doc = doc
+        self.index = get_index(doc)
+        self._names = {}
+        self._ids = {}
+        self._element_ids = {}
+        self._table = None
+        if worksets is None:
+            worksets = FilteredWorksetCollector(doc).OfKind(
+                WorksetKind.UserWorkset)
+        for workset in worksets:
+            value = workset.Id.IntegerValue
+            self._names[value] = workset.Name
+            self._ids[workset.Name] = value
+        self.user_worksets = sorted(self._ids)
+
+    def id(self, workset):
+        """Integer id of a workset name, WorksetId or int, None if unknown"""
+        if isinstance(workset, str):
+            return self._ids.get(workset)
+        return id_value(workset)
+
+    def name(self, workset):
+        value = self.id(workset)
+        if value is None:
+            return None
+        name = self._names.get(value)
+        if name is None:
+            if self._table is None:
+                self._table = self.doc.GetWorksetTable()
+            name = self._names[value] = self._table.GetWorkset(
+                WorksetId(value)).Name
+        return name
+
+    def elements(self, workset):
+        """Elements on the workset, from the ElementIndex"""
+        value = self.id(workset)
+        return [] if value is None else self.index.on_workset(value)
+
+    def element_ids(self, workset):
+        """Set of the integer ids of the elements on the workset"""
+        value = self.id(workset)
+        ids = self._element_ids.get(value)
+        if ids is None:
+            ids = self._element_ids[value] = frozenset(
+                x.Id.IntegerValue for x in self.elements(value))
+        return ids
+
+    def _select(self, category, cls):
+        if category is not None:
+            elements = self.index.of_category(category)
+            if cls is not None:
+                elements = [x for x in elements if isinstance(x, cls)]
+            return elements
+        if cls is not None:
+            return self.index.of_class(cls)
+        return self.index
+
+    def on(self, workset, category=None, cls=None):
+        """Elements of category and/or cls on the workset"""
+        ids = self.element_ids(workset)
+        return [
+            x for x in self._select(category, cls) if x.Id.IntegerValue in ids]
+
+    def not_on(self, workset, category=None, cls=None):
+        """Elements of category and/or cls that are not on the workset"""
+        ids = self.element_ids(workset)
+        return [
+            x for x in self._select(category, cls)
+            if x.Id.IntegerValue not in ids]
+
+    def counts(self, category=None, cls=None):
+        """Counter of workset name -> elements of category and/or cls"""
+        counts = Counter(
+            x.WorksetId.IntegerValue for x in self._select(category, cls))
+        return Counter({self.name(x): n for x, n in counts.items()})
+
+
+def get_worksets(doc):
+    """Return the WorksetIndex of doc, building it on first use"""
+    return get_document_cache(doc).get('worksets', lambda: WorksetIndex(doc))
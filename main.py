@@ -31,6 +31,8 @@ def get_functions(start_dir):
         for name, obj in inspect.getmembers(m):
             if not inspect.isfunction(obj):
                 continue
+            if obj.__module__ != m.__name__:
+                continue
             if name.startswith('_'):
                 continue
             if not obj.__doc__:
@@ -1,35 +1,73 @@
-from collections import defaultdict
+import csv
+
+from Autodesk.Revit.DB import BuiltInParameter
+from Autodesk.Revit.DB import FamilyInstance
 
 from api import *
+from lib import get_temp_path
+from lib.batch import run_batched
+from lib.bulkupdate import BulkUpdate
+from lib.bulkupdate import read_csv
+from lib.changes import ChangeBuffer
+from lib.index import get_index
+from lib.marks import MarkAllocator
+from lib.marks import get_mark
+from lib.marks import index_marks
+from lib.marks import level_scheme
+import constants
+
+
+def fix_marks(doc, scope=None):
+    """
+    Renumber duplicate marks with an incremental suffix
+    """
+    all_instances = get_index(doc).of_class(FamilyInstance)
+    allocator, marks_map = index_marks(all_instances, scope)
+
+    renames = []
+    for (key, mark), elems in marks_map.items():
+        if len(elems) > 1:
+            for elem in elems:
+                renames.append((elem, allocator.allocate(mark, key)))
+
+    def rename(item):
+        elem, new_mark = item
+        elem.get_Parameter(BuiltInParameter.ALL_MODEL_MARK).Set(new_mark)
+        return True
+
+    run_batched(doc, 'Fix marks', renames, rename, key=lambda x: x[0].UniqueId)
 
 
-def fix_marks(doc):
+def renumber_marks(doc, category_name=None, scheme=None):
     """
-    Renumber duplicate marks with an incremental suffix
+    Renumber the marks of all instances of a category per level, e.g.
+    'LEVEL 1-0001'
     """
-    marks_map = defaultdict(list)
-    all_instances = FilteredElementCollector(doc).OfClass(FamilyInstance)
-
-    for instance in all_instances:
-        mark_param = instance.get_Parameter(BuiltInParameter.ALL_MODEL_MARK)
-        if not mark_param:
-            continue
-        mark_val = mark_param.AsString()
-        if not mark_val:
-            continue
-        marks_map[mark_val].append(instance)
-
-    count = 0
-    with transaction(doc, 'Fix marks'):
-        for mark, elems in marks_map.items():
-            if len(elems) > 1:
-                inc = 1
-                for elem in elems:
-                    new_mark = '{}-{}'.format(mark, inc)
-                    elem.get_Parameter(BuiltInParameter.ALL_MODEL_MARK).Set(new_mark)
-                    inc += 1
-                    count += 1
-                    print('{} {}'.format(count, new_mark))
+    if category_name is None:
+        category_name = raw_input('Enter category: ').strip()
+    scheme = scheme or level_scheme(doc)
+
+    elements = []
+    allocator = MarkAllocator(fmt='{}-{:04d}')
+    for instance in get_index(doc).of_class(FamilyInstance):
+        category = instance.Category
+        if category and category.Name == category_name:
+            elements.append(instance)
+        else:
+            mark = get_mark(instance)
+            if mark:
+                allocator.add(mark)
+
+    changes = ChangeBuffer()
+    for element in sorted(elements, key=lambda x: x.Id.IntegerValue):
+        changes.set(
+            element,
+            BuiltInParameter.ALL_MODEL_MARK,
+            allocator.allocate(scheme(element)))
+
+    run_batched(doc, 'Renumber marks', changes.pending(), changes.write,
+        key=lambda x: x.key)
+    changes.report()
 
 
 def delete_params(doc):
@@ -69,21 +107,19 @@ def copy_parameter_values(doc, src_param, dest_param):
     """Copy the value of one parameter to another parameter"""
 
     families = FilteredElementCollector(doc).OfClass(Family)
+    changes = ChangeBuffer()
 
-    with transaction(doc, 'Copy parameters'):
-        for fam in families:
-            print(fam.Name)
-            for symbol_id in fam.GetFamilySymbolIds():
-                symbol = doc.GetElement(symbol_id)
-                src_param = symbol.LookupParameter(src_param)
-                dest_param = symbol.LookupParameter(dest_param)
-                if not src_param or not dest_param:
-                    continue
+    for fam in families:
+        for symbol_id in fam.GetFamilySymbolIds():
+            symbol = doc.GetElement(symbol_id)
+            src = symbol.LookupParameter(src_param)
+            if not src:
+                continue
+            changes.set(symbol, dest_param, src.AsString())
 
-                try:
-                    dest_param.Set(src_param.AsString())
-                except Exception, e:
-                    print e
+    with transaction(doc, 'Copy parameters'):
+        changes.apply()
+    changes.report()
 
 
 def set_parameter_all_types(doc):
@@ -143,12 +179,37 @@ def fix_family_hfbs():
 
 def set_bim_id(doc):
     elements = FilteredElementCollector(doc).OfClass(FamilySymbol)
+    changes = ChangeBuffer()
+    for elem in elements:
+        dtx_param = elem.LookupParameter(constants.DESCRIPTOR_TX)
+        if dtx_param:
+            changes.set(elem, constants.BIM_ID, dtx_param.AsString())
+
     with transaction(doc, 'Populate BIM ID parameter'):
-        for elem in elements:
-            dtx_param = elem.LookupParameter('Descriptor_TX')
-            bid_param = elem.LookupParameter('BIM ID')
-            if dtx_param and bid_param:
-                bid_param.Set(dtx_param.AsString())
-                print(dtx_param.AsString(), bid_param.AsString())
+        changes.apply()
+    changes.report()
 
 
+def bulk_update(doc):
+    """
+    Update parameters from a CSV, matching rows to elements on UniqueId,
+    ElementId or any parameter. Empty cells are left unchanged.
+    """
+    csv_path = raw_input('CSV file: ').strip().strip('"')
+    with open(csv_path) as f:
+        columns = csv.DictReader(f).fieldnames
+    print('Columns: {}'.format(', '.join(columns)))
+    key_column = raw_input('Key column: ').strip()
+    key = raw_input(
+        'Match on (UniqueId, ElementId or parameter name): ').strip()
+    category_name = raw_input('Category (blank for all): ').strip()
+
+    index = get_index(doc)
+    elements = None
+    if category_name:
+        elements = [x for x in index
+            if x.Category and x.Category.Name == category_name]
+    update = BulkUpdate(doc, key or key_column, elements)
+    update.read(read_csv(csv_path), key_column,
+        [(x, x) for x in columns if x != key_column], skip_empty=True)
+    update.apply('Bulk update', get_temp_path('bulk_update.csv'))
@@ -1,5 +1,8 @@
+from collections import Counter
 import os
 import csv
+import tempfile
+import time
 
 from Autodesk.Revit.DB import BuiltInCategory
 from Autodesk.Revit.DB import BuiltInParameter
@@ -21,52 +24,182 @@ from Autodesk.Revit.DB import XYZ
 from System.Collections.Generic import List
 
 import lib
+from lib.bulkupdate import BulkUpdate
+from lib.bulkupdate import ELEMENT_ID
+from lib.bulkupdate import read_csv
+from lib.doorgraph import get_door_graph
+from lib.index import get_index
+from lib.numeric import GROUP_BY
+from lib.numeric import NumericAudit
+from lib.numeric import histogram
+from lib.placement import get_placement
+from lib.snapshot import ADDED
+from lib.snapshot import MODIFIED
+from lib.snapshot import REMOVED
+from lib.snapshot import diff_snapshots
+from lib.snapshot import snapshot_records
+from lib.snapshot import write_snapshot
+from lib.reporting import Report
+from lib.reporting import category_name
+from lib.reporting import element_id
+from lib.reporting import family_name
+from lib.reporting import has_host
+from lib.reporting import host_attribute
+from lib.reporting import level_name
+from lib.reporting import param
+from lib.reporting import run_reports
+from lib.reporting import type_param
+from lib.reporting import workset_name
+from lib.visibility import build_matrix
+from lib.visibility import popcount
+from lib.visibility import template_label
 from api import *
 import constants
 
 
+def _offset(element, context):
+    offset = element.get_Parameter(
+        BuiltInParameter.INSTANCE_FREE_HOST_OFFSET_PARAM)
+    if not offset:
+        return ''
+    return offset.AsDouble() * constants.MM
+
+
+FAMILIES_REPORT = Report('{title} - families', [
+    ('Category', lambda x, context: x.FamilyCategory.Name),
+    ('Family', lambda x, context: x.Name),
+], cls=Family)
+
+DOOR_WINDOW_WALLS_REPORT = Report('{title} - DoorsWindows', [
+    ('Category', category_name),
+    ('Level', level_name),
+    ('Family', family_name),
+    ('Type', lambda x, context: x.Name),
+    ('Code', type_param(constants.DESCRIPTOR_TX)),
+    ('Mark', param(BuiltInParameter.ALL_MODEL_MARK)),
+    ('Wall Type', host_attribute('Wall Type')),
+    ('Wall Code', host_attribute('Wall Code')),
+    ('Wall Width', host_attribute('Wall Width')),
+], cls=FamilyInstance,
+    categories=[BuiltInCategory.OST_Doors, BuiltInCategory.OST_Windows],
+    where=has_host)
+
+FAMILY_TYPES_REPORT = Report('report', [
+    ('Category', category_name),
+    ('Family', lambda x, context: x.FamilyName),
+    ('Type', param(BuiltInParameter.ALL_MODEL_TYPE_NAME)),
+    ('Descriptor_TX', param(constants.DESCRIPTOR_TX)),
+    ('BIM ID', param(constants.BIM_ID)),
+], cls=FamilySymbol)
+
+OFFSETS_REPORT = Report('offsets', [
+    ('ID', element_id),
+    ('Category', category_name),
+    ('Family', family_name),
+    ('Type', type_param(BuiltInParameter.ALL_MODEL_TYPE_NAME)),
+    ('Level', level_name),
+    ('Offset', _offset),
+], cls=FamilyInstance)
+
+ELEMENT_REPORT = Report('element_report', [
+    ('ID', element_id),
+    ('Mark', param(BuiltInParameter.ALL_MODEL_MARK)),
+    ('Workset', workset_name),
+    ('Category', category_name),
+    ('Family', family_name),
+    ('Level', level_name),
+], cls=FamilyInstance)
+
+STANDARD_REPORTS = [
+    FAMILIES_REPORT,
+    DOOR_WINDOW_WALLS_REPORT,
+    FAMILY_TYPES_REPORT,
+    OFFSETS_REPORT,
+    ELEMENT_REPORT,
+]
+
+
 def families_report(doc):
     """Generate report of families"""
-    with open(os.path.join(constants.HOMEDIR, '{} - families.csv'.format(doc.Title)), 'w') as f:
-        w = csv.writer(f, lineterminator='\n')
-        w.writerow(('Category', 'Family'))
-        for family in FilteredElementCollector(doc).OfClass(Family):
-            try:
-                w.writerow((family.FamilyCategory.Name, family.Name))
-            except:
-                print(family)
-
+    run_reports(doc, [FAMILIES_REPORT], constants.HOMEDIR)
 
-def view_template_report(doc):
-    """Generate csv report of View Templates and their Category visibility"""
 
-    views = FilteredElementCollector(doc).OfClass(View)
-    rows = []
-    templates = set()
+def _category_type(category):
+    return str(category.CategoryType).split('.')[-1]
 
-    for view in views:
-        if view.ViewTemplateId != ElementId.InvalidElementId:
-            templates.add(view.ViewTemplateId)
 
-    for template_id in templates:
-        template = doc.GetElement(template_id)
-        print(template.Name)
-        for cat in doc.Settings.Categories:
-            try:
-                rows.append((
-                    template.Name,
-                    str(cat.CategoryType).split('.')[-1],
-                    cat.Name,
-                    cat.get_Visible(template)
-                ))
-            except:
-                pass
+def view_template_report(doc, max_distance=10):
+    """Generate csv report of View Templates and their Category visibility"""
+    templates = [x for x in get_index(doc).of_class(View) if x.IsTemplate]
+    matrix = build_matrix(doc, templates)
 
+    signatures = sorted(
+        matrix.signatures().values(), key=len, reverse=True)
+    csv_name = os.path.join(constants.HOMEDIR, '{} - View Template signatures.csv'.format(doc.Title))
+    with open(csv_name, 'w') as f:
+        w = csv.writer(f, lineterminator='\n')
+        w.writerow(('Signature', 'Templates', 'Hidden', 'Template Names'))
+        for i, ids in enumerate(signatures, 1):
+            visible, known = matrix.signature(ids[0])
+            w.writerow((
+                i, len(ids), popcount(known & ~visible),
+                '; '.join(matrix.labels[x] for x in ids)))
+
+    # Differences of every template from the most common signature of its
+    # cluster of near-identical templates
     csv_name = os.path.join(constants.HOMEDIR, '{} - View Templates.csv'.format(doc.Title))
+    rows = 0
     with open(csv_name, 'w') as f:
         w = csv.writer(f, lineterminator='\n')
-        w.writerow(('View Template', 'Type', 'Category', 'Visible'))
-        w.writerows(rows)
+        w.writerow((
+            'Cluster', 'View Template', 'Reference', 'Type', 'Category',
+            'Visible', 'Reference Visible'))
+        for i, ids in enumerate(matrix.clusters(max_distance), 1):
+            counts = Counter(matrix.signature(x) for x in ids)
+            reference = next(
+                x for x in ids if matrix.signature(x) == counts.most_common(1)[0][0])
+            for id in ids:
+                for category, visible, ref_visible in matrix.diff(id, reference):
+                    w.writerow((
+                        i, matrix.labels[id], matrix.labels[reference],
+                        _category_type(category), category.Name, visible,
+                        ref_visible))
+                    rows += 1
+
+    print('{} templates, {} signatures, {} differences'.format(
+        len(templates), len(signatures), rows))
+
+
+def _find_template(templates, text):
+    """
+    The template named text, or labelled text where templates of several
+    view types share the name. Prints the candidates if there isn't one.
+    """
+    found = [
+        x for x in templates if text in (x.Name, template_label(x))]
+    if len(found) == 1:
+        return found[0]
+    if not found:
+        print('Template not found: {}'.format(text))
+    else:
+        print('Several templates named {}, enter one of: {}'.format(
+            text, '; '.join(template_label(x) for x in found)))
+
+
+def diff_view_templates(doc):
+    """Print the category visibility differences between two view templates"""
+    templates = [x for x in get_index(doc).of_class(View) if x.IsTemplate]
+    a = _find_template(templates, raw_input('First template: ').strip())
+    if a is None:
+        return
+    b = _find_template(templates, raw_input('Second template: ').strip())
+    if b is None:
+        return
+    matrix = build_matrix(doc, [a, b])
+    for category, visible_a, visible_b in matrix.diff(a.Id, b.Id):
+        print('{}: {} / {}'.format(category.Name,
+            'visible' if visible_a else 'hidden',
+            'visible' if visible_b else 'hidden'))
 
 
 def sheet_report(doc):
@@ -84,56 +217,7 @@ def sheet_report(doc):
 
 def get_door_window_walls(doc):
     """Report all doors or windows with hosted wall types"""
-
-    categories = List[BuiltInCategory]()
-    categories.Add(BuiltInCategory.OST_Doors)
-    categories.Add(BuiltInCategory.OST_Windows)
-    categories_filter = ElementMulticategoryFilter(categories)
-
-    elements = FilteredElementCollector(doc).OfClass(FamilyInstance).WherePasses(categories_filter)
-    level_map = {}
-    rows = []
-    for element in elements:
-        wall = element.Host
-        if not wall:
-            continue
-        if not wall.WallType:
-            continue
-
-        level_id = element.LevelId
-        level = level_map.get(level_id)
-        if not level:
-            level = doc.GetElement(level_id)
-            level_map[level_id] = level
-
-        rows.append([
-            element.Category.Name,
-            level.Name,
-            element.Symbol.FamilyName,
-            element.Name,
-            element.Symbol.LookupParameter('Descriptor_TX').AsString() or '',
-            element.get_Parameter(BuiltInParameter.ALL_MODEL_MARK).AsString(),
-            wall.WallType.get_Parameter(BuiltInParameter.ALL_MODEL_TYPE_NAME).AsString(),
-            wall.WallType.LookupParameter('Wall_Mark_TX').AsString() or '',
-            wall.WallType.Width * constants.MM,
-        ])
-
-    csv_name = os.path.join(constants.HOMEDIR, '{} - DoorsWindows.csv'.format(doc.Title))
-
-    with open(csv_name, 'w') as f:
-        writer = csv.writer(f, lineterminator='\n')
-        writer.writerow([
-            'Category',
-            'Level',
-            'Family',
-            'Type',
-            'Code',
-            'Mark',
-            'Wall Type',
-            'Wall Code',
-            'Wall Width',
-        ])
-        writer.writerows(rows)
+    run_reports(doc, [DOOR_WINDOW_WALLS_REPORT], constants.HOMEDIR)
 
 
 def export_rooms_csv(doc):
@@ -150,59 +234,73 @@ def export_rooms_csv(doc):
     print 'Done'
 
 
-def import_rooms_csv(doc):
-    rooms = FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_Rooms)
-    id_map = {}
-    csvpath = r'I:\NBIF\Projects\NB98100\Deliverables\BIM\01_Architecture\A_WIP Models\rooms_updated.csv'
-    with open(csvpath) as f:
-        for row in csv.DictReader(f, ):
-            id_map[row['ID']] = row
+def _check_room_level(row, room):
+    if row['Level'] in ('Level 1', 'Level 4', 'Level 5'):
+        raise ValueError('Room {} is on {}'.format(row['ID'], row['Level']))
 
-    tr = Transaction(doc, "Change room numbers")
-    tr.Start()
 
-    with open('rooms_changed.csv', 'w') as f:
-        w = csv.writer(f)
-        w.writerow(['ID', 'Name', 'Old Number', 'New Number', 'Level'])
-        for room in rooms:
-            id_row = id_map.get(str(room.Id))
-            if id_row:
-                assert id_row['Level'] not in ['Level 1', 'Level 4', 'Level 5']
-                old_number = room.Number
-                room.Number = id_row['Number']
-                print '{} - {} -> {}'.format(room.Id, old_number, room.Number)
-                w.writerow([
-                    room.Id,
-                    room.get_Parameter(BuiltInParameter.ROOM_NAME).AsString(),
-                    old_number,
-                    room.Number,
-                    room.Level.Name])
-
-    tr.Commit()
-
-
-def list_doors():
-    doors = FilteredElementCollector(doc)\
-        .OfClass(FamilyInstance)\
-        .OfCategory(BuiltInCategory.OST_Doors)
-    print 'ID           Mark    ToRoom  FromRoom'
-    print '--           ------- ------- --------'
-    for door in doors:
-        phase = doc.GetElement(door.CreatedPhaseId)
-        try:
-            to_room = door.ToRoom[phase]
-            from_room = door.FromRoom[phase]
-            door_mark = door.get_Parameter(BuiltInParameter.ALL_MODEL_MARK).AsString()
-            to_room_number = None
-            from_room_number = None
-            if to_room:
-                to_room_number = to_room.Number
-            if from_room:
-                from_room_number = from_room.Number
-            print '{}\t{}\t{}\t{}'.format(door.Id, door_mark[:7], to_room_number, from_room_number)
-        except:
-            pass
-    print
+ROOMS_CSV = r'I:\NBIF\Projects\NB98100\Deliverables\BIM\01_Architecture\A_WIP Models\rooms_updated.csv'
+
+
+def import_rooms_csv(doc, csv_path=ROOMS_CSV):
+    rooms = get_index(doc).of_category(BuiltInCategory.OST_Rooms)
+    update = BulkUpdate(doc, ELEMENT_ID, rooms)
+    update.read(read_csv(csv_path), 'ID',
+        [(BuiltInParameter.ROOM_NUMBER, 'Number')], check=_check_room_level)
+    update.apply('Change room numbers', lib.get_temp_path('rooms_changed.csv'))
+
+
+def _room_number(graph, room_id):
+    room = graph.rooms.get(room_id)
+    return room.number if room else None
+
+
+def list_doors(doc):
+    """Print the to and from rooms of every door in the last phase"""
+    graph = get_door_graph(doc)
+    print('ID           Mark    ToRoom  FromRoom')
+    print('--           ------- ------- --------')
+    for door in sorted(graph.doors.values()):
+        print('{}\t{}\t{}\t{}'.format(
+            door.id, door.mark[:7], _room_number(graph, door.to_room),
+            _room_number(graph, door.from_room)))
+    for door_id, error in graph.errors:
+        print('{}\t{}'.format(door_id, error))
+    print('')
+
+
+def door_report(doc):
+    """
+    Generate csv report of doors and the rooms they connect in the last
+    phase, with rooms that have no door, and save the door/room graph
+    """
+    graph = get_door_graph(doc)
+    name = '{} - Doors {}'.format(doc.Title, graph.phase)
+    with open(os.path.join(constants.HOMEDIR, name + '.csv'), 'w') as f:
+        w = csv.writer(f, lineterminator='\n')
+        w.writerow((
+            'Door ID', 'Mark', 'To Room', 'To Room Name', 'From Room',
+            'From Room Name', 'Issue'))
+        for door in sorted(graph.doors.values()):
+            to_room = graph.rooms.get(door.to_room)
+            from_room = graph.rooms.get(door.from_room)
+            w.writerow((
+                door.id, door.mark,
+                to_room.number if to_room else '',
+                to_room.name if to_room else '',
+                from_room.number if from_room else '',
+                from_room.name if from_room else '',
+                '' if to_room and from_room else 'Missing room'))
+        for door_id, error in graph.errors:
+            w.writerow((door_id, '', '', '', '', '', error))
+        for room in sorted(graph.rooms_without_doors()):
+            w.writerow(('', '', room.number, room.name, '', '', 'No door'))
+    graph.save(os.path.join(constants.HOMEDIR, name + '.json'))
+
+    print('{} doors, {} rooms, {} doors missing a room, {} rooms without '
+        'doors, {} errors'.format(
+            len(graph.doors), len(graph.rooms), len(graph.missing_rooms()),
+            len(graph.rooms_without_doors()), len(graph.errors)))
 
 
 def list_text():
@@ -213,26 +311,7 @@ def list_text():
 
 def export_families(doc):
     """Generate report of loaded families and types"""
-
-    symbols = FilteredElementCollector(doc).OfClass(FamilySymbol)
-    with open(os.path.join(constants.HOMEDIR, 'report.csv'), 'w') as f:
-        w = csv.writer(f, lineterminator='\n')
-        w.writerow(['Category', 'Family', 'Type', 'Descriptor_TX', 'BIM ID'])
-        for symbol in symbols:
-            name = symbol.get_Parameter(
-                BuiltInParameter.ALL_MODEL_TYPE_NAME).AsString()
-            family = symbol.Family.Name
-            category = symbol.Category.Name
-            dtx_param = symbol.LookupParameter('Descriptor_TX')
-            dtx = ''
-            if dtx_param:
-                dtx = dtx_param.AsString()
-            bim_id_param = symbol.LookupParameter('BIM ID')
-            if bim_id_param:
-                bim_id = bim_id_param.AsString()
-            else:
-                bim_id = ''
-            w.writerow([category, family, name, dtx, bim_id])
+    run_reports(doc, [FAMILY_TYPES_REPORT], constants.HOMEDIR)
 
 
 def parameter_report(doc):
@@ -247,25 +326,52 @@ def parameter_report(doc):
 
 
 def offsets_report(doc):
-    out = []
-    for instance in FilteredElementCollector(doc).OfClass(FamilyInstance):
-        offset = instance.get_Parameter(
-            BuiltInParameter.INSTANCE_FREE_HOST_OFFSET_PARAM
-        ).AsDouble() * constants.MM
-        #if offset < 0:
-        out.append((
-            instance.Id.IntegerValue,
-            instance.Symbol.Category.Name,
-            instance.Symbol.Family.Name,
-            instance.Symbol.get_Parameter(
-                BuiltInParameter.ALL_MODEL_TYPE_NAME).AsString(),
-            doc.GetElement(instance.LevelId).Name if instance.LevelId != ElementId.InvalidElementId else '',
-            offset,
-        ))
-    with open(os.path.join(HOMEDIR, 'offsets.csv'), 'w') as f:
+    run_reports(doc, [OFFSETS_REPORT], constants.HOMEDIR)
+
+
+def _parameter_spec(name):
+    """BuiltInParameter for the name of one, otherwise the name itself"""
+    return getattr(BuiltInParameter, name, None) or name
+
+
+def numeric_audit(doc, z=3.0, k=1.5):
+    """
+    Report outliers of numeric parameters of a category grouped by family,
+    type or level, with a summary of every group
+    """
+    category_name = raw_input('Category: ').strip()
+    names = raw_input(
+        'Parameters [INSTANCE_FREE_HOST_OFFSET_PARAM]: ').strip() or \
+        'INSTANCE_FREE_HOST_OFFSET_PARAM'
+    group_by = raw_input('Group by (family, type or level) [type]: ').strip() \
+        or 'type'
+
+    elements = [x for x in get_index(doc).of_class(FamilyInstance)
+        if x.Category and x.Category.Name == category_name]
+    audit = NumericAudit(
+        [(x.strip(), _parameter_spec(x.strip())) for x in names.split(',')],
+        GROUP_BY[group_by])
+    audit.load(doc, elements)
+
+    name = '{} - {} numeric'.format(doc.Title, category_name)
+    with open(os.path.join(constants.HOMEDIR, name + ' summary.csv'), 'w') as f:
+        w = csv.writer(f, lineterminator='\n')
+        w.writerow(('Group', 'Parameter', 'Count', 'Mean', 'Std', 'Min', 'P5',
+            'Q1', 'Median', 'Q3', 'P95', 'Max', 'Histogram'))
+        for group, column, values in audit.columns():
+            w.writerow((group, column) + audit.summary(group, column) +
+                (' '.join(str(x) for x in histogram(values)),))
+
+    count = 0
+    with open(os.path.join(constants.HOMEDIR, name + ' outliers.csv'), 'w') as f:
         w = csv.writer(f, lineterminator='\n')
-        w.writerow(['ID', 'Category', 'Family', 'Type', 'Level', 'Offset'])
-        w.writerows(out)
+        w.writerow(('ID', 'Group', 'Parameter', 'Value', 'Z', 'Low', 'High',
+            'Method'))
+        for outlier in audit.outliers(z, k):
+            w.writerow(outlier)
+            count += 1
+
+    print('{} elements, {} outliers'.format(len(elements), count))
 
 
 def view_filter_report(doc):
@@ -308,12 +414,14 @@ def view_filter_report(doc):
 
 
 def views_report(doc):
-
-    with open(os.path.join(HOMEDIR, 'views_on_sheets.csv'), 'w') as f:
+    """Generate csv report of the views and schedules placed on each sheet"""
+    placement = get_placement(doc)
+    with open(os.path.join(constants.HOMEDIR, 'views_on_sheets.csv'), 'w') as f:
         w = csv.writer(f, lineterminator='\n')
         w.writerow(('Sheet Number', 'Sheet Name', 'View Name', 'View Type'))
-        for sheet in FilteredElementCollector(doc).OfClass(ViewSheet):
-            for view in FilteredElementCollector(doc, sheet.Id).OfClass(View):
+        for sheet in placement.sheets:
+            views = placement.views(sheet) + placement.scheduled_views(sheet)
+            for view in views:
                 w.writerow((sheet.SheetNumber, sheet.Name, view.Name, view.ViewType))
 
 
@@ -322,46 +430,40 @@ def element_report(doc):
     Generate csv report of all family instances in document including workset
     and category
     """
-    elements = FilteredElementCollector(doc).OfClass(FamilyInstance)
-    levels = {}
-    worksets = {}
-    workset_table = doc.GetWorksetTable()
-    out = []
-
-    for element in elements:
-        if element.LevelId.IntegerValue in levels:
-            level = levels[element.LevelId.IntegerValue]
-        else:
-            if element.LevelId == ElementId.InvalidElementId:
-                level = ''
-            else:
-                level = doc.GetElement(element.LevelId).Name
-            levels[element.LevelId.IntegerValue] = level
-
-        workset_id = doc.GetWorksetId(element.Id)
-        workset = workset_table.GetWorkset(workset_id).Name
-
-        mark_param = element.get_Parameter(BuiltInParameter.ALL_MODEL_MARK)
-        if mark_param:
-            mark = mark_param.AsString()
-        else:
-            mark = ''
-
-        try:
-            out.append((
-                element.Id.IntegerValue,
-                mark,
-                workset,
-                element.Symbol.Category.Name,
-                element.Symbol.Family.Name,
-                level
-            ))
-        except Exception as e:
-            print(e, element)
-
-    csvfile = lib.get_temp_path('element_report.csv')
-    with open(csvfile, 'w') as f:
-        w = csv.writer(f, lineterminator='\n')
-        w.writerow(('ID', 'Mark', 'Workset', 'Category', 'Family', 'Level'))
-        w.writerows(out)
+    run_reports(doc, [ELEMENT_REPORT], tempfile.gettempdir())
+
 
+def standard_reports(doc):
+    """Run all standard reports in a single pass over the model"""
+    fmt = raw_input('Format (csv, jsonl or cols) [csv]: ').strip() or 'csv'
+    run_reports(doc, STANDARD_REPORTS, constants.HOMEDIR, fmt)
+
+
+def snapshot_model(doc):
+    """Save a snapshot of every element and its parameters for later comparison"""
+    path = os.path.join(constants.HOMEDIR, '{} - {}.snapshot.gz'.format(
+        doc.Title, time.strftime('%Y%m%d-%H%M')))
+    count = write_snapshot(path, snapshot_records(doc))
+    print('{} elements written to {}'.format(count, path))
+
+
+def compare_snapshots(doc):
+    """Report elements added, removed or modified between two snapshots"""
+    old_path = raw_input('Old snapshot: ').strip().strip('"')
+    new_path = raw_input('New snapshot: ').strip().strip('"')
+    counts = Counter()
+    csv_name = os.path.join(constants.HOMEDIR, '{} - changes.csv'.format(doc.Title))
+    with open(csv_name, 'w') as f:
+        w = csv.writer(f, lineterminator='\n')
+        w.writerow((
+            'Change', 'UniqueId', 'Category', 'Type', 'Parameter', 'Old', 'New'))
+        for change in diff_snapshots(old_path, new_path):
+            counts[change.kind] += 1
+            row = (change.kind, change.unique_id, change.category, change.type)
+            if not change.changes:
+                w.writerow(row)
+            for name, old, new in change.changes:
+                w.writerow(row + (name, old, new))
+
+    print('{} added, {} removed, {} modified'.format(
+        counts[ADDED], counts[REMOVED], counts[MODIFIED]))
@@ -1,4 +1,15 @@
+import os
+
+from Autodesk.Revit.DB import BuiltInCategory
+from Autodesk.Revit.DB import BuiltInParameter
+
 from api import *
+from lib import get_temp_path
+from lib.bulkupdate import BulkUpdate
+from lib.bulkupdate import UNIQUE_ID
+from lib.bulkupdate import read_csv
+from lib.index import get_index
+import constants
 
 
 def fix_room_names():
@@ -27,36 +38,14 @@ def renumber_rooms():
             print(param.AsString(), level)
 
 
-def fix_rooms(doc):
-    #with open(os.path.join(HOMEDIR, 'rooms.csv'), 'w') as f:
-    #    w = csv.writer(f, lineterminator='\n')
-    #    w.writerow(('ID', 'Room Name', 'Room Number', 'Level'))
-    #    rooms = FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_Rooms)
-    #    for room in rooms:
-    #        room_name = room.get_Parameter(BuiltInParameter.ROOM_NAME).AsString()
-    #        room_num = room.get_Parameter(BuiltInParameter.ROOM_NUMBER).AsString()
-    #        w.writerow((room.UniqueId, room_name.encode('utf-8'), room_num, room.Level.Name))
-    #        print(room_num)
-
+def fix_rooms(doc, csv_path=os.path.join(constants.HOMEDIR, 'RoomNames.csv')):
     # ID,Level,Room Number,New Name,Old Name,Names Match
-
-    rooms_dict = {}
-    with open(os.path.join(HOMEDIR, 'RoomNames.csv')) as f:
-        for row in csv.DictReader(f):
-            if row['Names Match'] == 'FALSE':
-                rooms_dict[row['ID']] = row
-
-    with transaction(doc, "Rename rooms"):
-        for room_id in rooms_dict:
-            room_number = rooms_dict[room_id]['Room Number']
-            incorrect_name = rooms_dict[room_id]['New Name']
-            correct_name = rooms_dict[room_id]['Old Name'].upper()
-
-            room = doc.GetElement(room_id)
-            room.get_Parameter(BuiltInParameter.ROOM_NAME).Set(correct_name)
-
-            print('{}: {} -> {}'.format(
-                room_number, incorrect_name, correct_name))
+    rooms = get_index(doc).of_category(BuiltInCategory.OST_Rooms)
+    update = BulkUpdate(doc, UNIQUE_ID, rooms)
+    update.read(
+        read_csv(csv_path, where=lambda row: row['Names Match'] == 'FALSE'),
+        'ID', [(BuiltInParameter.ROOM_NAME, lambda row: row['Old Name'].upper())])
+    update.apply('Rename rooms', get_temp_path('rooms_renamed.csv'))
 
 
 def delete_unplaced_rooms(doc):
@@ -1,27 +1,45 @@
+from datetime import datetime
+import os
+import re
+
+from Autodesk.Revit.DB import BuiltInCategory
+from Autodesk.Revit.DB import BuiltInParameter
+from Autodesk.Revit.DB import ElementId
+from Autodesk.Revit.DB import FamilySymbol
+from Autodesk.Revit.DB import FilteredElementCollector
+from Autodesk.Revit.DB import Transaction
+from Autodesk.Revit.DB import ViewSheet
+from Autodesk.Revit.DB import XYZ
+from System.Collections.Generic import List
+
 from api import *
+from lib import transaction
+from lib.batch import run_batched
+from lib.placement import get_placement
+import constants
 
 
 def set_titleblock(doc, identifier_tx, family_name, type_name):
     sheets = [x for x in FilteredElementCollector(doc).OfClass(ViewSheet) if x.LookupParameter('Identifier_TX').AsString() == 'DESIGN DEVELOPMENT']
     new_titleblock = [x for x in FilteredElementCollector(doc).OfClass(FamilySymbol).OfCategory(BuiltInCategory.OST_TitleBlocks)
         if x.FamilyName == family_name and x.Name == type_name][0]
+    placement = get_placement(doc)
     tr = Transaction(doc, "Titleblock change")
     tr.Start()
     for sheet in sheets:
-        elements_on_sheet = FilteredElementCollector(doc, sheet.Id).OfClass(FamilyInstance).OfCategory(BuiltInCategory.OST_TitleBlocks)
-        for element in elements_on_sheet:
+        for element in placement.titleblocks(sheet):
             element.Symbol = new_titleblock
     tr.Commit()
 
 
 def change_titleblocks(doc):
     sheets = [x for x in FilteredElementCollector(doc).OfClass(ViewSheet) if x.LookupParameter('Identifier_TX').AsString() == 'DESIGN DEVELOPMENT']
+    placement = get_placement(doc)
     tr = Transaction(doc, "Titleblock change")
     zone_pat = re.compile("ZONE (\d)$")
     tr.Start()
     for sheet in sheets:
-        elements_on_sheet = FilteredElementCollector(doc, sheet.Id).OfClass(FamilyInstance).OfCategory(BuiltInCategory.OST_TitleBlocks)
-        for element in elements_on_sheet:
+        for element in placement.titleblocks(sheet):
             show_keyplan = element.LookupParameter("Show Key Plan")
             show_northpoint = element.LookupParameter("North Point Visibility")
             is_plan = 'PLAN' in sheet.Name.upper()
@@ -86,38 +104,32 @@ def viewport(doc):
 
 
 def hide_schedules_on_sheets(doc):
-    logfilename = os.path.join(HOMEDIR, 'sheets_done.txt')
-    sheets_done = [x.strip() for x in open(logfilename).readlines()]
-    all_sheets = [x for x in FilteredElementCollector(doc).OfClass(ViewSheet)
-        if x.SheetNumber.startswith('RM') and
-              x.SheetNumber not in sheets_done][:20]
-    print('{} sheets left to process'.format(len(all_sheets)))
-    sheets = all_sheets[:20]
-
-    with open(logfilename, 'a') as f:
-        with transaction(doc, 'Hide schedules on room layout sheets'):
-            for sheet in sheets:
-                print(sheet.SheetNumber)
-                schedules = list(FilteredElementCollector(
-                    doc, sheet.Id
-                ).OfClass(ScheduleSheetInstance))
-                f.write('{}{}'.format(sheet.SheetNumber, os.linesep))
-
-                schedule_ids = List[ElementId](
-                    x.Id for x in schedules
-                        if x.Name.upper().startswith('FITOUT'))
-                if schedule_ids.Count == 0:
-                    continue
-
-                sheet.HideElements(schedule_ids)
-                print('{} schedules hidden'.format(len(schedule_ids)))
-
-        f.write('----------{}'.format(os.linesep))
+    sheets = [x for x in FilteredElementCollector(doc).OfClass(ViewSheet)
+        if x.SheetNumber.startswith('RM')]
+
+    placement = get_placement(doc)
+
+    def hide_schedules(sheet):
+        schedules = placement.schedules(sheet)
+
+        schedule_ids = List[ElementId](
+            x.Id for x in schedules
+                if x.Name.upper().startswith('FITOUT'))
+        if schedule_ids.Count == 0:
+            return False
+
+        sheet.HideElements(schedule_ids)
+        print('{} {} schedules hidden'.format(
+            sheet.SheetNumber, len(schedule_ids)))
+        return True
+
+    run_batched(doc, 'Hide schedules on room layout sheets', sheets,
+        hide_schedules, key=lambda x: x.SheetNumber, chunk_size=20)
 
 
 def blank_sheet_parameters(doc):
 
-    with open(os.path.join(HOMEDIR, 'sheet_parameters.txt'), 'wa') as f:
+    with open(os.path.join(constants.HOMEDIR, 'sheet_parameters.txt'), 'wa') as f:
         for sheet in FilteredElementCollector(doc).OfClass(ViewSheet):
             param_names = [
                 'Sheet Issue Date',
@@ -154,7 +166,7 @@ def sheet_titles(doc):
 
 def viewports(doc):
     sheet = doc.ActiveView
-    titleblock = list(FilteredElementCollector(doc, sheet.Id).OfClass(FamilyInstance).OfCategory(BuiltInCategory.OST_TitleBlocks))[0]
+    titleblock = get_placement(doc).titleblocks(sheet)[0]
     width = titleblock.get_Parameter(BuiltInParameter.SHEET_WIDTH).AsDouble()
     height = titleblock.get_Parameter(BuiltInParameter.SHEET_HEIGHT).AsDouble()
     #print constants.MM
@@ -8,9 +8,21 @@ from Autodesk.Revit.DB import View
 from Autodesk.Revit.DB import ViewType
 
 from lib import transaction
+from lib.index import get_index
+from lib.rename import RenameRule
+from lib.rename import RuleSet
 from api import *
 
 
+FILTER_RULES = RuleSet([RenameRule(r'(.*)\(\d\)$', '{0!c}')])
+SCHEDULE_RULES = RuleSet(
+    [RenameRule(r'(FITOUT)[- ]+(\d{4})[- ]+(.*)', '{0!u} - {1!u} - {2!u}')],
+    flags=re.IGNORECASE)
+ZONE_VIEW_RULES = RuleSet(
+    [RenameRule(r'RCP - LEVEL (\d) - 1-(\d{2,3}) Zone (\d)', 'RCP_{0}_{1}_Z{2}')])
+SCOPE_BOX_RULES = RuleSet([RenameRule(r'^(.*?)\s*Scope Box$', '{0}')])
+
+
 def set_has_layout(doc):
     pat = re.compile('^(\d{4}) - ')
     plans = (x for x in FilteredElementCollector(doc).OfClass(View) if x.ViewType == ViewType.FloorPlan)
@@ -47,14 +59,8 @@ def fix_view_templates(doc):
 
 def rename_filters(doc):
     """Rename View Filters with '(1)' at the end of the name"""
-    pat = re.compile('(.*)\(\d\)$')
-    filters = FilteredElementCollector(doc).OfClass(ParameterFilterElement)
-    with transaction(doc, 'Rename filters'):
-        for f in filters:
-            bits = pat.findall(f.Name)
-            if bits:
-                f.Name = bits[0].strip()
-                print(f.Name)
+    filters = get_index(doc).of_class(ParameterFilterElement)
+    FILTER_RULES.run(doc, 'Rename filters', filters)
 
 
 def view_params(doc):
@@ -67,8 +73,9 @@ def view_params(doc):
 
 def swap_view_templates(doc, from_name, to_name):
 
-    all_views = [x for x in FilteredElementCollector(doc).OfClass(View) if not x.IsTemplate]
-    all_templates = [x for x in FilteredElementCollector(doc).OfClass(View) if x.IsTemplate]
+    views = get_index(doc).of_class(View)
+    all_views = [x for x in views if not x.IsTemplate]
+    all_templates = [x for x in views if x.IsTemplate]
     from_template = [x for x in all_templates if x.Name == from_name][0]
     to_template = [x for x in all_templates if x.Name == to_name][0]
 
@@ -128,21 +135,9 @@ def fix_schedules(doc):
 
 
 def rename_schedules(doc):
-    pat = re.compile('(FITOUT)[- ]+(\d{4})[- ]+(.*)', re.IGNORECASE)
-    schedules = [x for x in FilteredElementCollector(doc).OfClass(View)
+    schedules = [x for x in get_index(doc).of_class(View)
         if x.ViewType == ViewType.Schedule and 'fitout' in x.Name.lower()]
-
-    with transaction(doc, 'Fix schedule titles'):
-        for schedule in schedules:
-            match = pat.findall(schedule.Name)
-            if match:
-                bits = match[0]
-                new_name = '{} - {} - {}'.format(*bits).upper()
-                try:
-                    if schedule.Name != new_name:
-                        schedule.Name = new_name
-                except:
-                    print(schedule.Name, new_name)
+    SCHEDULE_RULES.run(doc, 'Fix schedule titles', schedules)
 
 
 def rename_elevations(doc):
@@ -187,16 +182,9 @@ def fix_view_names(doc):
 
 
 def rename_zone_views(doc):
-    pat = re.compile(r'RCP - LEVEL (\d) - 1-(\d{2,3}) Zone (\d)')
-    views = [x for x in FilteredElementCollector(doc).OfClass(View) if x.ViewType == ViewType.CeilingPlan]
-    with transaction(doc, "Rename views"):
-        for view in views:
-            bits = pat.findall(view.Name)
-            if bits:
-                bits = bits[0]
-                new_name = 'RCP_{}_{}_Z{}'.format(*bits)
-                view.Name = new_name
-                print(view.Name)
+    views = [x for x in get_index(doc).of_class(View)
+        if x.ViewType == ViewType.CeilingPlan]
+    ZONE_VIEW_RULES.run(doc, 'Rename views', views)
 
 
 def fix_scope_boxes(doc):
@@ -221,22 +209,23 @@ def fix_scope_boxes(doc):
     tr.Commit()
 
 
+def _set_scope_box_name(box, name):
+    box.get_Parameter(BuiltInParameter.VOLUME_OF_INTEREST_NAME).Set(name)
+
+
 def rename_scope_boxes(doc):
-    scope_boxes = FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_VolumeOfInterest)
-    tr = Transaction(doc, 'Rename scope boxes')
-    tr.Start()
-    for box in scope_boxes:
-        new_name = box.Name.rstrip(' Scope Box')
-        box.get_Parameter(BuiltInParameter.VOLUME_OF_INTEREST_NAME).Set(new_name)
-        print(new_name)
-    tr.Commit()
+    scope_boxes = get_index(doc).of_category(
+        BuiltInCategory.OST_VolumeOfInterest)
+    SCOPE_BOX_RULES.run(doc, 'Rename scope boxes', scope_boxes,
+        set_name=_set_scope_box_name)
 
 
 def delete_unused_scope_boxes(doc):
     """Delete scope boxes that are not used in any views"""
 
-    all_views = FilteredElementCollector(doc).OfClass(View)
-    all_scope_boxes = FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_VolumeOfInterest)
+    index = get_index(doc)
+    all_views = index.of_class(View)
+    all_scope_boxes = index.of_category(BuiltInCategory.OST_VolumeOfInterest)
     all_scope_box_ids = set(x.Id for x in all_scope_boxes)
 
     used_scope_box_ids = set()
@@ -3,6 +3,10 @@ import re
 
 from api import *
 from lib import transaction
+from lib.index import get_index
+from lib.rename import RenameRule
+from lib.rename import RuleSet
+from lib.rename import get_type_name
 import constants
 
 from Autodesk.Revit.DB import BuiltInCategory
@@ -23,32 +27,15 @@ from Autodesk.Revit.DB import WallType
 from Autodesk.Revit.DB import XYZ
 
 
-def fix_walls(doc):
-    """Rename wall types"""
-    wall_types = FilteredElementCollector(doc).OfClass(WallType)
-    pat = re.compile('A_Wall_Generic Dry Wall (\d{2,3})mm')
-    with transaction(doc, 'Fix walls'):
-        for wt in wall_types:
-            try:
-                type_name = wt.get_Parameter(BuiltInParameter.ALL_MODEL_TYPE_NAME).AsString()
-                width = int(round(wt.Width * constants.MM))
-                #acoustic = wt.LookupParameter('AcousticRating_TX').AsString()
-                #fire_rating = wt.LookupParameter('FireRating_TX').AsString()
-                code = wt.get_Parameter(BuiltInParameter.ALL_MODEL_TYPE_MARK).AsString()
-                description = wt.get_Parameter(BuiltInParameter.ALL_MODEL_DESCRIPTION).AsString()
+WALL_RULES = RuleSet([RenameRule(
+    r'A_Wall_Generic Dry Wall (\d{2,3})mm',
+    lambda groups, wt: 'GENERIC_DW_{}'.format(int(round(wt.Width * constants.MM))))])
 
-                bits = pat.findall(type_name)
-                print(bits)
-                if bits:
-                    wt.Name = 'GENERIC_DW_{}'.format(width, bits[0][1])
-                    print(wt.Name)
 
-                #fam.get_Parameter(BuiltInParameter.KEYNOTE_PARAM).Set('')
-                #fam.LookupParameter("Acoustic Rating").Set(acoustic)
-                #fam.LookupParameter("FireRating_TX").Set(fire_rating)
-                #print('{} {}'.format(width, code))
-            except Exception as e:
-                print(e)
+def fix_walls(doc):
+    """Rename wall types"""
+    wall_types = get_index(doc).of_class(WallType)
+    WALL_RULES.run(doc, 'Fix walls', wall_types, get_name=get_type_name)
 
 
 def place_all_walls(doc):
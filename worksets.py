@@ -1,11 +1,12 @@
 """Functions related to worksets"""
 from Autodesk.Revit.DB import BuiltInParameter
 from Autodesk.Revit.DB import FamilyInstance
-from Autodesk.Revit.DB import FilteredElementCollector
-from Autodesk.Revit.DB import FilteredWorksetCollector
-from Autodesk.Revit.DB import WorksetKind
 
 from lib import transaction
+from lib.batch import run_batched
+from lib.changes import ChangeBuffer
+from lib.index import get_index
+from lib.worksetindex import get_worksets
 
 
 def get_hosted_workset(instance):
@@ -36,45 +37,38 @@ STOP_WORKSETS = ['A_StructureEarlyWorks']
 
 def fix_worksets(doc):
     """Apply correct worksets to elements based on their category"""
-    workset_table = doc.GetWorksetTable()
-    worksets = FilteredWorksetCollector(doc).OfKind(WorksetKind.UserWorkset)
-    workset_map = {x.Name: x.Id.IntegerValue for x in worksets}
-    elements = FilteredElementCollector(doc).OfClass(FamilyInstance)
-    count = 0
-
-    with transaction(doc, 'Fix worksets'):
-        for element in elements:
-            category = element.Symbol.Category.Name
-
-            ws_getter = CATEGORY_WORKSETS.get(category)
-            if not ws_getter:
-                continue
-
-            new_workset = ws_getter(element)
-            if not new_workset:
-                continue
-
-            # new_workset can be either the workset name or the workset id
-            if not isinstance(new_workset, str):
-                new_workset = workset_table.GetWorkset(new_workset).Name
-
-            workset_id = doc.GetWorksetId(element.Id)
-            workset = workset_table.GetWorkset(workset_id).Name
-
-            if workset in STOP_WORKSETS:
-                continue
-
-            if workset != new_workset:
-                workset_param = element.get_Parameter(
-                    BuiltInParameter.ELEM_PARTITION_PARAM)
-                if workset_param.IsReadOnly:
-                    continue
-
-                workset_param.Set(workset_map.get(new_workset))
-                count += 1
-
-            if count and not count % 10:
-                print('{} changed'.format(count))
-
-    print('Total of {} elements changed'.format(count))
+    worksets = get_worksets(doc)
+    stopped = set()
+    for name in STOP_WORKSETS:
+        stopped |= worksets.element_ids(name)
+    elements = get_index(doc).of_class(FamilyInstance)
+    changes = ChangeBuffer()
+
+    for element in elements:
+        if element.Id.IntegerValue in stopped:
+            continue
+
+        category = element.Symbol.Category.Name
+
+        ws_getter = CATEGORY_WORKSETS.get(category)
+        if not ws_getter:
+            continue
+
+        # new_workset can be either the workset name or the workset id
+        new_workset = ws_getter(element)
+        if not new_workset:
+            continue
+
+        workset_id = worksets.id(new_workset)
+        if workset_id is None:
+            print('No workset {} for {}'.format(new_workset, element.Id))
+            continue
+
+        if element.WorksetId.IntegerValue != workset_id:
+            changes.set(
+                element, BuiltInParameter.ELEM_PARTITION_PARAM, workset_id)
+
+    run_batched(doc, 'Fix worksets', changes.pending(), changes.write,
+        key=lambda x: x.key)
+    changes.report()
 